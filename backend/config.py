@@ -32,10 +32,81 @@ class Settings(BaseSettings):
     # Tarification
     TARIF_HEURE: int = 1000  # 1000 FC par heure
     DUREE_MAX_HEURES: int = 168  # 7 jours maximum
+    HORIZON_RESERVATION_HEURES: int = 168  # debut d'une reservation a l'avance
     
-    # Intervalle de verification des expirations (secondes)
+    # Intervalle du balayage de secours des echeances de reservation (secondes)
     INTERVALLE_VERIFICATION: int = 30
     
+    # Election du worker qui execute le planificateur et la boite d'envoi:
+    # "local" (un worker), "fichier" (workers d'un hote), "firestore" (plusieurs hotes)
+    ELECTION_LEADER: str = "local"
+    ELECTION_FICHIER_VERROU: str = "/tmp/aeropark-planificateur.lock"
+    ELECTION_DUREE_BAIL: int = 15   # secondes de validite du bail Firestore
+    ELECTION_INTERVALLE: int = 5    # secondes entre deux renouvellements
+    
+    # Non-presentation: delai d'arrivee apres le debut (minutes, 0 = desactive)
+    DELAI_ARRIVEE_MINUTES: int = 30
+    LIBERATION_NON_PRESENTATION: bool = True  # False: reservation seulement signalee
+    
+    # File d'attente: duree de retenue d'une place liberee (secondes)
+    FILE_ATTENTE_RETENUE_SECONDES: int = 120
+    
+    # Avertissements avant la fin d'une reservation (minutes avant fin)
+    RAPPELS_EXPIRATION_MINUTES: List[int] = [30, 10]
+    
+    # Boite d'envoi des notifications: canaux "websocket", "sms", "mock"
+    NOTIFICATIONS_CANAUX: List[str] = ["websocket"]
+    NOTIFICATIONS_INTERVALLE: float = 5.0  # secondes entre deux passes d'envoi
+    NOTIFICATIONS_TAILLE_LOT: int = 100    # notifications par passe
+    NOTIFICATIONS_MAX_TENTATIVES: int = 5
+    
+    # Fournisseur SMS (adaptateur HTTP, un appel par lot)
+    SMS_API_URL: str = ""
+    SMS_API_CLE: str = ""
+    SMS_EXPEDITEUR: str = "AeroPark"
+    
+    # Bus d'evenements WebSocket: "local" (un worker) ou "unix" (plusieurs workers)
+    BUS_EVENEMENTS: str = "local"
+    BUS_REPERTOIRE_SOCKETS: str = "/tmp/aeropark-bus"
+    
+    # WebSocket: ping serveur, delai de reponse et plafonds (par worker)
+    WS_INTERVALLE_PING: int = 25
+    WS_DELAI_PONG: int = 10
+    WS_MAX_CONNEXIONS: int = 5000
+    WS_MAX_CONNEXIONS_PAR_IP: int = 20
+    # Compression permessage-deflate (lancement par python main.py seulement;
+    # avec la commande uvicorn: option --ws-per-message-deflate)
+    WS_COMPRESSION: bool = True
+    
+    # Metriques Prometheus (/metrics)
+    METRIQUES_ACTIVES: bool = True
+    SERVER_TIMING: bool = True  # header Server-Timing (appels Firestore par requete)
+    
+    # Limitation de debit: "N/S" = N requetes par S secondes
+    LIMITE_DEBIT_ACTIVE: bool = True
+    LIMITE_IP: str = "600/60"            # par adresse IP, endpoints utilisateurs
+    LIMITE_UTILISATEUR: str = "120/60"   # par uid, endpoints sans budget dedie
+    LIMITE_STATUT: str = "60/60"         # GET /parking/status par uid
+    LIMITE_RESERVATION: str = "10/60"    # POST /parking/reserve par uid
+    LIMITE_CLE_API: str = "3000/60"      # ensemble des capteurs (cle partagee)
+    LIMITE_CAPTEUR: str = "30/60"        # par place surveillee
+    
+    # Cles d'idempotence (header Idempotency-Key)
+    IDEMPOTENCE_DUREE_VIE_HEURES: int = 24
+    IDEMPOTENCE_TAILLE_MAX: int = 10000  # reponses gardees en memoire par worker
+    IDEMPOTENCE_BAIL_SECONDES: int = 60  # cle en cours (quelques fois la duree d'une requete)
+    
+    # Compression HTTP (gzip, brotli si installe)
+    COMPRESSION_TAILLE_MIN: int = 1024  # octets
+    COMPRESSION_NIVEAU_GZIP: int = 6
+    COMPRESSION_EXCLUSIONS: List[str] = ["/api/v1/sensor"]
+    
+    # Duree de vie du snapshot partage de /parking/status (secondes)
+    CACHE_ETAT_DUREE_VIE: float = 5.0
+    
+    # SSE: evenements gardes pour la reprise via Last-Event-ID
+    SSE_TAILLE_HISTORIQUE: int = 500
+    
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -10,7 +10,35 @@ from database.firebase import (
     reservations_ref,
     utilisateurs_ref,
     paiements_ref,
-    capteurs_ref
+    capteurs_ref,
+    idempotence_ref,
+    file_attente_ref,
+    notifications_ref,
+    baux_ref,
+    paginer,
+    compter,
+    executer_transaction,
+    lire_documents,
+    ecrire_par_lots,
+    TAILLE_MAX_BATCH
+)
+
+from database.hydratation import (
+    depuis_document,
+    depuis_documents,
+    nombre_derives_detectees
+)
+
+from database.instrumentation import (
+    desenvelopper,
+    comptabiliser
+)
+
+from database.unite_travail import (
+    UniteTravail,
+    unite_courante,
+    unite_de_travail,
+    MiddlewareUniteTravail
 )
 
 __all__ = [
@@ -22,5 +50,24 @@ __all__ = [
     "reservations_ref",
     "utilisateurs_ref",
     "paiements_ref",
-    "capteurs_ref"
+    "capteurs_ref",
+    "idempotence_ref",
+    "file_attente_ref",
+    "notifications_ref",
+    "baux_ref",
+    "paginer",
+    "compter",
+    "executer_transaction",
+    "lire_documents",
+    "ecrire_par_lots",
+    "TAILLE_MAX_BATCH",
+    "depuis_document",
+    "depuis_documents",
+    "nombre_derives_detectees",
+    "desenvelopper",
+    "comptabiliser",
+    "UniteTravail",
+    "unite_courante",
+    "unite_de_travail",
+    "MiddlewareUniteTravail"
 ]
@@ -3,9 +3,18 @@
 
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
-from google.cloud.firestore import AsyncClient
+from google.cloud.firestore import AsyncClient, transactional
 from loguru import logger
+from typing import Iterable, Optional
 import os
+import time
+
+from database.instrumentation import (
+    CollectionInstrumentee, TransactionInstrumentee, comptabiliser, desenvelopper
+)
+
+# Nombre maximum d'ecritures dans un WriteBatch Firestore
+TAILLE_MAX_BATCH = 500
 
 # Variable globale pour l'etat d'initialisation
 _firebase_initialise = False
@@ -80,11 +89,19 @@ class Collections:
     PAIEMENTS = "paiements"
     CAPTEURS = "capteurs"
     LOGS = "logs_systeme"
+    IDEMPOTENCE = "cles_idempotence"
+    FILE_ATTENTE = "file_attente"
+    NOTIFICATIONS = "notifications"
+    BAUX = "baux"
 
 
 def get_collection(nom: str):
-    """Retourne une reference vers une collection."""
-    return get_db().collection(nom)
+    """
+    Retourne une reference vers une collection.
+    Les lectures et ecritures faites a travers elle sont comptabilisees
+    (utiliser desenvelopper() pour les transactions et batchs).
+    """
+    return CollectionInstrumentee(get_db().collection(nom), nom)
 
 
 def places_ref():
@@ -110,3 +127,148 @@ def paiements_ref():
 def capteurs_ref():
     """Reference vers la collection des capteurs."""
     return get_collection(Collections.CAPTEURS)
+
+
+def idempotence_ref():
+    """Reference vers la collection des cles d'idempotence."""
+    return get_collection(Collections.IDEMPOTENCE)
+
+
+def file_attente_ref():
+    """Reference vers la collection de la file d'attente des places."""
+    return get_collection(Collections.FILE_ATTENTE)
+
+
+def notifications_ref():
+    """Reference vers la collection de la boite d'envoi des notifications."""
+    return get_collection(Collections.NOTIFICATIONS)
+
+
+def baux_ref():
+    """Reference vers la collection des baux (election du leader)."""
+    return get_collection(Collections.BAUX)
+
+
+def paginer(requete, collection, limite: int, apres: Optional[str] = None):
+    """
+    Execute une requete ordonnee par pages (pagination par curseur).
+    
+    Args:
+        requete: requete Firestore deja filtree et ordonnee (order_by)
+        collection: collection des documents (pour relire le curseur)
+        limite: nombre maximum de documents par page
+        apres: id du dernier document de la page precedente
+    
+    Returns:
+        (documents, id du curseur suivant ou None si derniere page)
+    
+    Leve ValueError si le curseur ne correspond a aucun document.
+    """
+    if apres:
+        curseur = collection.document(apres).get()
+        if not curseur.exists:
+            raise ValueError(f"Curseur de pagination invalide: {apres}")
+        requete = requete.start_after(curseur)
+    
+    # Un document de plus pour savoir s'il existe une page suivante
+    docs = list(requete.limit(limite + 1).get())
+    
+    if len(docs) > limite:
+        docs = docs[:limite]
+        return docs, docs[-1].id
+    
+    return docs, None
+
+
+def compter(requete) -> int:
+    """
+    Nombre de documents d'une requete (agregation count cote Firestore:
+    une lecture facturee par tranche de 1000 documents).
+    """
+    return int(requete.count().get()[0][0].value)
+
+
+def executer_transaction(fonction, *args, **kwargs):
+    """
+    Execute fonction(transaction, *args, **kwargs) dans une transaction
+    Firestore. En cas de conflit avec une ecriture concurrente, Firestore
+    annule et la fonction est rejouee: elle ne doit pas avoir d'effet de
+    bord hors de la transaction.
+    
+    Returns:
+        La valeur retournee par fonction
+    """
+    # Tentative en cours: seule la derniere (validee) compte ses ecritures
+    tentative: list[TransactionInstrumentee] = []
+    
+    @transactional
+    def executer(transaction):
+        tentative[:] = [TransactionInstrumentee(transaction, "")]
+        return fonction(tentative[0], *args, **kwargs)
+    
+    resultat = executer(get_db().transaction())
+    tentative[0].comptabiliser_ecritures()
+    return resultat
+
+
+def lire_documents(collection, ids: Iterable[str]) -> dict:
+    """
+    Lit plusieurs documents d'une collection en un seul aller-retour (get_all).
+    
+    Args:
+        collection: collection instrumentee (ex: places_ref())
+        ids: identifiants des documents
+    
+    Returns:
+        {id: DocumentSnapshot}, y compris pour les documents inexistants
+    """
+    refs = [desenvelopper(collection.document(i)) for i in dict.fromkeys(ids)]
+    if not refs:
+        return {}
+    
+    debut = time.perf_counter()
+    snapshots = {doc.id: doc for doc in get_db().get_all(refs)}
+    comptabiliser(collection.collection_nom, len(refs), 0, time.perf_counter() - debut)
+    
+    return snapshots
+
+
+def ecrire_par_lots(collection, operations: list) -> list[Optional[str]]:
+    """
+    Applique des ecritures en WriteBatch de TAILLE_MAX_BATCH operations.
+    Chaque batch est atomique: s'il echoue, toutes ses operations echouent.
+    
+    Args:
+        collection: collection instrumentee
+        operations: liste de (type, id, donnees) avec type "set", "update"
+            ou "delete" (donnees ignorees pour delete)
+    
+    Returns:
+        Pour chaque operation, None si appliquee, sinon le message d'erreur
+    """
+    erreurs: list[Optional[str]] = []
+    
+    for debut_lot in range(0, len(operations), TAILLE_MAX_BATCH):
+        lot = operations[debut_lot:debut_lot + TAILLE_MAX_BATCH]
+        batch = get_db().batch()
+        
+        for type_operation, doc_id, donnees in lot:
+            ref = desenvelopper(collection.document(doc_id))
+            if type_operation == "delete":
+                batch.delete(ref)
+            else:
+                getattr(batch, type_operation)(ref, donnees)
+        
+        debut = time.perf_counter()
+        try:
+            batch.commit()
+            erreurs.extend([None] * len(lot))
+        except Exception as e:
+            logger.error(f"Erreur commit batch {collection.collection_nom}: {e}")
+            erreurs.extend([str(e)] * len(lot))
+        finally:
+            comptabiliser(
+                collection.collection_nom, 0, len(lot), time.perf_counter() - debut
+            )
+    
+    return erreurs
@@ -0,0 +1,71 @@
+# Construction des modeles a partir des documents Firestore
+# ==========================================================
+
+from typing import Dict, Iterable, Type, TypeVar
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from loguru import logger
+
+M = TypeVar("M", bound=BaseModel)
+
+# Adaptateurs list[Modele] compiles une seule fois par modele
+_adaptateurs: Dict[Type[BaseModel], TypeAdapter] = {}
+
+# Nombre de documents non conformes au schema depuis le demarrage
+_derives_detectees = 0
+
+
+def _adaptateur_liste(modele: Type[M]) -> TypeAdapter:
+    """Retourne le TypeAdapter list[modele] (construit a la premiere utilisation)."""
+    adaptateur = _adaptateurs.get(modele)
+    if adaptateur is None:
+        adaptateur = TypeAdapter(list[modele])
+        _adaptateurs[modele] = adaptateur
+    return adaptateur
+
+
+def _donnees(doc) -> dict:
+    """Contenu d'un DocumentSnapshot avec son id."""
+    data = doc.to_dict()
+    data["id"] = doc.id
+    return data
+
+
+def depuis_document(modele: Type[M], doc) -> M:
+    """Construit un modele a partir d'un DocumentSnapshot (id inclus)."""
+    return modele.model_validate(_donnees(doc))
+
+
+def depuis_documents(modele: Type[M], docs: Iterable) -> list[M]:
+    """
+    Construit une liste de modeles a partir de DocumentSnapshots.
+    
+    Toute la liste est validee en un seul appel a pydantic-core via un
+    TypeAdapter precompile. Si un document ne respecte plus le schema,
+    il est journalise et ignore au lieu de faire echouer toute la liste.
+    """
+    global _derives_detectees
+    
+    donnees = [_donnees(doc) for doc in docs]
+    
+    try:
+        return _adaptateur_liste(modele).validate_python(donnees)
+    except ValidationError:
+        pass
+    
+    # Repli document par document pour isoler les documents non conformes
+    modeles = []
+    for data in donnees:
+        try:
+            modeles.append(modele.model_validate(data))
+        except ValidationError as e:
+            _derives_detectees += 1
+            logger.warning(
+                f"Derive de schema {modele.__name__} (id={data.get('id')}): {e}"
+            )
+    
+    return modeles
+
+
+def nombre_derives_detectees() -> int:
+    """Nombre de documents non conformes vus depuis le demarrage."""
+    return _derives_detectees
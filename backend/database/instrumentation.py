@@ -0,0 +1,232 @@
+# Comptage des lectures et ecritures Firestore
+# ============================================
+
+from collections import Counter
+from typing import Iterable, Iterator
+import time
+
+from utils.metriques import LECTURES_FIRESTORE, ECRITURES_FIRESTORE, comptes_requete
+from database.unite_travail import unite_courante
+
+# Methodes de requete qui retournent une nouvelle requete
+_METHODES_REQUETE = {
+    "where", "order_by", "limit", "limit_to_last", "offset",
+    "start_at", "start_after", "end_at", "end_before", "select"
+}
+
+
+def comptabiliser(collection: str, lectures: int = 0, ecritures: int = 0, duree: float = 0.0):
+    """
+    Comptabilise un appel Firestore: metriques du worker et, pendant
+    une requete HTTP, comptes de la requete (header Server-Timing).
+    """
+    if lectures:
+        LECTURES_FIRESTORE.inc(collection, n=lectures)
+    if ecritures:
+        ECRITURES_FIRESTORE.inc(collection, n=ecritures)
+    
+    comptes = comptes_requete()
+    if comptes is not None:
+        comptes.ajouter(collection, lectures, ecritures, duree)
+
+
+def desenvelopper(reference):
+    """
+    Retourne la reference Firestore native d'une reference instrumentee.
+    Les transactions et les batchs du SDK attendent des objets natifs.
+    
+    Le document est retire de l'unite de travail: il peut etre ecrit
+    sans passer par l'enveloppe.
+    """
+    brut = getattr(reference, "brut", None)
+    if brut is None:
+        return reference
+    
+    unite = unite_courante()
+    if unite is not None and isinstance(reference, DocumentInstrumente):
+        unite.oublier(brut.path)
+    return brut
+
+
+class _Enveloppe:
+    """Delegue tout a l'objet Firestore natif, sauf les methodes surchargees."""
+    
+    __slots__ = ("brut", "collection_nom")
+    
+    def __init__(self, brut, collection_nom: str):
+        self.brut = brut
+        self.collection_nom = collection_nom
+    
+    def __getattr__(self, nom):
+        return getattr(self.brut, nom)
+
+
+class DocumentInstrumente(_Enveloppe):
+    """DocumentReference comptant ses lectures et ecritures."""
+    
+    __slots__ = ()
+    
+    def _appeler(self, methode: str, lectures: int, ecritures: int, args, kwargs):
+        debut = time.perf_counter()
+        try:
+            return getattr(self.brut, methode)(*args, **kwargs)
+        finally:
+            comptabiliser(
+                self.collection_nom, lectures, ecritures, time.perf_counter() - debut
+            )
+    
+    def _ecrire(self, methode: str, args, kwargs):
+        unite = unite_courante()
+        if unite is not None:
+            unite.oublier(self.brut.path)
+        return self._appeler(methode, 0, 1, args, kwargs)
+    
+    def get(self, *args, **kwargs):
+        # Lecture simple (ni transaction ni projection): servie par l'unite de travail
+        unite = unite_courante() if not args and not kwargs else None
+        if unite is None:
+            return self._appeler("get", 1, 0, args, kwargs)
+        
+        snapshot = unite.lire(self.brut.path)
+        if snapshot is None:
+            snapshot = self._appeler("get", 1, 0, args, kwargs)
+            unite.memoriser(self.brut.path, snapshot)
+        return snapshot
+    
+    def set(self, *args, **kwargs):
+        return self._ecrire("set", args, kwargs)
+    
+    def create(self, *args, **kwargs):
+        return self._ecrire("create", args, kwargs)
+    
+    def update(self, *args, **kwargs):
+        return self._ecrire("update", args, kwargs)
+    
+    def delete(self, *args, **kwargs):
+        return self._ecrire("delete", args, kwargs)
+
+
+class RequeteInstrumentee(_Enveloppe):
+    """Query (ou CollectionReference) comptant les documents retournes."""
+    
+    __slots__ = ()
+    
+    def __getattr__(self, nom):
+        attribut = getattr(self.brut, nom)
+        if nom in _METHODES_REQUETE:
+            def chainer(*args, **kwargs):
+                return RequeteInstrumentee(attribut(*args, **kwargs), self.collection_nom)
+            return chainer
+        return attribut
+    
+    def count(self, *args, **kwargs) -> "AgregationInstrumentee":
+        return AgregationInstrumentee(self.brut.count(*args, **kwargs), self.collection_nom)
+    
+    def get(self, *args, **kwargs):
+        debut = time.perf_counter()
+        docs = self.brut.get(*args, **kwargs)
+        # Firestore facture au moins une lecture par requete, meme vide
+        comptabiliser(
+            self.collection_nom, max(len(docs), 1), 0, time.perf_counter() - debut
+        )
+        return docs
+    
+    def stream(self, *args, **kwargs) -> Iterator:
+        # Seul le temps passe dans le SDK est mesure, pas celui de l'appelant
+        n = 0
+        duree = 0.0
+        iterateur = iter(self.brut.stream(*args, **kwargs))
+        try:
+            while True:
+                debut = time.perf_counter()
+                try:
+                    doc = next(iterateur)
+                except StopIteration:
+                    return
+                finally:
+                    duree += time.perf_counter() - debut
+                n += 1
+                yield doc
+        finally:
+            comptabiliser(self.collection_nom, max(n, 1), 0, duree)
+
+
+class AgregationInstrumentee(_Enveloppe):
+    """Requete d'agregation (count): une lecture facturee par tranche de 1000 entrees."""
+    
+    __slots__ = ()
+    
+    def get(self, *args, **kwargs):
+        debut = time.perf_counter()
+        resultats = self.brut.get(*args, **kwargs)
+        comptabiliser(self.collection_nom, 1, 0, time.perf_counter() - debut)
+        return resultats
+
+
+class CollectionInstrumentee(RequeteInstrumentee):
+    """CollectionReference dont les documents et requetes sont instrumentes."""
+    
+    __slots__ = ()
+    
+    def document(self, *args, **kwargs) -> DocumentInstrumente:
+        return DocumentInstrumente(self.brut.document(*args, **kwargs), self.collection_nom)
+
+
+class TransactionInstrumentee(_Enveloppe):
+    """
+    Transaction Firestore acceptant les references instrumentees.
+    Compte lectures et ecritures par collection; les documents ecrits
+    sont retires de l'unite de travail.
+    
+    Chaque tentative (rejouee apres un conflit) a sa propre instance. Les
+    lectures sont facturees a chaque tentative et comptees aussitot; les
+    ecritures ne sont appliquees qu'au commit et ne sont comptees que pour
+    la tentative validee (comptabiliser_ecritures).
+    """
+    
+    __slots__ = ("ecritures",)
+    
+    def __init__(self, brut, collection_nom: str):
+        super().__init__(brut, collection_nom)
+        self.ecritures: Counter = Counter()
+    
+    def get(self, reference):
+        """Lit un document, ou les documents d'une requete, dans la transaction."""
+        debut = time.perf_counter()
+        resultat = desenvelopper(reference).get(transaction=self.brut)
+        # Une requete est facturee au moins une lecture, meme vide
+        lectures = max(len(resultat), 1) if isinstance(resultat, list) else 1
+        comptabiliser(reference.collection_nom, lectures, 0, time.perf_counter() - debut)
+        return resultat
+    
+    def get_all(self, references: Iterable) -> list:
+        """Lit plusieurs documents dans la transaction en un seul aller-retour."""
+        references = list(references)
+        debut = time.perf_counter()
+        snapshots = list(self.brut.get_all([desenvelopper(r) for r in references]))
+        duree = time.perf_counter() - debut
+        
+        for collection_nom, lectures in Counter(r.collection_nom for r in references).items():
+            comptabiliser(collection_nom, lectures, 0, duree * lectures / len(references))
+        return snapshots
+    
+    def _ecrire(self, methode: str, reference, *args, **kwargs):
+        getattr(self.brut, methode)(desenvelopper(reference), *args, **kwargs)
+        self.ecritures[reference.collection_nom] += 1
+    
+    def comptabiliser_ecritures(self):
+        """Compte les ecritures de la tentative, apres un commit reussi."""
+        for collection_nom, ecritures in self.ecritures.items():
+            comptabiliser(collection_nom, ecritures=ecritures)
+    
+    def set(self, reference, *args, **kwargs):
+        self._ecrire("set", reference, *args, **kwargs)
+    
+    def create(self, reference, *args, **kwargs):
+        self._ecrire("create", reference, *args, **kwargs)
+    
+    def update(self, reference, *args, **kwargs):
+        self._ecrire("update", reference, *args, **kwargs)
+    
+    def delete(self, reference, *args, **kwargs):
+        self._ecrire("delete", reference, *args, **kwargs)
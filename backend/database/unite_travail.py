@@ -0,0 +1,76 @@
+# Unite de travail: documents deja lus pendant la requete
+# =======================================================
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class UniteTravail:
+    """
+    Carte d'identite des documents lus pendant une requete HTTP.
+    
+    Un document n'est lu qu'une fois par requete: les lectures suivantes
+    (routeur puis service, dependance d'authentification puis endpoint)
+    reutilisent le snapshot. Toute ecriture sur le document l'oublie.
+    """
+    
+    __slots__ = ("documents", "ouverte")
+    
+    def __init__(self):
+        # chemin du document ("collection/id") -> DocumentSnapshot
+        self.documents: Dict[str, object] = {}
+        self.ouverte = True
+    
+    def lire(self, chemin: str):
+        """Snapshot memorise du document, ou None s'il n'a pas ete lu."""
+        return self.documents.get(chemin) if self.ouverte else None
+    
+    def memoriser(self, chemin: str, snapshot):
+        if self.ouverte:
+            self.documents[chemin] = snapshot
+    
+    def oublier(self, chemin: str):
+        self.documents.pop(chemin, None)
+    
+    def fermer(self):
+        """Vide la carte; les taches lancees par la requete ne l'utilisent plus."""
+        self.ouverte = False
+        self.documents.clear()
+
+
+_unite_courante: ContextVar[Optional[UniteTravail]] = ContextVar(
+    "unite_travail", default=None
+)
+
+
+def unite_courante() -> Optional[UniteTravail]:
+    """Unite de travail de la requete en cours (None hors requete)."""
+    return _unite_courante.get()
+
+
+@contextmanager
+def unite_de_travail():
+    """Ouvre une unite de travail pour la duree du bloc."""
+    unite = UniteTravail()
+    jeton = _unite_courante.set(unite)
+    try:
+        yield unite
+    finally:
+        unite.fermer()
+        _unite_courante.reset(jeton)
+
+
+class MiddlewareUniteTravail:
+    """Middleware ASGI ouvrant une unite de travail par requete HTTP."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        with unite_de_travail():
+            await self.app(scope, receive, send)
@@ -3,6 +3,7 @@
 
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 import sys
@@ -29,12 +30,21 @@ logger.add(
 # Imports de l'application
 from config import get_settings
 from database.firebase import initialiser_firebase
+from database.unite_travail import MiddlewareUniteTravail
 from routers.auth import router as router_auth
 from routers.parking import router as router_parking
 from routers.admin import router as router_admin
 from routers.sensor import router as router_capteur
 from routers.websocket import router as router_websocket
+from routers.stream import router as router_stream
 from utils.scheduler import get_planificateur
+from utils.bus_evenements import get_bus
+from utils.boite_envoi import get_boite_envoi
+from utils.election import get_election
+from utils.reponses import ReponseJSONRapide
+from utils.compression import MiddlewareCompression
+from utils.metriques import MiddlewareMetriques, get_registre
+from routers.websocket import get_gestionnaire_connexions
 
 settings = get_settings()
 
@@ -65,10 +75,38 @@ async def cycle_de_vie(app: FastAPI):
     except Exception as e:
         logger.error(f"Echec initialisation places: {e}")
     
-    # Demarrer le planificateur
+    # Demarrer le bus d'evenements (diffusion entre workers)
+    bus = get_bus()
+    await bus.demarrer()
+    logger.info(f"Bus d'evenements demarre ({settings.BUS_EVENEMENTS})")
+    
+    # Demarrer le ping serveur et la fermeture des WebSockets inactifs
+    gestionnaire_ws = get_gestionnaire_connexions()
+    await gestionnaire_ws.demarrer_surveillance()
+    
+    # Planificateur et envoi des notifications: sur le seul worker leader
     planificateur = get_planificateur()
-    await planificateur.demarrer()
-    logger.info("Planificateur demarre")
+    boite_envoi = get_boite_envoi()
+    if settings.ELECTION_LEADER.lower() != "local":
+        if settings.BUS_EVENEMENTS.lower() == "local":
+            logger.warning(
+                f"ELECTION_LEADER={settings.ELECTION_LEADER} avec BUS_EVENEMENTS=local: "
+                "les echeances des followers n'atteignent le leader qu'au balayage "
+                f"({settings.INTERVALLE_VERIFICATION}s)"
+            )
+        planificateur.activer_relais(bus)
+    
+    async def devenir_leader():
+        await planificateur.demarrer()
+        await boite_envoi.demarrer()
+    
+    async def devenir_follower():
+        await planificateur.arreter()
+        await boite_envoi.arreter()
+    
+    election = get_election()
+    await election.demarrer(au_gain=devenir_leader, a_la_perte=devenir_follower)
+    logger.info(f"Election du leader: {settings.ELECTION_LEADER}")
     
     logger.info("=" * 50)
     logger.info("Systeme pret")
@@ -79,8 +117,13 @@ async def cycle_de_vie(app: FastAPI):
     # === ARRET ===
     logger.info("AeroPark Smart System - Arret")
     
-    await planificateur.arreter()
-    logger.info("Planificateur arrete")
+    # Arrete le planificateur si ce worker est leader et rend le bail
+    await election.arreter()
+    
+    await gestionnaire_ws.arreter_surveillance()
+    
+    await bus.arreter()
+    logger.info("Bus d'evenements arrete")
     
     logger.info("Au revoir")
 
@@ -124,7 +167,8 @@ X-API-Key: <cle_api>
         "name": "Support AeroPark",
         "email": "support@aeropark.cd"
     },
-    lifespan=cycle_de_vie
+    lifespan=cycle_de_vie,
+    default_response_class=ReponseJSONRapide
 )
 
 # Configuration CORS
@@ -136,11 +180,28 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# Compression des reponses (les capteurs et petites reponses sont exclus)
+app.add_middleware(
+    MiddlewareCompression,
+    taille_min=settings.COMPRESSION_TAILLE_MIN,
+    niveau_gzip=settings.COMPRESSION_NIVEAU_GZIP,
+    exclusions=settings.COMPRESSION_EXCLUSIONS
+)
+
+# Chaque document Firestore n'est lu qu'une fois par requete
+app.add_middleware(MiddlewareUniteTravail)
+
+# Nombre et duree des requetes par route (expose sur /metrics)
+# et appels Firestore par requete (header Server-Timing)
+if settings.METRIQUES_ACTIVES:
+    app.add_middleware(MiddlewareMetriques, server_timing=settings.SERVER_TIMING)
+
 # Enregistrement des routers
 app.include_router(router_auth, prefix="/api/v1")
 app.include_router(router_parking, prefix="/api/v1")
 app.include_router(router_admin, prefix="/api/v1")
 app.include_router(router_capteur, prefix="/api/v1")
+app.include_router(router_stream, prefix="/api/v1")
 app.include_router(router_websocket)
 
 
@@ -169,6 +230,9 @@ async def verification_sante():
     from utils.scheduler import get_planificateur
     from routers.websocket import get_gestionnaire_connexions
     
+    from routers.stream import get_gestionnaire_sse
+    from utils.election import get_election
+    
     planificateur = get_planificateur()
     gestionnaire_ws = get_gestionnaire_connexions()
     
@@ -178,11 +242,26 @@ async def verification_sante():
             "api": "operationnel",
             "firebase": "connecte",
             "planificateur": "actif" if planificateur.en_cours else "arrete",
-            "connexions_websocket": gestionnaire_ws.nombre_connexions()
-        }
+            "leader": get_election().est_leader,
+            "connexions_websocket": gestionnaire_ws.nombre_connexions(),
+            "clients_sse": get_gestionnaire_sse().nombre_clients()
+        },
+        "websocket": gestionnaire_ws.statistiques()
     }
 
 
+@app.get("/metrics", tags=["Sante"], response_class=PlainTextResponse)
+async def metriques():
+    """Metriques de ce worker au format texte Prometheus."""
+    if not settings.METRIQUES_ACTIVES:
+        return PlainTextResponse("", status_code=404)
+    
+    return PlainTextResponse(
+        get_registre().exposer(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
 @app.get("/api/v1", tags=["Racine"])
 async def info_api():
     """Informations sur les endpoints disponibles."""
@@ -193,7 +272,8 @@ async def info_api():
             "parking": "/api/v1/parking",
             "admin": "/api/v1/admin",
             "capteurs": "/api/v1/sensor",
-            "websocket": "/ws/parking"
+            "websocket": "/ws/parking",
+            "stream": "/api/v1/parking/stream"
         }
     }
 
@@ -207,5 +287,6 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=settings.DEBUG,
-        log_level="info"
+        log_level="info",
+        ws_per_message_deflate=settings.WS_COMPRESSION
     )
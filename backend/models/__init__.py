@@ -12,18 +12,44 @@ from models.user import (
 
 from models.parking import (
     StatutPlace,
+    CreneauPlanifie,
     PlaceParking,
     PlaceCreate,
     PlaceResponse,
-    EtatParking
+    EtatParking,
+    ListePlaces,
+    CreneauLibre,
+    PagePlaces,
+    ActionLotPlace,
+    LignePlaceLot,
+    ResultatLignePlace,
+    ResultatLotPlaces
 )
 
 from models.reservation import (
     StatutReservation,
     ReservationCreate,
+    ReservationAutoCreate,
+    ReservationLotCreate,
+    ProlongationCreate,
     Reservation,
     ReservationResponse,
-    DemandeLiberation
+    ReservationLotResponse,
+    DemandeLiberation,
+    PageReservations
+)
+
+from models.file_attente import (
+    StatutAttente,
+    InscriptionAttenteCreate,
+    InscriptionAttente,
+    InscriptionAttenteResponse
+)
+
+from models.notification import (
+    CanalNotification,
+    StatutNotification,
+    Notification
 )
 
 from models.sensor import (
@@ -47,9 +73,17 @@ __all__ = [
     "Utilisateur", "UtilisateurFirebase", "ProfilUtilisateur",
     # Parking
     "StatutPlace", "PlaceParking", "PlaceCreate", "PlaceResponse", "EtatParking",
+    "ListePlaces", "PagePlaces", "ActionLotPlace", "LignePlaceLot",
+    "ResultatLignePlace", "ResultatLotPlaces", "CreneauPlanifie", "CreneauLibre",
     # Reservation
-    "StatutReservation", "ReservationCreate", "Reservation",
-    "ReservationResponse", "DemandeLiberation",
+    "StatutReservation", "ReservationCreate", "ReservationAutoCreate", "Reservation",
+    "ReservationResponse", "DemandeLiberation", "PageReservations",
+    "ReservationLotCreate", "ReservationLotResponse", "ProlongationCreate",
+    # File d'attente
+    "StatutAttente", "InscriptionAttenteCreate", "InscriptionAttente",
+    "InscriptionAttenteResponse",
+    # Notifications
+    "CanalNotification", "StatutNotification", "Notification",
     # Capteur
     "EtatCapteur", "MiseAJourCapteur", "ReponseCapteur", "StatutCapteur",
     # Paiement
@@ -0,0 +1,49 @@
+# Modeles pour la file d'attente des places
+# =========================================
+
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+
+# Zone d'une inscription acceptant n'importe quelle place
+ZONE_TOUTES = "*"
+
+
+class StatutAttente(str, Enum):
+    """Etats possibles d'une inscription en file d'attente."""
+    EN_ATTENTE = "waiting"      # Dans la file
+    PROPOSEE = "offered"        # Place retenue pour l'utilisateur
+    SERVIE = "served"           # Place reservee pendant la retenue
+    EXPIREE = "expired"         # Retenue ecoulee sans reservation
+    ANNULEE = "cancelled"
+
+
+class InscriptionAttenteCreate(BaseModel):
+    """Demande d'inscription en file d'attente."""
+    zone: Optional[str] = Field(None, min_length=1, max_length=1)  # absent: toutes zones
+
+
+class InscriptionAttente(BaseModel):
+    """Inscription en file d'attente (une par utilisateur)."""
+    id: str  # ID utilisateur
+    utilisateur_id: str
+    zone: str = ZONE_TOUTES
+    statut: StatutAttente = StatutAttente.EN_ATTENTE
+    place_id: Optional[str] = None  # place proposee
+    retenue_jusqu_a: Optional[datetime] = None
+    date_creation: datetime = Field(default_factory=datetime.now)
+    
+    class Config:
+        from_attributes = True
+
+
+class InscriptionAttenteResponse(BaseModel):
+    """Reponse apres inscription."""
+    succes: bool
+    message: str
+    statut: Optional[StatutAttente] = None
+    zone: Optional[str] = None
+    position: Optional[int] = None  # 1 = prochaine place liberee
+    place_id: Optional[str] = None
+    retenue_jusqu_a: Optional[datetime] = None
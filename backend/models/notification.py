@@ -0,0 +1,42 @@
+# Modeles pour les notifications (boite d'envoi)
+# ==============================================
+
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+
+
+class CanalNotification(str, Enum):
+    """Moyens d'envoi des notifications."""
+    WEBSOCKET = "websocket"
+    SMS = "sms"
+    MOCK = "mock"  # journal local (developpement)
+
+
+class StatutNotification(str, Enum):
+    """Etats possibles d'une notification de la boite d'envoi."""
+    EN_ATTENTE = "pending"      # A envoyer (ou a reessayer)
+    ENVOYEE = "sent"
+    ECHEC = "failed"            # Nombre maximum de tentatives atteint
+    PERIMEE = "stale"           # Plus utile (reservation deja terminee)
+
+
+class Notification(BaseModel):
+    """Notification a envoyer a un utilisateur par un canal."""
+    id: str  # cle de deduplication
+    canal: CanalNotification
+    utilisateur_id: str
+    type: str  # ex: expiration_proche
+    message: str
+    donnees: dict = Field(default_factory=dict)
+    statut: StatutNotification = StatutNotification.EN_ATTENTE
+    tentatives: int = 0
+    prochain_essai: datetime = Field(default_factory=datetime.now)
+    valable_jusqu_a: Optional[datetime] = None
+    derniere_erreur: Optional[str] = None
+    date_creation: datetime = Field(default_factory=datetime.now)
+    date_envoi: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
@@ -2,7 +2,7 @@
 # ===================================
 
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -14,6 +14,13 @@ class StatutPlace(str, Enum):
     OCCUPEE = "occupied"
 
 
+class CreneauPlanifie(BaseModel):
+    """Reservation a venir sur une place (champ planning de la place)."""
+    debut: datetime
+    fin: datetime
+    utilisateur_id: str
+
+
 class PlaceParking(BaseModel):
     """Representation d'une place de parking."""
     id: str
@@ -24,6 +31,9 @@ class PlaceParking(BaseModel):
     fin_reservation: Optional[datetime] = None
     duree_heures: Optional[int] = None
     capteur_id: Optional[str] = None
+    planning: Dict[str, CreneauPlanifie] = Field(default_factory=dict)  # reservation_id -> creneau
+    retenue_pour: Optional[str] = None  # ID utilisateur servi par la file d'attente
+    retenue_jusqu_a: Optional[datetime] = None
     date_creation: datetime = Field(default_factory=datetime.now)
     
     class Config:
@@ -53,3 +63,56 @@ class EtatParking(BaseModel):
     places_reservees: int
     places_occupees: int
     places: list[PlaceResponse]
+
+
+class ListePlaces(BaseModel):
+    """Places filtrees (statut, zone)."""
+    total: int
+    zones: list[str]  # zones connues du parking
+    places: list[PlaceResponse]
+
+
+class CreneauLibre(BaseModel):
+    """Premier creneau libre d'une place pour une duree donnee."""
+    place_id: str
+    debut: datetime
+    fin: datetime
+
+
+class PagePlaces(BaseModel):
+    """Page de places (liste admin paginee)."""
+    total: int  # nombre total de places, toutes pages
+    places: list[PlaceParking]
+    suivant: Optional[str] = None
+
+
+class ActionLotPlace(str, Enum):
+    """Operation appliquee a une ligne d'un lot de places."""
+    AJOUTER = "ajouter"
+    MODIFIER = "modifier"
+    SUPPRIMER = "supprimer"
+
+
+class LignePlaceLot(BaseModel):
+    """Ligne d'un lot de places (JSON ou CSV)."""
+    action: ActionLotPlace = ActionLotPlace.AJOUTER
+    numero: str = Field(min_length=1, max_length=10)
+    capteur_id: Optional[str] = None
+
+
+class ResultatLignePlace(BaseModel):
+    """Resultat d'une ligne du lot."""
+    ligne: int  # numero de ligne (1 = premiere place)
+    numero: str
+    place_id: str
+    action: ActionLotPlace
+    succes: bool
+    message: str
+
+
+class ResultatLotPlaces(BaseModel):
+    """Resultat d'un lot de places."""
+    total: int
+    reussies: int
+    echouees: int
+    resultats: list[ResultatLignePlace]
@@ -25,9 +25,10 @@ class StatutPaiement(str, Enum):
 class Paiement(BaseModel):
     """Enregistrement d'un paiement."""
     id: str
-    reservation_id: str
+    reservation_id: str  # ou lot_id pour une reservation de groupe
     utilisateur_id: str
     montant: int  # en FC
+    reservation_ids: list[str] = Field(default_factory=list)  # reservations d'un lot
     methode: MethodePaiement
     statut: StatutPaiement = StatutPaiement.EN_ATTENTE
     telephone: str
@@ -6,10 +6,16 @@ from typing import Optional
 from datetime import datetime
 from enum import Enum
 
+from models.payment import MethodePaiement
+
+# Nombre maximum de places d'une reservation de groupe
+TAILLE_MAX_LOT_RESERVATION = 20
+
 
 class StatutReservation(str, Enum):
     """Etats possibles d'une reservation."""
     EN_ATTENTE = "pending"      # Paiement en attente
+    PLANIFIEE = "scheduled"     # Reservation a l'avance, pas encore commencee
     ACTIVE = "active"           # Reservation confirmee
     EXPIREE = "expired"         # Temps ecoule sans arrivee
     TERMINEE = "completed"      # Vehicule parti normalement
@@ -21,6 +27,32 @@ class ReservationCreate(BaseModel):
     place_id: str
     duree_heures: int = Field(ge=1, le=168)  # 1h minimum, 7 jours max
     methode_paiement: str
+    debut: Optional[datetime] = None  # reservation a l'avance (absent: immediate)
+
+
+class ReservationAutoCreate(BaseModel):
+    """Demande de reservation sans choix de place (attribuee par le serveur)."""
+    duree_heures: int = Field(ge=1, le=168)
+    methode_paiement: str
+    zone: Optional[str] = Field(None, min_length=1, max_length=1)  # ex: "B"
+    preferences: list[str] = Field(default_factory=list, max_length=10)  # numeros preferes
+    autres_zones: bool = False  # accepter une autre zone si la zone est pleine
+
+
+class ReservationLotCreate(BaseModel):
+    """Reservation de plusieurs places en une fois (taxis, navettes d'hotel)."""
+    nombre: int = Field(ge=2, le=TAILLE_MAX_LOT_RESERVATION)
+    duree_heures: int = Field(ge=1, le=168)
+    methode_paiement: MethodePaiement
+    telephone: str = Field(min_length=10, max_length=15)  # paiement groupe
+    zone: Optional[str] = Field(None, min_length=1, max_length=1)
+    contigues: bool = False  # places voisines (rangs consecutifs d'une meme zone)
+    debut: Optional[datetime] = None  # reservation a l'avance (absent: immediate)
+
+
+class ProlongationCreate(BaseModel):
+    """Prolongation d'une reservation en cours ou a venir."""
+    heures: int = Field(ge=1, le=168)  # heures ajoutees a la fin
 
 
 class Reservation(BaseModel):
@@ -36,6 +68,8 @@ class Reservation(BaseModel):
     methode_paiement: str
     paiement_confirme: bool = False
     vehicule_arrive: bool = False
+    non_presentation: bool = False  # delai d'arrivee depasse
+    lot_id: Optional[str] = None  # reservation de groupe
     date_creation: datetime = Field(default_factory=datetime.now)
     
     class Config:
@@ -47,6 +81,8 @@ class ReservationResponse(BaseModel):
     succes: bool
     message: str
     reservation_id: Optional[str] = None
+    statut: Optional[StatutReservation] = None
+    place_id: Optional[str] = None
     place_numero: Optional[str] = None
     montant: Optional[int] = None
     debut: Optional[datetime] = None
@@ -54,7 +90,26 @@ class ReservationResponse(BaseModel):
     temps_restant_secondes: Optional[int] = None
 
 
+class ReservationLotResponse(BaseModel):
+    """Reponse a une reservation de groupe (tout ou rien)."""
+    succes: bool
+    message: str
+    lot_id: Optional[str] = None
+    paiement_id: Optional[str] = None
+    montant_total: Optional[int] = None
+    debut: Optional[datetime] = None
+    fin: Optional[datetime] = None
+    reservations: list[ReservationResponse] = Field(default_factory=list)
+
+
 class DemandeLiberation(BaseModel):
     """Demande de liberation d'une place."""
     place_id: str
     raison: Optional[str] = None
+
+
+class PageReservations(BaseModel):
+    """Page de reservations (historique ou liste admin paginee)."""
+    total: int  # nombre total de reservations de la liste, toutes pages
+    reservations: list[Reservation]
+    suivant: Optional[str] = None
@@ -6,11 +6,13 @@ from routers.parking import router as router_parking
 from routers.admin import router as router_admin
 from routers.sensor import router as router_capteur
 from routers.websocket import router as router_websocket
+from routers.stream import router as router_stream
 
 __all__ = [
     "router_auth",
     "router_parking",
     "router_admin",
     "router_capteur",
-    "router_websocket"
+    "router_websocket",
+    "router_stream"
 ]
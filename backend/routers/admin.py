@@ -1,16 +1,30 @@
 # Router administration
 # =====================
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import TypeAdapter, ValidationError
+from typing import Optional
 from loguru import logger
+import csv
+import io
 
 from security.auth import verifier_admin
 from models.user import UtilisateurFirebase
-from models.parking import PlaceCreate
+from models.parking import (
+    PlaceCreate, PagePlaces, ActionLotPlace, LignePlaceLot, ResultatLotPlaces
+)
+from models.reservation import PageReservations
 from services.parking_service import ServiceParking
+from utils.reponses import reponse_modele
+from routers.websocket import diffuser_mise_a_jour_place
 
 router = APIRouter(prefix="/admin", tags=["Administration"])
 
+# Nombre maximum de lignes par lot de places
+MAX_LIGNES_LOT = 2000
+
+_adaptateur_lignes = TypeAdapter(list[LignePlaceLot])
+
 
 @router.post("/parking/add")
 async def ajouter_place(
@@ -35,6 +49,12 @@ async def ajouter_place(
         
         logger.info(f"Admin {admin.uid} a ajoute la place {place.numero}")
         
+        await diffuser_mise_a_jour_place(
+            place_id=nouvelle_place.id,
+            statut="available",
+            donnees={"raison": "ajout"}
+        )
+        
         return {
             "succes": True,
             "message": f"Place {place.numero} ajoutee",
@@ -51,6 +71,100 @@ async def ajouter_place(
         )
 
 
+def _lire_lignes_lot(corps: bytes, type_contenu: str) -> list[LignePlaceLot]:
+    """
+    Decode un lot de places.
+    CSV: en-tete action,numero,capteur_id (action et capteur_id optionnels).
+    JSON: liste de lignes ou objet {"places": [...]}.
+    """
+    if "csv" in type_contenu:
+        texte = corps.decode("utf-8-sig")
+        donnees = [
+            {
+                cle.strip(): valeur.strip()
+                for cle, valeur in ligne.items()
+                if cle and valeur and valeur.strip()
+            }
+            for ligne in csv.DictReader(io.StringIO(texte))
+        ]
+        return _adaptateur_lignes.validate_python(donnees)
+    
+    donnees = TypeAdapter(object).validate_json(corps)
+    if isinstance(donnees, dict):
+        donnees = donnees.get("places", [])
+    return _adaptateur_lignes.validate_python(donnees)
+
+
+@router.post("/parking/bulk", response_model=ResultatLotPlaces)
+async def appliquer_lot_places(
+    request: Request,
+    admin: UtilisateurFirebase = Depends(verifier_admin)
+):
+    """
+    Ajoute, modifie ou supprime des places en lot.
+    Reserve aux administrateurs.
+    
+    Corps en JSON (Content-Type: application/json) ou CSV (text/csv):
+        
+        action,numero,capteur_id
+        ajouter,B1,esp8266_b1
+        modifier,A2,esp8266_a2_v2
+        supprimer,A5,
+    
+    La reponse donne le resultat de chaque ligne. "modifier" ne change
+    que les champs fournis (capteur_id); le numero d'une place ne se
+    modifie pas (supprimer puis ajouter).
+    """
+    try:
+        lignes = _lire_lignes_lot(
+            await request.body(),
+            request.headers.get("content-type", "application/json")
+        )
+    except (ValidationError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Lot de places invalide: {e}"
+        )
+    
+    if not lignes or len(lignes) > MAX_LIGNES_LOT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Le lot doit contenir de 1 a {MAX_LIGNES_LOT} places"
+        )
+    
+    try:
+        resultat = await ServiceParking.appliquer_lot(lignes)
+        
+        logger.info(
+            f"Admin {admin.uid} a applique un lot de places: "
+            f"{resultat.reussies}/{resultat.total}"
+        )
+        
+        # Memes evenements que les ajouts et suppressions unitaires
+        # (une modification ne change pas le statut de la place)
+        evenements = {
+            ActionLotPlace.AJOUTER: ("available", "ajout"),
+            ActionLotPlace.SUPPRIMER: ("removed", "suppression")
+        }
+        for ligne in resultat.resultats:
+            if ligne.succes and ligne.action in evenements:
+                statut, raison = evenements[ligne.action]
+                await diffuser_mise_a_jour_place(
+                    place_id=ligne.place_id,
+                    statut=statut,
+                    donnees={"raison": raison}
+                )
+        
+        return reponse_modele(resultat)
+        
+    except Exception as e:
+        logger.error(f"Erreur lot de places: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur lors de l'application du lot"
+        )
+
+
 @router.delete("/parking/{place_id}")
 async def supprimer_place(
     place_id: str,
@@ -81,6 +195,12 @@ async def supprimer_place(
         
         logger.info(f"Admin {admin.uid} a supprime la place {place_id}")
         
+        await diffuser_mise_a_jour_place(
+            place_id=place_id,
+            statut="removed",
+            donnees={"raison": "suppression"}
+        )
+        
         return {
             "succes": True,
             "message": f"Place {place_id} supprimee"
@@ -96,22 +216,36 @@ async def supprimer_place(
         )
 
 
-@router.get("/parking/all")
+@router.get("/parking/all", response_model=PagePlaces)
 async def obtenir_toutes_places(
+    limit: int = Query(100, ge=1, le=500),
+    apres: Optional[str] = None,
     admin: UtilisateurFirebase = Depends(verifier_admin)
 ):
     """
-    Retourne toutes les places avec leurs details complets.
+    Retourne les places avec leurs details complets, par pages.
     Reserve aux administrateurs.
+    
+    - limit: nombre de places par page (1 a 500)
+    - apres: valeur "suivant" de la page precedente
     """
     try:
-        places = await ServiceParking.obtenir_toutes_places()
+        places, suivant, total = await ServiceParking.obtenir_page_places(
+            limite=limit,
+            apres=apres
+        )
         
-        return {
-            "total": len(places),
-            "places": [p.model_dump() for p in places]
-        }
+        return reponse_modele(PagePlaces(
+            total=total,
+            places=places,
+            suivant=suivant
+        ))
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Erreur recuperation places: {e}")
         raise HTTPException(
@@ -120,24 +254,38 @@ async def obtenir_toutes_places(
         )
 
 
-@router.get("/reservations")
+@router.get("/reservations", response_model=PageReservations)
 async def obtenir_toutes_reservations(
+    limit: int = Query(50, ge=1, le=500),
+    apres: Optional[str] = None,
     admin: UtilisateurFirebase = Depends(verifier_admin)
 ):
     """
-    Retourne toutes les reservations actives.
+    Retourne les reservations actives, par pages.
     Reserve aux administrateurs.
+    
+    - limit: nombre de reservations par page (1 a 500)
+    - apres: valeur "suivant" de la page precedente
     """
     try:
         from services.reservation_service import ServiceReservation
         
-        reservations = await ServiceReservation.obtenir_reservations_actives()
+        reservations, suivant, total = await ServiceReservation.obtenir_page_reservations_actives(
+            limite=limit,
+            apres=apres
+        )
         
-        return {
-            "total": len(reservations),
-            "reservations": [r.model_dump() for r in reservations]
-        }
+        return reponse_modele(PageReservations(
+            total=total,
+            reservations=reservations,
+            suivant=suivant
+        ))
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Erreur recuperation reservations: {e}")
         raise HTTPException(
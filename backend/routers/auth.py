@@ -24,12 +24,9 @@ async def obtenir_profil(
         role = await get_role_utilisateur(utilisateur.uid)
         
         # Compter les reservations actives
-        reservations = await ServiceReservation.obtenir_reservations_utilisateur(
+        reservations_actives = await ServiceReservation.compter_reservations_actives_utilisateur(
             utilisateur.uid
         )
-        reservations_actives = sum(
-            1 for r in reservations if r.statut.value == "active"
-        )
         
         return ProfilUtilisateur(
             id=utilisateur.uid,
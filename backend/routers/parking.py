@@ -1,30 +1,67 @@
 # Router parking
 # ==============
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from typing import Optional
+from datetime import datetime
 from loguru import logger
 
 from security.auth import get_utilisateur_courant
+from security.limitation import limiter_utilisateur
 from models.user import UtilisateurFirebase
-from models.parking import EtatParking
-from models.reservation import ReservationCreate, ReservationResponse
+from models.parking import CreneauLibre, EtatParking, ListePlaces, StatutPlace
+from models.file_attente import InscriptionAttenteCreate, InscriptionAttenteResponse
+from models.reservation import (
+    ReservationCreate, ReservationAutoCreate, ReservationLotCreate, ReservationResponse,
+    ReservationLotResponse, ProlongationCreate, PageReservations, StatutReservation
+)
 from services.parking_service import ServiceParking
 from services.reservation_service import ServiceReservation
+from services.file_attente_service import ServiceFileAttente
+from routers.websocket import diffuser_mise_a_jour_place, diffuser_reservation
+from utils.reponses import reponse_modele
+from utils.cache_etat import get_cache_etat
+from utils.compression import choisir_encodage
+from utils.idempotence import get_idempotence
+from utils.scheduler import get_planificateur, proposer_place_liberee, ECHEANCE_RETENUE
+from config import get_settings
 
 router = APIRouter(prefix="/parking", tags=["Parking"])
 
 
-@router.get("/status", response_model=EtatParking)
+@router.get(
+    "/status", response_model=EtatParking,
+    dependencies=[Depends(limiter_utilisateur("statut"))]
+)
 async def obtenir_etat_parking(
+    request: Request,
     utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant)
 ):
     """
     Retourne l'etat actuel de toutes les places de parking.
     Inclut le nombre de places disponibles et le temps restant pour chaque reservation.
+    
+    Le snapshot est partage entre les requetes et deja compresse (gzip ou
+    brotli selon Accept-Encoding). Repond 304 si If-None-Match correspond.
     """
     try:
-        etat = await ServiceParking.obtenir_etat_parking()
-        return etat
+        settings = get_settings()
+        encodage = choisir_encodage(request.headers.get("accept-encoding"))
+        
+        corps, encodage, etag = await get_cache_etat().obtenir_corps(
+            encodage,
+            taille_min=settings.COMPRESSION_TAILLE_MIN
+        )
+        
+        entetes = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+        
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=entetes)
+        
+        if encodage:
+            entetes["Content-Encoding"] = encodage
+        
+        return Response(content=corps, media_type="application/json", headers=entetes)
         
     except Exception as e:
         logger.error(f"Erreur recuperation etat parking: {e}")
@@ -34,25 +71,129 @@ async def obtenir_etat_parking(
         )
 
 
-@router.post("/reserve", response_model=ReservationResponse)
+@router.get(
+    "/places", response_model=ListePlaces,
+    dependencies=[Depends(limiter_utilisateur("statut"))]
+)
+async def filtrer_places(
+    statut: Optional[StatutPlace] = Query(None, description="available, reserved ou occupied"),
+    zone: Optional[str] = Query(None, min_length=1, max_length=1, description="Lettre de zone (A, B...)"),
+    utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant)
+):
+    """
+    Retourne les places filtrees par statut et/ou zone.
+    Ex: /parking/places?statut=available&zone=B
+    
+    Repond depuis les index du snapshot partage, sans parcourir la collection.
+    """
+    try:
+        cache = get_cache_etat()
+        index = await cache.obtenir_index()
+        places = await cache.obtenir_reponses(index.filtrer(statut, zone))
+        
+        return reponse_modele(ListePlaces(
+            total=len(places),
+            zones=index.zones(),
+            places=places
+        ))
+        
+    except Exception as e:
+        logger.error(f"Erreur filtrage places: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur lors de la recuperation des places"
+        )
+
+
+@router.get(
+    "/creneau", response_model=CreneauLibre,
+    dependencies=[Depends(limiter_utilisateur("statut"))]
+)
+async def chercher_creneau(
+    duree_heures: int = Query(..., ge=1, le=168),
+    apres: Optional[datetime] = Query(None, description="Debut au plus tot (defaut: maintenant)"),
+    zone: Optional[str] = Query(None, min_length=1, max_length=1, description="Lettre de zone (A, B...)"),
+    place_id: Optional[str] = None,
+    utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant)
+):
+    """
+    Retourne le premier creneau libre de duree_heures, sur une place
+    (place_id) ou sur la premiere place libre d'une zone, dans l'horizon
+    de reservation a l'avance.
+    Ex: /parking/creneau?duree_heures=3&apres=2026-05-01T08:00:00&zone=B
+    
+    Le resultat peut etre passe tel quel a /reserve (place_id, debut).
+    """
+    try:
+        creneau = await ServiceReservation.premier_creneau_libre(
+            duree_heures, apres=apres, zone=zone, place_id=place_id
+        )
+        
+        if creneau is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Aucun creneau libre dans l'horizon de reservation"
+            )
+        
+        return reponse_modele(creneau)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur recherche de creneau: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur lors de la recherche de creneau"
+        )
+
+
+@router.post(
+    "/reserve", response_model=ReservationResponse,
+    dependencies=[Depends(limiter_utilisateur("reservation"))]
+)
 async def reserver_place(
     reservation: ReservationCreate,
-    utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant)
+    utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Reserve une place de parking.
-    Le timer demarre immediatement apres la reservation.
+    Le timer demarre immediatement apres la reservation, ou a debut
+    pour une reservation a l'avance.
     
     - place_id: identifiant de la place
     - duree_heures: duree souhaitee (1 a 168 heures)
     - methode_paiement: orange_money, airtel_money ou mpesa
+    - debut: debut souhaite (optionnel, jusqu'a 168 heures a l'avance)
+    
+    Avec un header Idempotency-Key, une nouvelle tentative (reseau mobile
+    instable) recoit la reponse d'origine au lieu de creer une seconde
+    reservation.
     """
+    if idempotency_key is None:
+        return await _reserver(reservation, utilisateur)
+    
+    return await get_idempotence().executer(
+        portee=f"reservation:{utilisateur.uid}",
+        cle=idempotency_key,
+        corps_requete=reservation.model_dump_json(),
+        calcul=lambda: _reserver(reservation, utilisateur),
+        persister=True
+    )
+
+
+async def _reserver(
+    reservation: ReservationCreate,
+    utilisateur: UtilisateurFirebase
+) -> ReservationResponse:
+    """Cree la reservation et notifie les clients."""
     try:
         resultat = await ServiceReservation.creer_reservation(
             place_id=reservation.place_id,
             utilisateur_id=utilisateur.uid,
             duree_heures=reservation.duree_heures,
-            methode_paiement=reservation.methode_paiement
+            methode_paiement=reservation.methode_paiement,
+            debut=reservation.debut
         )
         
         if not resultat.succes:
@@ -61,6 +202,8 @@ async def reserver_place(
                 detail=resultat.message
             )
         
+        await _notifier_reservation(resultat, utilisateur.uid)
+        
         return resultat
         
     except HTTPException:
@@ -73,7 +216,281 @@ async def reserver_place(
         )
 
 
-@router.post("/release/{place_id}")
+async def _notifier_reservation(resultat: ReservationResponse, utilisateur_id: str):
+    """
+    Notifie le proprietaire (et les admins), puis tous les clients.
+    Une reservation a l'avance ne change pas encore l'etat de la place.
+    """
+    if resultat.statut == StatutReservation.PLANIFIEE:
+        await diffuser_reservation(
+            reservation_id=resultat.reservation_id,
+            action="planifiee",
+            donnees={"place_id": resultat.place_id, "debut": resultat.debut, "fin": resultat.fin},
+            utilisateur_id=utilisateur_id
+        )
+        return
+    
+    await diffuser_reservation(
+        reservation_id=resultat.reservation_id,
+        action="creee",
+        donnees={"place_id": resultat.place_id, "fin": resultat.fin},
+        utilisateur_id=utilisateur_id
+    )
+    await diffuser_mise_a_jour_place(
+        place_id=resultat.place_id,
+        statut="reserved"
+    )
+
+
+@router.post(
+    "/reserve/auto", response_model=ReservationResponse,
+    dependencies=[Depends(limiter_utilisateur("reservation"))]
+)
+async def reserver_place_auto(
+    demande: ReservationAutoCreate,
+    utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Reserve une place choisie par le serveur, en un seul appel.
+    
+    - zone: lettre de zone souhaitee (optionnel)
+    - preferences: numeros de places preferes, essayes en premier
+    - autres_zones: accepter une autre zone si la zone demandee est pleine
+    - duree_heures, methode_paiement: comme pour /reserve
+    
+    Si la place choisie est prise entre-temps, la suivante est essayee:
+    le client n'a pas a relire l'etat du parking et recommencer.
+    """
+    if idempotency_key is None:
+        return await _reserver_auto(demande, utilisateur)
+    
+    return await get_idempotence().executer(
+        portee=f"reservation:{utilisateur.uid}",
+        cle=idempotency_key,
+        corps_requete=demande.model_dump_json(),
+        calcul=lambda: _reserver_auto(demande, utilisateur),
+        persister=True
+    )
+
+
+async def _reserver_auto(
+    demande: ReservationAutoCreate,
+    utilisateur: UtilisateurFirebase
+) -> ReservationResponse:
+    """Attribue et reserve une place, puis notifie les clients."""
+    try:
+        resultat = await ServiceReservation.reserver_automatiquement(
+            utilisateur_id=utilisateur.uid,
+            duree_heures=demande.duree_heures,
+            methode_paiement=demande.methode_paiement,
+            zone=demande.zone,
+            preferences=demande.preferences,
+            autres_zones=demande.autres_zones
+        )
+        
+        if not resultat.succes:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=resultat.message
+            )
+        
+        await _notifier_reservation(resultat, utilisateur.uid)
+        
+        return resultat
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur reservation automatique: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur lors de la reservation"
+        )
+
+
+@router.post(
+    "/reserve/lot", response_model=ReservationLotResponse,
+    dependencies=[Depends(limiter_utilisateur("reservation"))]
+)
+async def reserver_lot(
+    demande: ReservationLotCreate,
+    utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Reserve plusieurs places en un seul appel (taxis, navettes d'hotel).
+    
+    - nombre: nombre de places (2 a 20)
+    - zone: lettre de zone (optionnel)
+    - contigues: places voisines (A3, A4, A5...) d'une meme zone
+    - telephone: numero debite pour le paiement groupe
+    - duree_heures, methode_paiement, debut: comme pour /reserve
+    
+    Tout ou rien: les places et le paiement sont ecrits dans une seule
+    transaction, une reponse unique porte le lot_id.
+    """
+    if idempotency_key is None:
+        return await _reserver_lot(demande, utilisateur)
+    
+    return await get_idempotence().executer(
+        portee=f"reservation:{utilisateur.uid}",
+        cle=idempotency_key,
+        corps_requete=demande.model_dump_json(),
+        calcul=lambda: _reserver_lot(demande, utilisateur),
+        persister=True
+    )
+
+
+async def _reserver_lot(
+    demande: ReservationLotCreate,
+    utilisateur: UtilisateurFirebase
+) -> ReservationLotResponse:
+    """Reserve le lot et notifie les clients."""
+    try:
+        resultat = await ServiceReservation.reserver_lot(
+            utilisateur_id=utilisateur.uid,
+            nombre=demande.nombre,
+            duree_heures=demande.duree_heures,
+            methode_paiement=demande.methode_paiement,
+            telephone=demande.telephone,
+            zone=demande.zone,
+            contigues=demande.contigues,
+            debut=demande.debut
+        )
+        
+        if not resultat.succes:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=resultat.message
+            )
+        
+        planifie = resultat.reservations[0].statut == StatutReservation.PLANIFIEE
+        
+        await diffuser_reservation(
+            reservation_id=resultat.lot_id,
+            action="lot_planifie" if planifie else "lot_cree",
+            donnees={
+                "places": [r.place_id for r in resultat.reservations],
+                "debut": resultat.debut,
+                "fin": resultat.fin
+            },
+            utilisateur_id=utilisateur.uid
+        )
+        
+        if not planifie:
+            for reservation in resultat.reservations:
+                await diffuser_mise_a_jour_place(
+                    place_id=reservation.place_id,
+                    statut="reserved"
+                )
+        
+        return resultat
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur reservation de groupe: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur lors de la reservation"
+        )
+
+
+@router.post(
+    "/extend/{reservation_id}", response_model=ReservationResponse,
+    dependencies=[Depends(limiter_utilisateur("reservation"))]
+)
+async def prolonger_reservation(
+    reservation_id: str,
+    prolongation: ProlongationCreate,
+    utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Prolonge une reservation (vol retarde) sans la liberer ni reserver
+    a nouveau: la fin est repoussee de heures sur la reservation et la
+    place, et l'expiration est replanifiee.
+    
+    - heures: heures ajoutees (duree totale limitee a 168 heures)
+    
+    montant dans la reponse est le supplement a payer. Avec un header
+    Idempotency-Key, une nouvelle tentative ne prolonge pas deux fois.
+    """
+    if idempotency_key is None:
+        return await _prolonger(reservation_id, prolongation, utilisateur)
+    
+    return await get_idempotence().executer(
+        portee=f"reservation:{utilisateur.uid}",
+        cle=idempotency_key,
+        corps_requete=f"{reservation_id}:{prolongation.model_dump_json()}",
+        calcul=lambda: _prolonger(reservation_id, prolongation, utilisateur),
+        persister=True
+    )
+
+
+async def _prolonger(
+    reservation_id: str,
+    prolongation: ProlongationCreate,
+    utilisateur: UtilisateurFirebase
+) -> ReservationResponse:
+    """Verifie le proprietaire, prolonge et notifie les clients."""
+    try:
+        reservation = await ServiceReservation.obtenir_reservation(reservation_id)
+        
+        if not reservation:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Reservation introuvable"
+            )
+        
+        if reservation.utilisateur_id != utilisateur.uid:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Vous ne pouvez pas prolonger cette reservation"
+            )
+        
+        resultat, statut_place = await ServiceReservation.prolonger_reservation(
+            reservation_id, prolongation.heures
+        )
+        
+        if not resultat.succes:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=resultat.message
+            )
+        
+        await diffuser_reservation(
+            reservation_id=reservation_id,
+            action="prolongee",
+            donnees={"place_id": resultat.place_id, "fin": resultat.fin},
+            utilisateur_id=utilisateur.uid
+        )
+        
+        if resultat.statut == StatutReservation.ACTIVE:
+            # Temps restant de la place modifie
+            await diffuser_mise_a_jour_place(
+                place_id=resultat.place_id,
+                statut=statut_place,
+                donnees={"raison": "prolongation", "fin": resultat.fin}
+            )
+        
+        return resultat
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur prolongation reservation {reservation_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur lors de la prolongation"
+        )
+
+
+@router.post(
+    "/release/{place_id}",
+    dependencies=[Depends(limiter_utilisateur("utilisateur"))]
+)
 async def liberer_place(
     place_id: str,
     utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant)
@@ -107,6 +524,13 @@ async def liberer_place(
                 detail="Erreur lors de la liberation"
             )
         
+        await diffuser_mise_a_jour_place(
+            place_id=place_id,
+            statut="available",
+            donnees={"raison": "liberation"}
+        )
+        await proposer_place_liberee(place_id)
+        
         return {
             "succes": True,
             "message": f"Place {place.numero} liberee"
@@ -122,23 +546,133 @@ async def liberer_place(
         )
 
 
-@router.get("/mes-reservations")
-async def obtenir_mes_reservations(
+@router.post(
+    "/waitlist", response_model=InscriptionAttenteResponse,
+    dependencies=[Depends(limiter_utilisateur("utilisateur"))]
+)
+async def rejoindre_file_attente(
+    demande: InscriptionAttenteCreate,
     utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant)
 ):
     """
-    Retourne l'historique des reservations de l'utilisateur.
+    Inscrit l'utilisateur dans la file d'attente quand le parking est plein.
+    
+    - zone: zone souhaitee (absente: premiere place liberee, toutes zones)
+    
+    Au lieu d'interroger /status, le client garde sa connexion WebSocket:
+    a la prochaine place liberee de la zone, un message "file_attente"
+    (action "proposee") lui indique la place, retenue pour lui pendant
+    quelques minutes. Il la reserve alors avec POST /reserve.
     """
     try:
-        reservations = await ServiceReservation.obtenir_reservations_utilisateur(
-            utilisateur.uid
+        resultat = await ServiceFileAttente.inscrire(utilisateur.uid, demande.zone)
+        
+        if not resultat.succes:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=resultat.message
+            )
+        
+        return resultat
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur inscription file d'attente: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur lors de l'inscription"
         )
+
+
+@router.get(
+    "/waitlist", response_model=InscriptionAttenteResponse,
+    dependencies=[Depends(limiter_utilisateur("utilisateur"))]
+)
+async def obtenir_file_attente(
+    utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant)
+):
+    """Position dans la file ou place retenue (apres une reconnexion)."""
+    resultat = await ServiceFileAttente.obtenir(utilisateur.uid)
+    
+    if resultat is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Vous n'etes pas dans la file d'attente"
+        )
+    
+    return resultat
+
+
+@router.delete(
+    "/waitlist",
+    dependencies=[Depends(limiter_utilisateur("utilisateur"))]
+)
+async def quitter_file_attente(
+    utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant)
+):
+    """Quitte la file d'attente. Une place retenue passe a la personne suivante."""
+    try:
+        annulee, place_rendue = await ServiceFileAttente.quitter(utilisateur.uid)
+        
+        if not annulee:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Vous n'etes pas dans la file d'attente"
+            )
+        
+        if place_rendue:
+            get_planificateur().annuler(ECHEANCE_RETENUE, place_rendue)
+            await proposer_place_liberee(place_rendue)
         
         return {
-            "total": len(reservations),
-            "reservations": [r.model_dump() for r in reservations]
+            "succes": True,
+            "message": "Vous avez quitte la file d'attente"
         }
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur sortie file d'attente: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur lors de la sortie de la file d'attente"
+        )
+
+
+@router.get(
+    "/mes-reservations", response_model=PageReservations,
+    dependencies=[Depends(limiter_utilisateur("utilisateur"))]
+)
+async def obtenir_mes_reservations(
+    limit: int = Query(20, ge=1, le=100),
+    apres: Optional[str] = None,
+    utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant)
+):
+    """
+    Retourne l'historique des reservations de l'utilisateur, par pages.
+    
+    - limit: nombre de reservations par page (1 a 100)
+    - apres: valeur "suivant" de la page precedente
+    """
+    try:
+        reservations, suivant, total = await ServiceReservation.obtenir_page_reservations_utilisateur(
+            utilisateur.uid,
+            limite=limit,
+            apres=apres
+        )
+        
+        return reponse_modele(PageReservations(
+            total=total,
+            reservations=reservations,
+            suivant=suivant
+        ))
+        
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Erreur recuperation reservations: {e}")
         raise HTTPException(
@@ -1,20 +1,32 @@
 # Router capteurs ESP8266
 # =======================
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from typing import Optional
 from loguru import logger
 
 from security.api_key import verifier_cle_api
+from security.limitation import limiter_capteur, get_limiteur
 from models.sensor import MiseAJourCapteur, ReponseCapteur
+from models.parking import StatutPlace
 from services.sensor_service import ServiceCapteur
+from routers.websocket import diffuser_signal_capteur, diffuser_mise_a_jour_place
+from utils.metriques import MESSAGES_CAPTEURS
+from utils.idempotence import get_idempotence
+from utils.scheduler import proposer_place_liberee
 
 router = APIRouter(prefix="/sensor", tags=["Capteurs ESP8266"])
 
 
-@router.post("/update", response_model=ReponseCapteur)
+@router.post(
+    "/update",
+    response_model=ReponseCapteur,
+    dependencies=[Depends(limiter_capteur("cle_api"))]
+)
 async def recevoir_signal_capteur(
     data: MiseAJourCapteur,
-    _: bool = Depends(verifier_cle_api)
+    _: bool = Depends(verifier_cle_api),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Recoit les donnees d'un capteur ESP8266.
@@ -25,11 +37,44 @@ async def recevoir_signal_capteur(
     - force_signal: RSSI WiFi (optionnel)
     
     Necessite le header X-API-Key avec la cle valide.
+    Un header Idempotency-Key (ex: numero de lecture) evite de retraiter
+    une lecture renvoyee par le capteur.
     """
     logger.debug(f"Signal capteur recu: place {data.place_id}, etat {data.etat}")
+    MESSAGES_CAPTEURS.inc(data.etat.value)
+    
+    # Budget par place: protege contre un capteur en boucle
+    await get_limiteur().verifier(f"place:{data.place_id}", "capteur")
     
+    if idempotency_key is None:
+        return await _traiter_signal(data)
+    
+    return await get_idempotence().executer(
+        portee=f"capteur:{data.place_id}",
+        cle=idempotency_key,
+        # RSSI et batterie peuvent varier entre deux envois de la meme lecture
+        corps_requete=f"{data.place_id}:{data.etat.value}",
+        calcul=lambda: _traiter_signal(data)
+    )
+
+
+async def _traiter_signal(data: MiseAJourCapteur) -> ReponseCapteur:
+    """Applique le signal et diffuse les changements de statut."""
     resultat = await ServiceCapteur.traiter_signal_capteur(data)
     
+    # Diffuser uniquement les changements de statut
+    if resultat.succes and resultat.nouveau_statut:
+        await diffuser_signal_capteur(data.place_id, data.etat.value)
+        await diffuser_mise_a_jour_place(
+            place_id=data.place_id,
+            statut=resultat.nouveau_statut,
+            donnees={"raison": "capteur"}
+        )
+        
+        if resultat.nouveau_statut == StatutPlace.DISPONIBLE.value:
+            # Vehicule parti: place proposee a la file d'attente
+            await proposer_place_liberee(data.place_id)
+    
     return resultat
 
 
@@ -72,7 +117,10 @@ async def obtenir_tous_capteurs(
     }
 
 
-@router.post("/test/{place_id}")
+@router.post(
+    "/test/{place_id}",
+    dependencies=[Depends(limiter_capteur("cle_api"))]
+)
 async def tester_capteur(
     place_id: str,
     occupe: bool,
@@ -0,0 +1,208 @@
+# Router Server-Sent Events pour les tableaux d'affichage
+# ========================================================
+
+from fastapi import APIRouter, Header, Request
+from fastapi.responses import StreamingResponse
+from collections import deque
+from typing import AsyncIterator, Deque, Optional, Set, Tuple
+from datetime import datetime
+from loguru import logger
+import asyncio
+import json
+import uuid
+
+from config import get_settings
+from utils.bus_evenements import get_bus, CANAL_DIFFUSION
+
+router = APIRouter(prefix="/parking", tags=["Temps reel"])
+
+# Intervalle des commentaires keep-alive (evite la coupure par les proxies)
+INTERVALLE_KEEPALIVE = 15
+
+
+class GestionnaireFluxSSE:
+    """
+    Alimente les clients SSE a partir du bus d'evenements.
+    Garde un historique court pour la reprise via Last-Event-ID.
+    
+    Les identifiants SSE sont numerotes ici, dans l'ordre de reception:
+    les horodatages des evenements venus d'autres workers ne sont pas
+    ordonnes entre eux. Un identifiant "<instance>-<numero>" n'est valable
+    que pour ce worker; ailleurs (ou apres redemarrage) la reprise se fait
+    par un nouveau snapshot.
+    """
+    
+    def __init__(self, taille_historique: int = 500, taille_file: int = 100):
+        """
+        Args:
+            taille_historique: nombre d'evenements gardes pour la reprise
+            taille_file: evenements en attente par client avant deconnexion
+        """
+        self.taille_file = taille_file
+        self.instance = uuid.uuid4().hex[:8]
+        self.sequence = 0
+        # (numero, message) dans l'ordre de reception
+        self._historique: Deque[Tuple[int, dict]] = deque(maxlen=taille_historique)
+        self._files: Set[asyncio.Queue] = set()
+    
+    async def recevoir(self, message: dict):
+        """Abonne au bus: numerote l'evenement, le memorise et le pousse aux clients."""
+        if "id" not in message:
+            return
+        
+        self.sequence += 1
+        evenement = (self.sequence, message)
+        self._historique.append(evenement)
+        
+        for file in list(self._files):
+            try:
+                file.put_nowait(evenement)
+            except asyncio.QueueFull:
+                # Client trop lent: il se reconnectera avec Last-Event-ID
+                self._files.discard(file)
+    
+    def ouvrir_file(self) -> asyncio.Queue:
+        """Cree la file d'un nouveau client."""
+        file = asyncio.Queue(maxsize=self.taille_file)
+        self._files.add(file)
+        return file
+    
+    def fermer_file(self, file: asyncio.Queue):
+        """Retire la file d'un client deconnecte."""
+        self._files.discard(file)
+    
+    def identifiant(self, sequence: int) -> str:
+        """Identifiant SSE (Last-Event-ID) d'un numero d'evenement."""
+        return f"{self.instance}-{sequence}"
+    
+    def lire_identifiant(self, identifiant: str) -> Optional[int]:
+        """Numero d'un Last-Event-ID emis par ce worker, sinon None."""
+        instance, _, sequence = identifiant.partition("-")
+        if instance != self.instance or not sequence.isdigit():
+            return None
+        return int(sequence)
+    
+    def evenements_depuis(self, derniere_sequence: int) -> Optional[list[Tuple[int, dict]]]:
+        """
+        Retourne les evenements posterieurs a derniere_sequence.
+        None si l'historique ne remonte pas assez loin (snapshot necessaire).
+        """
+        premiere = self._historique[0][0] if self._historique else self.sequence + 1
+        if not premiere - 1 <= derniere_sequence <= self.sequence:
+            return None
+        
+        return [e for e in self._historique if e[0] > derniere_sequence]
+    
+    def est_active(self, file: asyncio.Queue) -> bool:
+        """Indique si la file recoit encore les evenements."""
+        return file in self._files
+    
+    def nombre_clients(self) -> int:
+        """Retourne le nombre de clients SSE connectes."""
+        return len(self._files)
+
+
+# Instance globale
+gestionnaire_sse = GestionnaireFluxSSE(
+    taille_historique=get_settings().SSE_TAILLE_HISTORIQUE
+)
+get_bus().abonner(CANAL_DIFFUSION, gestionnaire_sse.recevoir)
+
+
+def get_gestionnaire_sse() -> GestionnaireFluxSSE:
+    """Retourne le gestionnaire des flux SSE."""
+    return gestionnaire_sse
+
+
+def formater_evenement(message: dict, sequence: int) -> str:
+    """Formate un evenement au format text/event-stream."""
+    donnees = json.dumps(message, ensure_ascii=False, default=str)
+    identifiant = gestionnaire_sse.identifiant(sequence)
+    return f"id: {identifiant}\nevent: {message['type']}\ndata: {donnees}\n\n"
+
+
+async def _generer_flux(
+    request: Request,
+    derniere_sequence: Optional[int]
+) -> AsyncIterator[str]:
+    """Produit le snapshot ou la reprise, puis les evenements en direct."""
+    from utils.cache_etat import get_cache_etat
+    from routers.websocket import masquer_proprietaires, generer_id_evenement
+    
+    # S'abonner avant de lire l'etat pour ne perdre aucun evenement
+    file = gestionnaire_sse.ouvrir_file()
+    
+    try:
+        yield "retry: 3000\n\n"
+        
+        manques = None
+        if derniere_sequence is not None:
+            manques = gestionnaire_sse.evenements_depuis(derniere_sequence)
+        
+        if manques is None:
+            # Les evenements deja recus sont inclus dans le snapshot
+            derniere_sequence = gestionnaire_sse.sequence
+            etat = await get_cache_etat().obtenir_etat()
+            snapshot = {
+                "id": generer_id_evenement(),
+                "type": "etat_parking",
+                "donnees": masquer_proprietaires(etat.model_dump(), None),
+                "timestamp": datetime.now().isoformat()
+            }
+            yield formater_evenement(snapshot, derniere_sequence)
+        else:
+            for sequence, message in manques:
+                derniere_sequence = sequence
+                yield formater_evenement(message, sequence)
+        
+        while not await request.is_disconnected():
+            try:
+                sequence, message = await asyncio.wait_for(file.get(), INTERVALLE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            
+            if not gestionnaire_sse.est_active(file) and file.empty():
+                # File abandonnee pour lenteur
+                break
+            
+            # Deja envoye via la reprise ou anterieur au snapshot
+            if sequence <= derniere_sequence:
+                continue
+            
+            derniere_sequence = sequence
+            yield formater_evenement(message, sequence)
+        
+    finally:
+        gestionnaire_sse.fermer_file(file)
+
+
+@router.get("/stream")
+async def flux_parking(
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Flux Server-Sent Events en lecture seule de l'etat du parking.
+    Destine aux ecrans de l'aeroport et a la page publique.
+    
+    - Premier evenement: snapshot "etat_parking"
+    - Ensuite: "mise_a_jour_place" et "capteur", comme sur /ws/parking
+    - Reprise: le navigateur renvoie Last-Event-ID a la reconnexion et
+      recoit les evenements manques (ou un nouveau snapshot si trop ancien)
+    """
+    derniere_sequence = None
+    if last_event_id:
+        derniere_sequence = gestionnaire_sse.lire_identifiant(last_event_id)
+        if derniere_sequence is None:
+            # Autre worker ou worker redemarre: nouveau snapshot
+            logger.debug(f"Last-Event-ID inconnu ignore: {last_event_id}")
+    
+    return StreamingResponse(
+        _generer_flux(request, derniere_sequence),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -1,12 +1,18 @@
 # Router WebSocket pour temps reel
 # =================================
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Set
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, status
+from typing import Dict, Iterable, Optional, Set
 from datetime import datetime
 from loguru import logger
 import asyncio
 import json
+import time
+
+from config import get_settings
+from utils.bus_evenements import get_bus, CANAL_DIFFUSION, CANAL_CIBLE
+from utils.encodage import encoder_etat_compact, PROTOCOLE_COMPACT
+from utils.metriques import get_registre, Compteur, Jauge, RETARD_DIFFUSION
 
 router = APIRouter(tags=["WebSocket"])
 
@@ -14,36 +20,155 @@ router = APIRouter(tags=["WebSocket"])
 class GestionnaireConnexions:
     """Gere les connexions WebSocket pour les mises a jour en temps reel."""
     
-    def __init__(self):
+    def __init__(
+        self,
+        intervalle_ping: int = 25,
+        delai_pong: int = 10,
+        max_connexions: int = 5000,
+        max_par_ip: int = 20
+    ):
+        """
+        Args:
+            intervalle_ping: secondes entre deux pings envoyes par le serveur
+            delai_pong: secondes accordees au client pour repondre
+            max_connexions: plafond global de connexions sur ce worker
+            max_par_ip: plafond de connexions par adresse IP
+        """
+        self.intervalle_ping = intervalle_ping
+        self.delai_pong = delai_pong
+        self.max_connexions = max_connexions
+        self.max_par_ip = max_par_ip
+        
         self.connexions_actives: Set[WebSocket] = set()
+        # Index des sessions authentifiees: uid -> connexions
+        self._par_utilisateur: Dict[str, Set[WebSocket]] = {}
+        self._utilisateur_de: Dict[WebSocket, str] = {}
+        self._admins: Set[WebSocket] = set()
+        # Suivi de vivacite et plafonds
+        self._derniere_activite: Dict[WebSocket, float] = {}
+        self._ip_de: Dict[WebSocket, str] = {}
+        self._par_ip: Dict[str, int] = {}
+        self._fermees_inactivite = 0
+        self._refusees_plafond = 0
         self._verrou = asyncio.Lock()
+        self._tache_surveillance: Optional[asyncio.Task] = None
     
-    async def connecter(self, websocket: WebSocket):
-        """Accepte et enregistre une nouvelle connexion."""
-        await websocket.accept()
+    async def connecter(
+        self,
+        websocket: WebSocket,
+        utilisateur_id: Optional[str] = None,
+        est_admin: bool = False
+    ) -> bool:
+        """
+        Accepte et enregistre une nouvelle connexion (anonyme ou authentifiee).
+        Refuse la connexion (code 1013) si un plafond est atteint.
+        """
+        ip = websocket.client.host if websocket.client else "inconnue"
+        
+        async with self._verrou:
+            if (
+                len(self.connexions_actives) >= self.max_connexions
+                or self._par_ip.get(ip, 0) >= self.max_par_ip
+            ):
+                self._refusees_plafond += 1
+                plafond_atteint = True
+            else:
+                # Reserver la place avant l'accept pour ne pas depasser le plafond
+                self._par_ip[ip] = self._par_ip.get(ip, 0) + 1
+                plafond_atteint = False
+        
+        if plafond_atteint:
+            logger.warning(f"Connexion WebSocket refusee pour {ip}: plafond atteint")
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return False
+        
+        try:
+            await websocket.accept()
+        except Exception:
+            # Client parti pendant la poignee de main: rendre la place reservee
+            async with self._verrou:
+                self._liberer_ip(ip)
+            raise
+        
         async with self._verrou:
             self.connexions_actives.add(websocket)
+            self._ip_de[websocket] = ip
+            self._derniere_activite[websocket] = time.monotonic()
+            if utilisateur_id:
+                self._par_utilisateur.setdefault(utilisateur_id, set()).add(websocket)
+                self._utilisateur_de[websocket] = utilisateur_id
+            if est_admin:
+                self._admins.add(websocket)
         logger.debug(f"Nouvelle connexion WebSocket. Total: {len(self.connexions_actives)}")
+        return True
+    
+    def _liberer_ip(self, ip: str):
+        """Rend une place du plafond par IP (appele sous le verrou)."""
+        restantes = self._par_ip.get(ip, 1) - 1
+        if restantes > 0:
+            self._par_ip[ip] = restantes
+        else:
+            self._par_ip.pop(ip, None)
     
     async def deconnecter(self, websocket: WebSocket):
-        """Retire une connexion."""
+        """Retire une connexion et ses entrees d'index."""
         async with self._verrou:
             self.connexions_actives.discard(websocket)
+            self._admins.discard(websocket)
+            self._derniere_activite.pop(websocket, None)
+            
+            ip = self._ip_de.pop(websocket, None)
+            if ip is not None:
+                self._liberer_ip(ip)
+            
+            utilisateur_id = self._utilisateur_de.pop(websocket, None)
+            if utilisateur_id:
+                sockets = self._par_utilisateur.get(utilisateur_id)
+                if sockets is not None:
+                    sockets.discard(websocket)
+                    if not sockets:
+                        del self._par_utilisateur[utilisateur_id]
         logger.debug(f"Connexion WebSocket fermee. Total: {len(self.connexions_actives)}")
     
+    async def _envoyer_texte(self, connexions: Iterable[WebSocket], texte: str):
+        """Envoie un texte deja serialise a une liste de connexions."""
+        for connexion in list(connexions):
+            try:
+                await connexion.send_text(texte)
+            except Exception:
+                await self.deconnecter(connexion)
+    
     async def diffuser(self, message: dict):
-        """Envoie un message a tous les clients connectes."""
+        """Envoie un message a tous les clients connectes a ce worker."""
         if not self.connexions_actives:
             return
         
         texte = json.dumps(message, ensure_ascii=False, default=str)
-        connexions = list(self.connexions_actives)
+        await self._envoyer_texte(self.connexions_actives, texte)
         
-        for connexion in connexions:
-            try:
-                await connexion.send_text(texte)
-            except Exception:
-                await self.deconnecter(connexion)
+        # L'id d'un evenement public est son instant de publication (microsecondes)
+        if "id" in message:
+            RETARD_DIFFUSION.observer(time.time() - message["id"] / 1_000_000, CANAL_DIFFUSION)
+    
+    async def diffuser_cible(self, enveloppe: dict):
+        """
+        Envoie un message aux seules sessions concernees de ce worker:
+        les connexions des utilisateurs cites et, si demande, les admins.
+        Cout proportionnel aux destinataires, pas au nombre de connexions.
+        """
+        destinataires: Set[WebSocket] = set()
+        
+        for utilisateur_id in enveloppe.get("utilisateurs", ()):
+            destinataires.update(self._par_utilisateur.get(utilisateur_id, ()))
+        
+        if enveloppe.get("admins"):
+            destinataires.update(self._admins)
+        
+        if not destinataires:
+            return
+        
+        texte = json.dumps(enveloppe["message"], ensure_ascii=False, default=str)
+        await self._envoyer_texte(destinataires, texte)
     
     async def envoyer_a_client(self, websocket: WebSocket, message: dict):
         """Envoie un message a un client specifique."""
@@ -53,13 +178,131 @@ class GestionnaireConnexions:
         except Exception:
             await self.deconnecter(websocket)
     
+    def marquer_activite(self, websocket: WebSocket):
+        """Note qu'un message (pong ou autre) vient d'etre recu du client."""
+        if websocket in self._derniere_activite:
+            self._derniere_activite[websocket] = time.monotonic()
+    
+    async def demarrer_surveillance(self):
+        """Demarre la tache de ping et de fermeture des connexions inactives."""
+        if self._tache_surveillance is None:
+            self._tache_surveillance = asyncio.create_task(self._boucle_surveillance())
+    
+    async def arreter_surveillance(self):
+        """Arrete la tache de surveillance."""
+        if self._tache_surveillance:
+            self._tache_surveillance.cancel()
+            try:
+                await self._tache_surveillance
+            except asyncio.CancelledError:
+                pass
+            self._tache_surveillance = None
+    
+    async def _boucle_surveillance(self):
+        """Envoie un ping periodique et ferme les clients muets."""
+        while True:
+            await asyncio.sleep(self.intervalle_ping)
+            try:
+                await self._verifier_vivacite()
+            except Exception as e:
+                logger.error(f"Erreur surveillance WebSocket: {e}")
+    
+    async def _verifier_vivacite(self):
+        """
+        Ferme les connexions sans activite depuis plus d'un intervalle de ping
+        plus le delai de reponse, et envoie un ping aux autres.
+        """
+        limite = time.monotonic() - (self.intervalle_ping + self.delai_pong)
+        inactives = [
+            ws for ws, derniere in self._derniere_activite.items()
+            if derniere < limite
+        ]
+        
+        for websocket in inactives:
+            self._fermees_inactivite += 1
+            await self.deconnecter(websocket)
+        
+        # Fermetures en parallele: des clients morts ne bloquent pas le ping
+        await asyncio.gather(
+            *(self._fermer(websocket) for websocket in inactives),
+            return_exceptions=True
+        )
+        
+        if inactives:
+            logger.info(f"{len(inactives)} connexion(s) WebSocket inactive(s) fermee(s)")
+        
+        await self.diffuser({
+            "type": "ping",
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    @staticmethod
+    async def _fermer(websocket: WebSocket):
+        """Ferme une connexion inactive sans attendre plus de 5s."""
+        try:
+            await asyncio.wait_for(websocket.close(code=status.WS_1001_GOING_AWAY), 5)
+        except Exception:
+            pass
+    
+    def statistiques(self) -> dict:
+        """Jauges de connexion de ce worker."""
+        return {
+            "connexions": len(self.connexions_actives),
+            "authentifiees": len(self._utilisateur_de),
+            "utilisateurs": len(self._par_utilisateur),
+            "admins": len(self._admins),
+            "adresses_ip": len(self._par_ip),
+            "fermees_inactivite": self._fermees_inactivite,
+            "refusees_plafond": self._refusees_plafond
+        }
+    
+    def utilisateur_de(self, websocket: WebSocket) -> Optional[str]:
+        """Retourne l'uid associe a une connexion, None si anonyme."""
+        return self._utilisateur_de.get(websocket)
+    
+    def est_admin(self, websocket: WebSocket) -> bool:
+        """Indique si la connexion appartient a un administrateur."""
+        return websocket in self._admins
+    
     def nombre_connexions(self) -> int:
         """Retourne le nombre de connexions actives."""
         return len(self.connexions_actives)
 
 
 # Instance globale
-gestionnaire = GestionnaireConnexions()
+_settings = get_settings()
+gestionnaire = GestionnaireConnexions(
+    intervalle_ping=_settings.WS_INTERVALLE_PING,
+    delai_pong=_settings.WS_DELAI_PONG,
+    max_connexions=_settings.WS_MAX_CONNEXIONS,
+    max_par_ip=_settings.WS_MAX_CONNEXIONS_PAR_IP
+)
+
+# Les messages publies sur le bus (par ce worker ou un autre) sont
+# livres aux sockets detenus par ce worker
+get_bus().abonner(CANAL_DIFFUSION, gestionnaire.diffuser)
+get_bus().abonner(CANAL_CIBLE, gestionnaire.diffuser_cible)
+
+# Valeurs lues a chaque exposition de /metrics
+_FERMETURES = ("fermees_inactivite", "refusees_plafond")
+
+get_registre().enregistrer(Jauge(
+    "aeropark_websocket_connexions",
+    "Connexions WebSocket de ce worker",
+    ("type",),
+    fonction=lambda: {
+        (cle,): valeur for cle, valeur in gestionnaire.statistiques().items()
+        if cle not in _FERMETURES
+    }
+))
+get_registre().enregistrer(Compteur(
+    "aeropark_websocket_fermetures_total",
+    "Connexions WebSocket fermees ou refusees par le serveur",
+    ("raison",),
+    fonction=lambda: {
+        (cle,): gestionnaire.statistiques()[cle] for cle in _FERMETURES
+    }
+))
 
 
 def get_gestionnaire_connexions() -> GestionnaireConnexions:
@@ -67,15 +310,49 @@ def get_gestionnaire_connexions() -> GestionnaireConnexions:
     return gestionnaire
 
 
+async def _authentifier_session(token: str):
+    """
+    Verifie le token passe a la connexion (une seule fois par session).
+    Retourne (uid, est_admin) ou None si le token est invalide.
+    """
+    from security.auth import decoder_token, get_role_utilisateur
+    from models.user import RoleUtilisateur
+    
+    try:
+        utilisateur = decoder_token(token)
+    except Exception as e:
+        logger.debug(f"Token WebSocket refuse: {e}")
+        return None
+    
+    role = await get_role_utilisateur(utilisateur.uid)
+    return utilisateur.uid, role == RoleUtilisateur.ADMIN
+
+
+def masquer_proprietaires(etat: dict, utilisateur_id: Optional[str]) -> dict:
+    """Retire l'uid des reservations qui n'appartiennent pas au client."""
+    for place in etat.get("places", []):
+        if place.get("reserve_par") and place["reserve_par"] != utilisateur_id:
+            place["reserve_par"] = None
+    return etat
+
+
 @router.websocket("/ws/parking")
-async def websocket_parking(websocket: WebSocket):
+async def websocket_parking(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None)
+):
     """
     Endpoint WebSocket pour les mises a jour en temps reel.
     
-    Les clients recoivent des notifications pour:
+    Connexion anonyme: ws://host/ws/parking
+    Connexion authentifiee: ws://host/ws/parking?token=<token_firebase>
+    
+    Tous les clients recoivent:
     - Changements de statut des places
-    - Mises a jour de reservations
     - Signaux des capteurs
+    
+    Seuls le proprietaire (session authentifiee) et les admins recoivent:
+    - Mises a jour de reservations
     - Expirations de timer
     
     Format des messages:
@@ -84,14 +361,38 @@ async def websocket_parking(websocket: WebSocket):
         "donnees": { ... },
         "timestamp": "..."
     }
+    
+    Snapshot compact: envoyer {"type": "bonjour", "protocole": 2} apres la
+    connexion. Les reponses a "demande_etat" sont alors de type
+    "etat_parking_compact" (colonnes, dictionnaire des places envoye une fois).
+    
+    Le serveur envoie {"type": "ping"} a intervalle regulier. Un client qui
+    n'envoie rien (pas meme {"type": "pong"}) avant l'echeance est deconnecte.
     """
-    await gestionnaire.connecter(websocket)
+    utilisateur_id = None
+    est_admin = False
+    
+    if token:
+        # Verification unique a l'ouverture de la session
+        session = await _authentifier_session(token)
+        if session is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        utilisateur_id, est_admin = session
+    
+    if not await gestionnaire.connecter(websocket, utilisateur_id, est_admin):
+        return
+    
+    # Version du protocole (2 = snapshot compact, voir utils/encodage.py)
+    protocole = 1
+    signature_envoyee = None
     
     try:
         # Confirmation de connexion
         await gestionnaire.envoyer_a_client(websocket, {
             "type": "connexion_etablie",
             "message": "Connecte au systeme AeroPark",
+            "authentifie": utilisateur_id is not None,
             "timestamp": datetime.now().isoformat()
         })
         
@@ -99,25 +400,58 @@ async def websocket_parking(websocket: WebSocket):
         while True:
             try:
                 data = await websocket.receive_text()
+                gestionnaire.marquer_activite(websocket)
                 message = json.loads(data)
                 
                 # Traiter les differents types de messages
                 type_msg = message.get("type")
                 
-                if type_msg == "ping":
+                if type_msg == "pong":
+                    # Reponse au ping du serveur, l'activite est deja notee
+                    continue
+                    
+                elif type_msg == "ping":
                     await gestionnaire.envoyer_a_client(websocket, {
                         "type": "pong",
                         "timestamp": datetime.now().isoformat()
                     })
                 
+                elif type_msg == "bonjour":
+                    # Negociation de la version du protocole
+                    demande = message.get("protocole", 1)
+                    protocole = PROTOCOLE_COMPACT if demande == PROTOCOLE_COMPACT else 1
+                    signature_envoyee = None
+                    
+                    await gestionnaire.envoyer_a_client(websocket, {
+                        "type": "bonjour",
+                        "protocole": protocole,
+                        "timestamp": datetime.now().isoformat()
+                    })
+                    
                 elif type_msg == "demande_etat":
                     # Le client demande l'etat actuel du parking
-                    from services.parking_service import ServiceParking
+                    from utils.cache_etat import get_cache_etat
+                    
+                    etat = await get_cache_etat().obtenir_etat()
+                    
+                    if protocole == PROTOCOLE_COMPACT:
+                        compact = encoder_etat_compact(etat, signature_envoyee, utilisateur_id)
+                        signature_envoyee = compact["dict"]
+                        
+                        await gestionnaire.envoyer_a_client(websocket, {
+                            "type": "etat_parking_compact",
+                            "donnees": compact,
+                            "timestamp": datetime.now().isoformat()
+                        })
+                        continue
+                    
+                    donnees = etat.model_dump()
+                    if not est_admin:
+                        donnees = masquer_proprietaires(donnees, utilisateur_id)
                     
-                    etat = await ServiceParking.obtenir_etat_parking()
                     await gestionnaire.envoyer_a_client(websocket, {
                         "type": "etat_parking",
-                        "donnees": etat.model_dump(),
+                        "donnees": donnees,
                         "timestamp": datetime.now().isoformat()
                     })
                 
@@ -136,6 +470,27 @@ async def websocket_parking(websocket: WebSocket):
 
 
 # Fonctions de diffusion pour etre appelees par les autres services
+# Elles publient sur le bus d'evenements pour atteindre tous les workers
+
+_dernier_id_evenement = 0
+
+
+def generer_id_evenement() -> int:
+    """
+    Identifiant d'un evenement public (microsecondes epoch), croissant
+    dans le worker emetteur. Sert a mesurer le retard de diffusion; le
+    flux SSE numerote lui-meme les evenements dans l'ordre de reception.
+    """
+    global _dernier_id_evenement
+    _dernier_id_evenement = max(time.time_ns() // 1000, _dernier_id_evenement + 1)
+    return _dernier_id_evenement
+
+
+async def _publier_public(message: dict):
+    """Publie un evenement public (WebSocket et SSE) avec son identifiant."""
+    message["id"] = generer_id_evenement()
+    await get_bus().publier(CANAL_DIFFUSION, message)
+
 
 async def diffuser_mise_a_jour_place(place_id: str, statut: str, donnees: dict = None):
     """Diffuse une mise a jour de place a tous les clients."""
@@ -148,11 +503,29 @@ async def diffuser_mise_a_jour_place(place_id: str, statut: str, donnees: dict =
         },
         "timestamp": datetime.now().isoformat()
     }
-    await gestionnaire.diffuser(message)
+    await _publier_public(message)
+
+
+async def diffuser_a_utilisateur(utilisateur_id: Optional[str], message: dict, admins: bool = True):
+    """
+    Envoie un message aux sessions d'un utilisateur et, par defaut, aux admins.
+    Les clients anonymes ne le recoivent jamais.
+    """
+    enveloppe = {
+        "utilisateurs": [utilisateur_id] if utilisateur_id else [],
+        "admins": admins,
+        "message": message
+    }
+    await get_bus().publier(CANAL_CIBLE, enveloppe)
 
 
-async def diffuser_reservation(reservation_id: str, action: str, donnees: dict = None):
-    """Diffuse une mise a jour de reservation."""
+async def diffuser_reservation(
+    reservation_id: str,
+    action: str,
+    donnees: dict = None,
+    utilisateur_id: str = None
+):
+    """Envoie une mise a jour de reservation au proprietaire et aux admins."""
     message = {
         "type": "reservation",
         "donnees": {
@@ -162,7 +535,7 @@ async def diffuser_reservation(reservation_id: str, action: str, donnees: dict =
         },
         "timestamp": datetime.now().isoformat()
     }
-    await gestionnaire.diffuser(message)
+    await diffuser_a_utilisateur(utilisateur_id, message)
 
 
 async def diffuser_signal_capteur(place_id: str, etat: str, donnees: dict = None):
@@ -176,11 +549,45 @@ async def diffuser_signal_capteur(place_id: str, etat: str, donnees: dict = None
         },
         "timestamp": datetime.now().isoformat()
     }
-    await gestionnaire.diffuser(message)
+    await _publier_public(message)
+
+
+async def diffuser_proposition_place(
+    utilisateur_id: str,
+    place_id: str,
+    retenue_jusqu_a: datetime,
+    action: str = "proposee"
+):
+    """Informe un utilisateur de la file d'attente d'une place retenue pour lui."""
+    message = {
+        "type": "file_attente",
+        "donnees": {
+            "action": action,
+            "place_id": place_id,
+            "retenue_jusqu_a": retenue_jusqu_a.isoformat() if retenue_jusqu_a else None
+        },
+        "timestamp": datetime.now().isoformat()
+    }
+    await diffuser_a_utilisateur(utilisateur_id, message, admins=False)
+
+
+async def diffuser_notification(notification):
+    """Envoie une notification de la boite d'envoi aux sessions de son destinataire."""
+    message = {
+        "type": "notification",
+        "donnees": {
+            "notification_id": notification.id,
+            "type": notification.type,
+            "message": notification.message,
+            **notification.donnees
+        },
+        "timestamp": datetime.now().isoformat()
+    }
+    await diffuser_a_utilisateur(notification.utilisateur_id, message, admins=False)
 
 
 async def diffuser_expiration(reservation_id: str, place_id: str, utilisateur_id: str):
-    """Diffuse une expiration de reservation."""
+    """Envoie une expiration de reservation au proprietaire et aux admins."""
     message = {
         "type": "expiration",
         "donnees": {
@@ -190,4 +597,4 @@ async def diffuser_expiration(reservation_id: str, place_id: str, utilisateur_id
         },
         "timestamp": datetime.now().isoformat()
     }
-    await gestionnaire.diffuser(message)
+    await diffuser_a_utilisateur(utilisateur_id, message)
@@ -3,6 +3,7 @@
 
 from security.auth import (
     schema_bearer,
+    decoder_token,
     verifier_token,
     get_utilisateur_courant,
     get_role_utilisateur,
@@ -11,11 +12,27 @@ from security.auth import (
 
 from security.api_key import verifier_cle_api
 
+from security.limitation import (
+    StockageLimiteur,
+    StockageMemoire,
+    LimiteurDebit,
+    get_limiteur,
+    limiter_utilisateur,
+    limiter_capteur
+)
+
 __all__ = [
     "schema_bearer",
+    "decoder_token",
     "verifier_token",
     "get_utilisateur_courant",
     "get_role_utilisateur",
     "verifier_admin",
-    "verifier_cle_api"
+    "verifier_cle_api",
+    "StockageLimiteur",
+    "StockageMemoire",
+    "LimiteurDebit",
+    "get_limiteur",
+    "limiter_utilisateur",
+    "limiter_capteur"
 ]
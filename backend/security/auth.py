@@ -13,6 +13,22 @@ from database.firebase import utilisateurs_ref
 schema_bearer = HTTPBearer(auto_error=False)
 
 
+def decoder_token(token: str) -> UtilisateurFirebase:
+    """
+    Verifie un token Firebase brut aupres de Firebase.
+    Laisse remonter les exceptions de firebase_admin.auth.
+    Utilise aussi par le WebSocket, qui n'a pas de header Authorization.
+    """
+    token_decode = auth.verify_id_token(token)
+    
+    return UtilisateurFirebase(
+        uid=token_decode["uid"],
+        email=token_decode.get("email"),
+        nom=token_decode.get("name"),
+        email_verifie=token_decode.get("email_verified", False)
+    )
+
+
 async def verifier_token(
     credentials: HTTPAuthorizationCredentials = Depends(schema_bearer)
 ) -> UtilisateurFirebase:
@@ -30,17 +46,7 @@ async def verifier_token(
     token = credentials.credentials
     
     try:
-        # Verification du token aupres de Firebase
-        token_decode = auth.verify_id_token(token)
-        
-        utilisateur = UtilisateurFirebase(
-            uid=token_decode["uid"],
-            email=token_decode.get("email"),
-            nom=token_decode.get("name"),
-            email_verifie=token_decode.get("email_verified", False)
-        )
-        
-        return utilisateur
+        return decoder_token(token)
         
     except auth.ExpiredIdTokenError:
         raise HTTPException(
@@ -0,0 +1,139 @@
+# Limitation de debit par seau a jetons
+# =====================================
+
+from fastapi import Depends, Header, HTTPException, Request, status
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+from loguru import logger
+import hashlib
+import math
+import time
+
+from config import get_settings
+from models.user import UtilisateurFirebase
+from security.auth import get_utilisateur_courant
+from security.api_key import verifier_cle_api
+
+
+@lru_cache()
+def lire_budget(nom: str) -> Tuple[int, float]:
+    """
+    Lit un budget "N/S" dans la configuration (N requetes par S secondes).
+    Retourne (capacite du seau, jetons ajoutes par seconde).
+    """
+    valeur = getattr(get_settings(), f"LIMITE_{nom.upper()}")
+    nombre, periode = valeur.split("/")
+    return int(nombre), int(nombre) / float(periode)
+
+
+class StockageLimiteur:
+    """
+    Interface de stockage des seaux.
+    Un backend partage (ex: Redis) pour plusieurs workers n'a qu'a
+    implementer consommer de facon atomique.
+    """
+    
+    async def consommer(self, cle: str, capacite: int, debit: float) -> float:
+        """
+        Retire un jeton du seau de la cle.
+        Retourne 0 si la requete est admise, sinon les secondes a attendre.
+        """
+        raise NotImplementedError
+
+
+class StockageMemoire(StockageLimiteur):
+    """Seaux en memoire du worker, bornes en nombre (les plus anciens sont oublies)."""
+    
+    def __init__(self, max_cles: int = 100_000):
+        self.max_cles = max_cles
+        # cle -> (jetons restants, instant de la derniere mise a jour)
+        self._seaux: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+    
+    async def consommer(self, cle: str, capacite: int, debit: float) -> float:
+        maintenant = time.monotonic()
+        jetons, derniere = self._seaux.pop(cle, (float(capacite), maintenant))
+        
+        # Remplissage depuis la derniere requete
+        jetons = min(float(capacite), jetons + (maintenant - derniere) * debit)
+        
+        if jetons >= 1:
+            attente = 0.0
+            jetons -= 1
+        else:
+            attente = (1 - jetons) / debit
+        
+        self._seaux[cle] = (jetons, maintenant)
+        if len(self._seaux) > self.max_cles:
+            self._seaux.popitem(last=False)
+        
+        return attente
+
+
+class LimiteurDebit:
+    """Applique les budgets de la configuration sur un stockage de seaux."""
+    
+    def __init__(self, stockage: StockageLimiteur):
+        self.stockage = stockage
+    
+    async def verifier(self, cle: str, budget: str):
+        """Leve une erreur 429 avec Retry-After si le budget de la cle est epuise."""
+        if not get_settings().LIMITE_DEBIT_ACTIVE:
+            return
+        
+        capacite, debit = lire_budget(budget)
+        attente = await self.stockage.consommer(f"{budget}:{cle}", capacite, debit)
+        
+        if attente > 0:
+            logger.warning(f"Limite {budget} atteinte pour {cle}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Trop de requetes, reessayez plus tard",
+                headers={"Retry-After": str(math.ceil(attente))}
+            )
+
+
+# Instance globale
+limiteur = LimiteurDebit(StockageMemoire())
+
+
+def get_limiteur() -> LimiteurDebit:
+    """Retourne le limiteur de debit du worker."""
+    return limiteur
+
+
+def _ip_client(request: Request) -> str:
+    """Adresse IP du client (telle que vue par le serveur)."""
+    return request.client.host if request.client else "inconnue"
+
+
+def limiter_utilisateur(budget: str):
+    """
+    Dependance limitant un endpoint par utilisateur (uid) et par IP.
+    Le token n'est verifie qu'une fois (dependance partagee avec la route).
+    """
+    async def dependance(
+        request: Request,
+        utilisateur: UtilisateurFirebase = Depends(get_utilisateur_courant)
+    ):
+        await limiteur.verifier(f"ip:{_ip_client(request)}", "ip")
+        await limiteur.verifier(f"uid:{utilisateur.uid}", budget)
+    
+    return dependance
+
+
+def limiter_capteur(budget: str):
+    """
+    Dependance limitant un endpoint capteur par cle API.
+    Pas de budget par IP: les boitiers sont derriere la meme adresse NAT
+    et seraient tous bornes par LIMITE_IP au lieu de LIMITE_CLE_API.
+    """
+    async def dependance(
+        _: bool = Depends(verifier_cle_api),
+        x_api_key: Optional[str] = Header(None, alias="X-API-Key")
+    ):
+        # Empreinte de la cle: le secret n'apparait ni en memoire ni dans les logs
+        empreinte = hashlib.sha256((x_api_key or "").encode()).hexdigest()[:12]
+        await limiteur.verifier(f"cle:{empreinte}", budget)
+    
+    return dependance
@@ -5,10 +5,12 @@ from services.parking_service import ServiceParking
 from services.reservation_service import ServiceReservation
 from services.sensor_service import ServiceCapteur
 from services.payment_service import ServicePaiement
+from services.file_attente_service import ServiceFileAttente
 
 __all__ = [
     "ServiceParking",
     "ServiceReservation",
     "ServiceCapteur",
-    "ServicePaiement"
+    "ServicePaiement",
+    "ServiceFileAttente"
 ]
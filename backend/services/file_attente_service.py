@@ -0,0 +1,314 @@
+# Service de la file d'attente des places
+# =======================================
+
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from loguru import logger
+
+from database.firebase import file_attente_ref, places_ref, executer_transaction
+from database.hydratation import depuis_document, depuis_documents
+from models.file_attente import (
+    InscriptionAttente, InscriptionAttenteResponse, StatutAttente, ZONE_TOUTES
+)
+from models.parking import PlaceParking, StatutPlace
+from utils.calendrier import CalendrierPlace
+from utils.helpers import sans_fuseau, zone_place
+from config import get_settings
+
+
+class ServiceFileAttente:
+    """
+    File d'attente FIFO par zone quand le parking est plein.
+    
+    Une place liberee est retenue quelques instants pour la premiere
+    inscription de sa zone (ou de la file toutes zones si elle est plus
+    ancienne): seul cet utilisateur peut la reserver pendant la retenue.
+    """
+    
+    @staticmethod
+    def retenue_active(place: PlaceParking, maintenant: Optional[datetime] = None) -> bool:
+        """Vrai si la place est retenue pour un utilisateur de la file."""
+        if not place.retenue_pour or place.retenue_jusqu_a is None:
+            return False
+        return sans_fuseau(place.retenue_jusqu_a) > (maintenant or datetime.now())
+    
+    @staticmethod
+    def _inscription_en_cours(inscription: InscriptionAttente) -> bool:
+        """Vrai si l'inscription attend encore une place ou en a une retenue."""
+        if inscription.statut == StatutAttente.EN_ATTENTE:
+            return True
+        return (
+            inscription.statut == StatutAttente.PROPOSEE
+            and inscription.retenue_jusqu_a is not None
+            and sans_fuseau(inscription.retenue_jusqu_a) > datetime.now()
+        )
+    
+    @staticmethod
+    async def inscrire(utilisateur_id: str, zone: Optional[str] = None) -> InscriptionAttenteResponse:
+        """Inscrit l'utilisateur en fin de file (une inscription par utilisateur)."""
+        try:
+            doc = file_attente_ref().document(utilisateur_id).get()
+            
+            if doc.exists:
+                inscription = depuis_document(InscriptionAttente, doc)
+                if ServiceFileAttente._inscription_en_cours(inscription):
+                    reponse = await ServiceFileAttente._reponse(inscription)
+                    reponse.succes = False
+                    reponse.message = "Vous etes deja dans la file d'attente"
+                    return reponse
+            
+            inscription = InscriptionAttente(
+                id=utilisateur_id,
+                utilisateur_id=utilisateur_id,
+                zone=zone.upper() if zone else ZONE_TOUTES
+            )
+            file_attente_ref().document(utilisateur_id).set(inscription.model_dump())
+            
+            logger.info(f"Utilisateur {utilisateur_id} en file d'attente (zone {inscription.zone})")
+            
+            reponse = await ServiceFileAttente._reponse(inscription)
+            reponse.message = "Inscription en file d'attente"
+            return reponse
+            
+        except Exception as e:
+            logger.error(f"Erreur inscription file d'attente: {e}")
+            return InscriptionAttenteResponse(
+                succes=False,
+                message="Erreur lors de l'inscription"
+            )
+    
+    @staticmethod
+    async def obtenir(utilisateur_id: str) -> Optional[InscriptionAttenteResponse]:
+        """Inscription en cours de l'utilisateur, avec sa position."""
+        try:
+            doc = file_attente_ref().document(utilisateur_id).get()
+            
+            if not doc.exists:
+                return None
+            
+            inscription = depuis_document(InscriptionAttente, doc)
+            if not ServiceFileAttente._inscription_en_cours(inscription):
+                return None
+            
+            return await ServiceFileAttente._reponse(inscription)
+            
+        except Exception as e:
+            logger.error(f"Erreur lecture file d'attente {utilisateur_id}: {e}")
+            return None
+    
+    @staticmethod
+    async def _reponse(inscription: InscriptionAttente) -> InscriptionAttenteResponse:
+        """Reponse d'une inscription (position calculee si en attente)."""
+        position = None
+        
+        if inscription.statut == StatutAttente.EN_ATTENTE:
+            # Agregation cote Firestore: inscriptions plus anciennes de la meme file
+            query = (
+                file_attente_ref()
+                .where("zone", "==", inscription.zone)
+                .where("statut", "==", StatutAttente.EN_ATTENTE.value)
+                .where("date_creation", "<", inscription.date_creation)
+            )
+            position = int(query.count().get()[0][0].value) + 1
+        
+        return InscriptionAttenteResponse(
+            succes=True,
+            message="Place retenue pour vous" if inscription.statut == StatutAttente.PROPOSEE
+            else "En file d'attente",
+            statut=inscription.statut,
+            zone=inscription.zone,
+            position=position,
+            place_id=inscription.place_id,
+            retenue_jusqu_a=inscription.retenue_jusqu_a
+        )
+    
+    @staticmethod
+    async def quitter(utilisateur_id: str) -> Tuple[bool, Optional[str]]:
+        """
+        Retire l'utilisateur de la file. Une place qui lui etait retenue
+        est rendue.
+        
+        Returns:
+            (inscription annulee, place rendue ou None)
+        """
+        def quitter(transaction):
+            doc = transaction.get(file_attente_ref().document(utilisateur_id))
+            if not doc.exists:
+                return False, None
+            
+            inscription = depuis_document(InscriptionAttente, doc)
+            if not ServiceFileAttente._inscription_en_cours(inscription):
+                return False, None
+            
+            place_rendue = None
+            if inscription.statut == StatutAttente.PROPOSEE and inscription.place_id:
+                place_doc = transaction.get(places_ref().document(inscription.place_id))
+                if place_doc.exists and place_doc.to_dict().get("retenue_pour") == utilisateur_id:
+                    transaction.update(places_ref().document(inscription.place_id), {
+                        "retenue_pour": None,
+                        "retenue_jusqu_a": None
+                    })
+                    place_rendue = inscription.place_id
+            
+            transaction.update(file_attente_ref().document(utilisateur_id), {
+                "statut": StatutAttente.ANNULEE.value
+            })
+            return True, place_rendue
+        
+        try:
+            annulee, place_rendue = executer_transaction(quitter)
+            if annulee:
+                logger.info(f"Utilisateur {utilisateur_id} retire de la file d'attente")
+            return annulee, place_rendue
+            
+        except Exception as e:
+            logger.error(f"Erreur sortie file d'attente {utilisateur_id}: {e}")
+            return False, None
+    
+    @staticmethod
+    def _premiere_inscription(transaction, zone: Optional[str]) -> Optional[InscriptionAttente]:
+        """Plus ancienne inscription en attente pour la zone ou toutes zones."""
+        premiere = None
+        
+        for file in dict.fromkeys((zone or ZONE_TOUTES, ZONE_TOUTES)):
+            query = (
+                file_attente_ref()
+                .where("zone", "==", file)
+                .where("statut", "==", StatutAttente.EN_ATTENTE.value)
+                .order_by("date_creation")
+                .limit(1)
+            )
+            for doc in transaction.get(query):
+                tete = depuis_document(InscriptionAttente, doc)
+                if premiere is None or tete.date_creation < premiere.date_creation:
+                    premiere = tete
+        
+        return premiere
+    
+    @staticmethod
+    async def proposer_place(place_id: str) -> Optional[InscriptionAttente]:
+        """
+        Retient une place libre pour la tete de la file de sa zone.
+        
+        Returns:
+            L'inscription servie (statut PROPOSEE), ou None si la place
+            n'est pas libre ou que personne n'attend
+        """
+        settings = get_settings()
+        
+        def proposer(transaction):
+            place_doc = transaction.get(places_ref().document(place_id))
+            if not place_doc.exists:
+                return None
+            
+            place = depuis_document(PlaceParking, place_doc)
+            maintenant = datetime.now()
+            if place.statut != StatutPlace.DISPONIBLE or ServiceFileAttente.retenue_active(place, maintenant):
+                return None
+            
+            retenue_jusqu_a = maintenant + timedelta(seconds=settings.FILE_ATTENTE_RETENUE_SECONDES)
+            # Reservation a l'avance imminente: une reservation d'une heure ne tiendrait pas
+            if CalendrierPlace.depuis_place(place).chevauche(
+                maintenant, retenue_jusqu_a + timedelta(hours=1)
+            ):
+                return None
+            
+            inscription = ServiceFileAttente._premiere_inscription(
+                transaction, zone_place(place.numero)
+            )
+            if inscription is None:
+                return None
+            
+            transaction.update(places_ref().document(place_id), {
+                "retenue_pour": inscription.utilisateur_id,
+                "retenue_jusqu_a": retenue_jusqu_a
+            })
+            transaction.update(file_attente_ref().document(inscription.id), {
+                "statut": StatutAttente.PROPOSEE.value,
+                "place_id": place_id,
+                "retenue_jusqu_a": retenue_jusqu_a
+            })
+            
+            inscription.statut = StatutAttente.PROPOSEE
+            inscription.place_id = place_id
+            inscription.retenue_jusqu_a = retenue_jusqu_a
+            return inscription
+        
+        try:
+            inscription = executer_transaction(proposer)
+            
+            if inscription is not None:
+                logger.info(
+                    f"Place {place_id} retenue pour {inscription.utilisateur_id} "
+                    f"jusqu'a {inscription.retenue_jusqu_a:%H:%M:%S}"
+                )
+            
+            return inscription
+            
+        except Exception as e:
+            logger.error(f"Erreur proposition place {place_id}: {e}")
+            return None
+    
+    @staticmethod
+    async def expirer_retenue(place_id: str) -> Tuple[Optional[str], Optional[datetime]]:
+        """
+        Leve la retenue d'une place qui n'a pas ete reservee a temps.
+        L'inscription servie est expiree (elle perd son tour).
+        
+        Returns:
+            (utilisateur dont la retenue a expire, None) ou, si la retenue
+            court encore, (None, nouvelle echeance)
+        """
+        def expirer(transaction):
+            place_doc = transaction.get(places_ref().document(place_id))
+            if not place_doc.exists:
+                return None, None
+            
+            place = depuis_document(PlaceParking, place_doc)
+            if not place.retenue_pour:
+                return None, None
+            
+            if ServiceFileAttente.retenue_active(place):
+                return None, sans_fuseau(place.retenue_jusqu_a)
+            
+            inscription_doc = transaction.get(file_attente_ref().document(place.retenue_pour))
+            
+            transaction.update(places_ref().document(place_id), {
+                "retenue_pour": None,
+                "retenue_jusqu_a": None
+            })
+            
+            if inscription_doc.exists:
+                inscription = inscription_doc.to_dict()
+                if (
+                    inscription.get("statut") == StatutAttente.PROPOSEE.value
+                    and inscription.get("place_id") == place_id
+                ):
+                    transaction.update(file_attente_ref().document(place.retenue_pour), {
+                        "statut": StatutAttente.EXPIREE.value
+                    })
+            
+            return place.retenue_pour, None
+        
+        try:
+            utilisateur_id, echeance = executer_transaction(expirer)
+            
+            if utilisateur_id:
+                logger.info(f"Retenue de la place {place_id} pour {utilisateur_id} expiree")
+            
+            return utilisateur_id, echeance
+            
+        except Exception as e:
+            logger.error(f"Erreur expiration retenue place {place_id}: {e}")
+            return None, None
+    
+    @staticmethod
+    async def obtenir_places_retenues() -> list[PlaceParking]:
+        """Places retenues pour la file (rechargement des echeances)."""
+        try:
+            docs = places_ref().where("retenue_pour", "!=", None).get()
+            return depuis_documents(PlaceParking, docs)
+            
+        except Exception as e:
+            logger.error(f"Erreur recuperation places retenues: {e}")
+            return []
@@ -5,8 +5,12 @@ from datetime import datetime
 from typing import Optional
 from loguru import logger
 
-from database.firebase import places_ref
-from models.parking import PlaceParking, StatutPlace, PlaceResponse, EtatParking
+from database.firebase import places_ref, paginer, compter, lire_documents, ecrire_par_lots
+from database.hydratation import depuis_document, depuis_documents
+from models.parking import (
+    PlaceParking, StatutPlace, PlaceResponse, EtatParking,
+    ActionLotPlace, LignePlaceLot, ResultatLignePlace, ResultatLotPlaces
+)
 from config import get_settings
 
 
@@ -28,8 +32,9 @@ class ServiceParking:
                 logger.info("Places de parking deja initialisees")
                 return
             
-            # Creer les 5 places par defaut
+            # Creer les 5 places par defaut (un seul commit)
             places_defaut = ["A1", "A2", "A3", "A4", "A5"]
+            operations = []
             
             for numero in places_defaut:
                 place = PlaceParking(
@@ -38,7 +43,9 @@ class ServiceParking:
                     statut=StatutPlace.DISPONIBLE,
                     capteur_id=f"esp8266_{numero.lower()}"
                 )
-                collection.document(place.id).set(place.model_dump())
+                operations.append(("set", place.id, place.model_dump()))
+            
+            ecrire_par_lots(collection, operations)
             
             logger.info(f"Creation de {len(places_defaut)} places de parking")
             
@@ -50,19 +57,25 @@ class ServiceParking:
         """Recupere toutes les places de parking."""
         try:
             docs = places_ref().get()
-            places = []
-            
-            for doc in docs:
-                data = doc.to_dict()
-                data["id"] = doc.id
-                places.append(PlaceParking(**data))
-            
-            return places
+            return depuis_documents(PlaceParking, docs)
             
         except Exception as e:
             logger.error(f"Erreur recuperation places: {e}")
             return []
     
+    @staticmethod
+    async def obtenir_page_places(
+        limite: int = 50,
+        apres: str = None
+    ) -> tuple[list[PlaceParking], Optional[str], int]:
+        """
+        Recupere une page de places triees par numero, et le nombre total
+        de places. Leve ValueError si le curseur est invalide.
+        """
+        requete = places_ref().order_by("numero")
+        docs, suivant = paginer(requete, places_ref(), limite, apres)
+        return depuis_documents(PlaceParking, docs), suivant, compter(requete)
+    
     @staticmethod
     async def obtenir_place(place_id: str) -> Optional[PlaceParking]:
         """Recupere une place par son ID."""
@@ -72,9 +85,7 @@ class ServiceParking:
             if not doc.exists:
                 return None
             
-            data = doc.to_dict()
-            data["id"] = doc.id
-            return PlaceParking(**data)
+            return depuis_document(PlaceParking, doc)
             
         except Exception as e:
             logger.error(f"Erreur recuperation place {place_id}: {e}")
@@ -84,7 +95,11 @@ class ServiceParking:
     async def obtenir_etat_parking() -> EtatParking:
         """Retourne l'etat global du parking."""
         places = await ServiceParking.obtenir_toutes_places()
+        return ServiceParking.construire_etat(places)
         
+    @staticmethod
+    def construire_etat(places: list[PlaceParking]) -> EtatParking:
+        """Construit l'etat global a partir d'une liste de places."""
         disponibles = sum(1 for p in places if p.statut == StatutPlace.DISPONIBLE)
         reservees = sum(1 for p in places if p.statut == StatutPlace.RESERVEE)
         occupees = sum(1 for p in places if p.statut == StatutPlace.OCCUPEE)
@@ -166,7 +181,7 @@ class ServiceParking:
     async def ajouter_place(numero: str, capteur_id: str = None) -> Optional[PlaceParking]:
         """Ajoute une nouvelle place de parking."""
         try:
-            place_id = numero.lower().replace(" ", "_")
+            place_id = ServiceParking.id_place(numero)
             
             # Verifier si la place existe deja
             doc = places_ref().document(place_id).get()
@@ -190,6 +205,121 @@ class ServiceParking:
             logger.error(f"Erreur ajout place: {e}")
             return None
     
+    @staticmethod
+    def id_place(numero: str) -> str:
+        """Identifiant du document d'une place a partir de son numero."""
+        return numero.lower().replace(" ", "_")
+    
+    @staticmethod
+    async def appliquer_lot(lignes: list[LignePlaceLot]) -> ResultatLotPlaces:
+        """
+        Ajoute, modifie ou supprime des places en lot.
+        
+        L'existence de toutes les places est verifiee en une lecture
+        groupee, puis les ecritures sont envoyees en WriteBatch. Chaque
+        ligne a son propre resultat: une ligne invalide n'empeche pas
+        les autres d'etre appliquees.
+        """
+        resultats: list[Optional[ResultatLignePlace]] = [None] * len(lignes)
+        ids = [ServiceParking.id_place(ligne.numero) for ligne in lignes]
+        
+        def refuser(index: int, message: str):
+            ligne = lignes[index]
+            resultats[index] = ResultatLignePlace(
+                ligne=index + 1,
+                numero=ligne.numero,
+                place_id=ids[index],
+                action=ligne.action,
+                succes=False,
+                message=message
+            )
+        
+        snapshots = lire_documents(places_ref(), ids)
+        
+        operations = []
+        index_operations = []
+        vus = set()
+        
+        for index, ligne in enumerate(lignes):
+            place_id = ids[index]
+            
+            # Une place ne peut apparaitre qu'une fois par lot
+            if place_id in vus:
+                refuser(index, "Place en double dans le lot")
+                continue
+            vus.add(place_id)
+            
+            snapshot = snapshots.get(place_id)
+            existe = snapshot is not None and snapshot.exists
+            
+            if ligne.action == ActionLotPlace.AJOUTER:
+                if existe:
+                    refuser(index, "La place existe deja")
+                    continue
+                place = PlaceParking(
+                    id=place_id,
+                    numero=ligne.numero,
+                    statut=StatutPlace.DISPONIBLE,
+                    capteur_id=ligne.capteur_id or f"esp8266_{place_id}"
+                )
+                operations.append(("set", place_id, place.model_dump()))
+                
+            elif not existe:
+                refuser(index, "Place introuvable")
+                continue
+                
+            elif ligne.action == ActionLotPlace.MODIFIER:
+                # L'id du document derive du numero: un nouveau numero est une
+                # autre place (supprimer puis ajouter)
+                if ligne.numero != snapshot.to_dict().get("numero"):
+                    refuser(index, "Numero non modifiable: supprimer puis ajouter la place")
+                    continue
+                # Seuls les champs fournis par la ligne sont modifies
+                modifications = ligne.model_dump(include={"capteur_id"}, exclude_none=True)
+                if not modifications:
+                    refuser(index, "Aucun champ a modifier")
+                    continue
+                operations.append(("update", place_id, modifications))
+                
+            else:
+                # Comme pour une suppression unitaire: place disponible seulement
+                data = snapshot.to_dict()
+                if data.get("statut") != StatutPlace.DISPONIBLE.value:
+                    refuser(index, "Place reservee ou occupee")
+                    continue
+                if data.get("planning"):
+                    refuser(index, "Place reservee a l'avance")
+                    continue
+                operations.append(("delete", place_id, None))
+            
+            index_operations.append(index)
+        
+        erreurs = ecrire_par_lots(places_ref(), operations)
+        
+        for index, erreur in zip(index_operations, erreurs):
+            if erreur is not None:
+                refuser(index, "Erreur d'ecriture")
+                continue
+            ligne = lignes[index]
+            resultats[index] = ResultatLignePlace(
+                ligne=index + 1,
+                numero=ligne.numero,
+                place_id=ids[index],
+                action=ligne.action,
+                succes=True,
+                message="OK"
+            )
+        
+        reussies = sum(1 for r in resultats if r.succes)
+        logger.info(f"Lot de places applique: {reussies}/{len(lignes)} ligne(s)")
+        
+        return ResultatLotPlaces(
+            total=len(lignes),
+            reussies=reussies,
+            echouees=len(lignes) - reussies,
+            resultats=resultats
+        )
+    
     @staticmethod
     async def supprimer_place(place_id: str) -> bool:
         """Supprime une place de parking."""
@@ -205,6 +335,10 @@ class ServiceParking:
                 logger.warning(f"Impossible de supprimer la place {place_id}: non disponible")
                 return False
             
+            if data.get("planning"):
+                logger.warning(f"Impossible de supprimer la place {place_id}: reservations a venir")
+                return False
+            
             places_ref().document(place_id).delete()
             logger.info(f"Place {place_id} supprimee")
             
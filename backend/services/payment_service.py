@@ -4,10 +4,11 @@
 from datetime import datetime
 from typing import Optional
 from loguru import logger
-import uuid
 
 from database.firebase import paiements_ref
+from database.hydratation import depuis_document, depuis_documents
 from models.payment import Paiement, StatutPaiement, MethodePaiement, ReponsePaiement
+from utils.identifiants import nouvel_identifiant
 
 
 class ServicePaiement:
@@ -26,7 +27,7 @@ class ServicePaiement:
         Dans un cas reel, cela appellerait l'API du fournisseur.
         """
         try:
-            paiement_id = str(uuid.uuid4())[:8]
+            paiement_id = nouvel_identifiant()
             reference = f"AP-{paiement_id.upper()}"
             
             paiement = Paiement(
@@ -90,9 +91,7 @@ class ServicePaiement:
             if not doc.exists:
                 return None
             
-            data = doc.to_dict()
-            data["id"] = doc.id
-            return Paiement(**data)
+            return depuis_document(Paiement, doc)
             
         except Exception as e:
             logger.error(f"Erreur recuperation paiement {paiement_id}: {e}")
@@ -104,12 +103,7 @@ class ServicePaiement:
         try:
             query = paiements_ref().where("utilisateur_id", "==", utilisateur_id)
             docs = query.get()
-            
-            paiements = []
-            for doc in docs:
-                data = doc.to_dict()
-                data["id"] = doc.id
-                paiements.append(Paiement(**data))
+            paiements = depuis_documents(Paiement, docs)
             
             paiements.sort(key=lambda p: p.date_creation, reverse=True)
             return paiements
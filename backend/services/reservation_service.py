@@ -2,15 +2,44 @@
 # ====================================
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from loguru import logger
-import uuid
+import random
 
-from database.firebase import reservations_ref, places_ref
-from models.reservation import Reservation, StatutReservation, ReservationResponse
-from models.parking import StatutPlace
+from google.cloud.firestore import DELETE_FIELD, Query
+
+from database.firebase import (
+    reservations_ref, places_ref, paiements_ref, file_attente_ref, paginer, compter,
+    executer_transaction
+)
+from database.hydratation import depuis_document, depuis_documents
+from models.reservation import (
+    Reservation, StatutReservation, ReservationResponse, ReservationLotResponse
+)
+from models.payment import MethodePaiement, Paiement, StatutPaiement
+from models.parking import CreneauLibre, PlaceParking, StatutPlace
+from models.file_attente import StatutAttente
+from services.parking_service import ServiceParking
+from services.file_attente_service import ServiceFileAttente
+from utils.cache_etat import get_cache_etat
+from utils.calendrier import CalendrierPlace
+from utils.helpers import heure_locale, rang_place, sans_fuseau, zone_place
+from utils.identifiants import nouvel_identifiant
+from utils.scheduler import (
+    get_planificateur, ECHEANCE_ACTIVATION, ECHEANCE_ARRIVEE, ECHEANCE_EXPIRATION,
+    ECHEANCE_RAPPEL, ECHEANCE_RETENUE
+)
 from config import get_settings
 
+# Issues d'une tentative de reservation
+RESERVATION_OK = "ok"
+RESERVATION_INTROUVABLE = "introuvable"
+RESERVATION_INDISPONIBLE = "indisponible"
+RESERVATION_CONFLIT = "conflit"
+
+# Nombre maximum de places essayees par une reservation automatique
+MAX_TENTATIVES_AUTO = 5
+
 
 class ServiceReservation:
     """Logique metier pour les reservations."""
@@ -21,101 +50,749 @@ class ServiceReservation:
         settings = get_settings()
         return duree_heures * settings.TARIF_HEURE
     
+    @staticmethod
+    def _valider_horaires(duree_heures: int, debut: Optional[datetime] = None) -> Optional[str]:
+        """Message d'erreur si la duree ou le debut demande sont hors limites."""
+        settings = get_settings()
+        
+        if duree_heures < 1 or duree_heures > settings.DUREE_MAX_HEURES:
+            return f"Duree invalide. Minimum 1h, maximum {settings.DUREE_MAX_HEURES}h"
+        
+        horizon = datetime.now() + timedelta(hours=settings.HORIZON_RESERVATION_HEURES)
+        if debut is not None and debut > horizon:
+            return f"Debut trop lointain. Maximum {settings.HORIZON_RESERVATION_HEURES}h a l'avance"
+        
+        return None
+    
     @staticmethod
     async def creer_reservation(
         place_id: str,
         utilisateur_id: str,
         duree_heures: int,
-        methode_paiement: str
+        methode_paiement: str,
+        debut: Optional[datetime] = None
     ) -> ReservationResponse:
         """
         Cree une nouvelle reservation.
-        Le timer demarre immediatement.
+        Sans debut (ou debut passe), le timer demarre immediatement; sinon
+        la reservation est planifiee et activee a son debut.
         """
-        settings = get_settings()
+        if debut is not None:
+            debut = heure_locale(debut)
         
-        # Validation de la duree
-        if duree_heures < 1 or duree_heures > settings.DUREE_MAX_HEURES:
+        erreur = ServiceReservation._valider_horaires(duree_heures, debut)
+        if erreur:
+            return ReservationResponse(succes=False, message=erreur)
+        
+        try:
+            _, reponse = ServiceReservation._tenter_reservation(
+                place_id, utilisateur_id, duree_heures, methode_paiement, debut
+            )
+            return reponse
+            
+        except Exception as e:
+            logger.error(f"Erreur creation reservation: {e}")
             return ReservationResponse(
                 succes=False,
-                message=f"Duree invalide. Minimum 1h, maximum {settings.DUREE_MAX_HEURES}h"
+                message="Erreur lors de la reservation"
             )
         
+    @staticmethod
+    async def reserver_automatiquement(
+        utilisateur_id: str,
+        duree_heures: int,
+        methode_paiement: str,
+        zone: Optional[str] = None,
+        preferences: Optional[list[str]] = None,
+        autres_zones: bool = False
+    ) -> ReservationResponse:
+        """
+        Choisit et reserve une place libre en une seule operation.
+        
+        Les candidates viennent de la liste des places libres de l'index
+        (zone demandee, places preferees en premier). Si une candidate a
+        ete prise entre-temps, la suivante est essayee.
+        """
+        erreur = ServiceReservation._valider_horaires(duree_heures)
+        if erreur:
+            return ReservationResponse(succes=False, message=erreur)
+        
         try:
-            # Verifier la disponibilite de la place
-            doc = places_ref().document(place_id).get()
+            index = await get_cache_etat().obtenir_index()
+            maintenant = datetime.now()
+            fin = maintenant + timedelta(hours=duree_heures)
             
-            if not doc.exists:
-                return ReservationResponse(
-                    succes=False,
-                    message="Place introuvable"
+            # Places libres maintenant mais reservees a l'avance avant la fin: ecartees
+            candidates = [
+                place_id
+                for place_id in ServiceReservation._ordonner_candidates(
+                    index, zone, preferences or [], autres_zones
                 )
+                if not index.calendrier(place_id).chevauche(maintenant, fin)
+            ]
             
-            place_data = doc.to_dict()
-            
-            if place_data.get("statut") != StatutPlace.DISPONIBLE.value:
-                return ReservationResponse(
-                    succes=False,
-                    message="Cette place n'est plus disponible"
+            for place_id in candidates[:MAX_TENTATIVES_AUTO]:
+                etat, reponse = ServiceReservation._tenter_reservation(
+                    place_id, utilisateur_id, duree_heures, methode_paiement
                 )
+                
+                if etat == RESERVATION_OK:
+                    # Reservee: plus libre pour les requetes suivantes
+                    index.retirer_disponible(place_id)
+                    return reponse
+                
+                if etat != RESERVATION_CONFLIT:
+                    index.retirer_disponible(place_id)
+                
+                logger.debug(f"Place {place_id} prise entre-temps, candidate suivante")
+            
+            return ReservationResponse(
+                succes=False,
+                message="Aucune place disponible" + (f" en zone {zone.upper()}" if zone else "")
+            )
+            
+        except Exception as e:
+            logger.error(f"Erreur reservation automatique: {e}")
+            return ReservationResponse(
+                succes=False,
+                message="Erreur lors de la reservation"
+            )
+            
+    @staticmethod
+    def _ordonner_candidates(
+        index,
+        zone: Optional[str],
+        preferences: list[str],
+        autres_zones: bool
+    ) -> list[str]:
+        """
+        Ordre d'essai des places libres: preferees, puis zone demandee,
+        puis (si accepte) les autres zones. L'ordre est aleatoire dans
+        chaque groupe pour eviter que les requetes simultanees visent
+        toutes la meme place.
+        """
+        libres_zone = index.filtrer(StatutPlace.DISPONIBLE, zone)
+        
+        candidates = [
+            place_id
+            for place_id in dict.fromkeys(
+                ServiceParking.id_place(numero) for numero in preferences
+            )
+            if place_id in libres_zone
+        ]
+        restantes = list(libres_zone.difference(candidates))
+        candidates += random.sample(restantes, min(MAX_TENTATIVES_AUTO, len(restantes)))
+        
+        if zone is not None and autres_zones:
+            autres = list(index.filtrer(StatutPlace.DISPONIBLE) - libres_zone)
+            candidates += random.sample(autres, min(MAX_TENTATIVES_AUTO, len(autres)))
+        
+        return candidates
+    
+    @staticmethod
+    def _tenter_reservation(
+        place_id: str,
+        utilisateur_id: str,
+        duree_heures: int,
+        methode_paiement: str,
+        debut: Optional[datetime] = None
+    ) -> tuple[str, ReservationResponse]:
+        """
+        Reserve une place dans une transaction Firestore: la verification
+        du statut et des creneaux et les ecritures sont atomiques, deux
+        requetes simultanees ne peuvent pas obtenir le meme creneau.
+        
+        Une reservation a l'avance est ajoutee au planning de la place
+        (sans changer son statut) et activee a son debut par le planificateur.
+        
+        Returns:
+            (RESERVATION_OK, INTROUVABLE, INDISPONIBLE ou CONFLIT, reponse)
+        """
+        # Calculer les horaires
+        maintenant = datetime.now()
+        a_l_avance = debut is not None and debut > maintenant
+        if not a_l_avance:
+            debut = maintenant
+        fin = debut + timedelta(hours=duree_heures)
+        montant = ServiceReservation.calculer_montant(duree_heures)
+            
+        # Creer la reservation
+        reservation_id = nouvel_identifiant()
+            
+        reservation = Reservation(
+            id=reservation_id,
+            place_id=place_id,
+            utilisateur_id=utilisateur_id,
+            statut=StatutReservation.PLANIFIEE if a_l_avance else StatutReservation.ACTIVE,
+            debut=debut,
+            fin=fin,
+            duree_heures=duree_heures,
+            montant=montant,
+            methode_paiement=methode_paiement,
+            paiement_confirme=True  # On suppose le paiement valide pour simplifier
+        )
+            
+        def reserver(transaction):
+            doc = transaction.get(places_ref().document(place_id))
+            
+            if not doc.exists:
+                return RESERVATION_INTROUVABLE, None
+            
+            place = depuis_document(PlaceParking, doc)
+            
+            etat = ServiceReservation._etat_place(place, a_l_avance, debut, fin, utilisateur_id)
+            if etat != RESERVATION_OK:
+                return etat, None
+            
+            ServiceReservation._ecrire_reservation(transaction, reservation)
+            
+            if not a_l_avance and place.retenue_pour == utilisateur_id:
+                # Place obtenue par la file d'attente
+                transaction.update(file_attente_ref().document(utilisateur_id), {
+                    "statut": StatutAttente.SERVIE.value
+                })
+            
+            return RESERVATION_OK, place
+        
+        etat, place = executer_transaction(reserver)
+        
+        if etat == RESERVATION_INTROUVABLE:
+            return etat, ReservationResponse(
+                succes=False,
+                message="Place introuvable"
+            )
+        
+        if etat == RESERVATION_INDISPONIBLE:
+            return etat, ReservationResponse(
+                succes=False,
+                message="Cette place n'est plus disponible"
+            )
+        
+        if etat == RESERVATION_CONFLIT:
+            return etat, ReservationResponse(
+                succes=False,
+                message="Cette place est deja reservee sur ce creneau"
+            )
+        
+        ServiceReservation._planifier_echeance(reservation)
+        if not a_l_avance and place.retenue_pour == utilisateur_id:
+            get_planificateur().annuler(ECHEANCE_RETENUE, place_id)
+        
+        temps_restant = int((fin - debut).total_seconds())
+        
+        logger.info(
+            f"Reservation {reservation_id} {'planifiee' if a_l_avance else 'creee'}: "
+            f"place {place_id}, utilisateur {utilisateur_id}, {duree_heures}h"
+            + (f" a partir de {debut:%Y-%m-%d %H:%M}" if a_l_avance else "")
+        )
+        
+        return etat, ReservationResponse(
+            succes=True,
+            message="Reservation planifiee" if a_l_avance else "Reservation confirmee",
+            reservation_id=reservation_id,
+            statut=reservation.statut,
+            place_id=place_id,
+            place_numero=place.numero,
+            montant=montant,
+            debut=debut,
+            fin=fin,
+            temps_restant_secondes=temps_restant
+        )
+    
+    @staticmethod
+    def _etat_place(
+        place: PlaceParking,
+        a_l_avance: bool,
+        debut: datetime,
+        fin: datetime,
+        utilisateur_id: Optional[str] = None
+    ) -> str:
+        """Verifie qu'une place peut etre reservee sur [debut, fin[ (dans la transaction)."""
+        if not a_l_avance and place.statut != StatutPlace.DISPONIBLE:
+            return RESERVATION_INDISPONIBLE
+        
+        # Place retenue pour la tete de la file d'attente
+        if (
+            not a_l_avance
+            and place.retenue_pour != utilisateur_id
+            and ServiceFileAttente.retenue_active(place)
+        ):
+            return RESERVATION_INDISPONIBLE
+        
+        if CalendrierPlace.depuis_place(place).chevauche(debut, fin):
+            return RESERVATION_CONFLIT
+        
+        return RESERVATION_OK
+    
+    @staticmethod
+    def _ecrire_reservation(transaction, reservation: Reservation):
+        """Ecrit la reservation et met a jour sa place dans la transaction."""
+        transaction.set(reservations_ref().document(reservation.id), reservation.model_dump())
+        
+        if reservation.statut == StatutReservation.PLANIFIEE:
+            # Creneau ajoute au planning, la place reste dans son etat actuel
+            transaction.update(places_ref().document(reservation.place_id), {
+                f"planning.{reservation.id}": {
+                    "debut": reservation.debut,
+                    "fin": reservation.fin,
+                    "utilisateur_id": reservation.utilisateur_id
+                }
+            })
+        else:
+            # Mettre a jour le statut de la place
+            transaction.update(places_ref().document(reservation.place_id), {
+                "statut": StatutPlace.RESERVEE.value,
+                "reserve_par": reservation.utilisateur_id,
+                "debut_reservation": reservation.debut,
+                "fin_reservation": reservation.fin,
+                "duree_heures": reservation.duree_heures,
+                "retenue_pour": None,
+                "retenue_jusqu_a": None
+            })
             
-            # Calculer les horaires
+    @staticmethod
+    def _planifier_echeance(reservation: Reservation):
+        """
+        Activation (reservation a l'avance), ou expiration et delai
+        d'arrivee d'une reservation active.
+        """
+        if reservation.statut == StatutReservation.PLANIFIEE:
+            get_planificateur().planifier(ECHEANCE_ACTIVATION, reservation.id, reservation.debut)
+            return
+        
+        get_planificateur().planifier(ECHEANCE_EXPIRATION, reservation.id, reservation.fin)
+        limite = ServiceReservation.limite_arrivee(reservation)
+        if limite is not None:
+            get_planificateur().planifier(ECHEANCE_ARRIVEE, reservation.id, limite)
+        ServiceReservation.planifier_rappels(reservation)
+    
+    @staticmethod
+    def planifier_rappels(reservation: Reservation):
+        """
+        Avertissements RAPPELS_EXPIRATION_MINUTES avant la fin (echeance
+        "<reservation_id>:<minutes>"). Un avertissement tombant avant le
+        debut n'est pas planifie.
+        """
+        debut = sans_fuseau(reservation.debut)
+        fin = sans_fuseau(reservation.fin)
+        
+        for minutes in get_settings().RAPPELS_EXPIRATION_MINUTES:
+            instant = fin - timedelta(minutes=minutes)
+            if instant > debut:
+                get_planificateur().planifier(ECHEANCE_RAPPEL, f"{reservation.id}:{minutes}", instant)
+    
+    @staticmethod
+    def annuler_rappels(reservation_id: str):
+        """Annule les avertissements d'expiration d'une reservation terminee."""
+        for minutes in get_settings().RAPPELS_EXPIRATION_MINUTES:
+            get_planificateur().annuler(ECHEANCE_RAPPEL, f"{reservation_id}:{minutes}")
+    
+    @staticmethod
+    def limite_arrivee(reservation: Reservation) -> Optional[datetime]:
+        """Heure limite d'arrivee du vehicule, None si sans objet."""
+        delai = get_settings().DELAI_ARRIVEE_MINUTES
+        if delai <= 0 or reservation.vehicule_arrive or reservation.non_presentation:
+            return None
+        return sans_fuseau(reservation.debut) + timedelta(minutes=delai)
+    
+    @staticmethod
+    async def reserver_lot(
+        utilisateur_id: str,
+        nombre: int,
+        duree_heures: int,
+        methode_paiement: MethodePaiement,
+        telephone: str,
+        zone: Optional[str] = None,
+        contigues: bool = False,
+        debut: Optional[datetime] = None
+    ) -> ReservationLotResponse:
+        """
+        Reserve nombre places en une seule transaction, avec un paiement
+        groupe: toutes les places sont reservees, ou aucune.
+        
+        Les places viennent de l'index (zone, rangs consecutifs si
+        contigues). Si l'une d'elles a ete prise entre-temps, une autre
+        selection est essayee sans elle.
+        """
+        if debut is not None:
+            debut = heure_locale(debut)
+        
+        erreur = ServiceReservation._valider_horaires(duree_heures, debut)
+        if erreur:
+            return ReservationLotResponse(succes=False, message=erreur)
+        
+        try:
+            index = await get_cache_etat().obtenir_index()
             maintenant = datetime.now()
-            fin = maintenant + timedelta(hours=duree_heures)
-            montant = ServiceReservation.calculer_montant(duree_heures)
+            a_l_avance = debut is not None and debut > maintenant
+            if not a_l_avance:
+                debut = maintenant
+            fin = debut + timedelta(hours=duree_heures)
+            exclues: set[str] = set()
+            
+            for _ in range(MAX_TENTATIVES_AUTO):
+                selection = ServiceReservation._choisir_lot(
+                    index, nombre, zone, contigues, a_l_avance, debut, fin, exclues
+                )
+                if selection is None:
+                    break
+                
+                etat, resultat = ServiceReservation._tenter_lot(
+                    selection, utilisateur_id, duree_heures, methode_paiement,
+                    telephone, a_l_avance, debut, fin
+                )
+                
+                if etat == RESERVATION_OK:
+                    if not a_l_avance:
+                        for place_id in selection:
+                            index.retirer_disponible(place_id)
+                    return resultat
+                
+                # Places prises entre-temps: ecartees de la selection suivante
+                exclues.update(resultat)
+                logger.debug(f"Lot: places {resultat} prises entre-temps, nouvelle selection")
             
-            # Creer la reservation
-            reservation_id = str(uuid.uuid4())[:8]
+            return ReservationLotResponse(
+                succes=False,
+                message=(
+                    f"Pas assez de places {'voisines ' if contigues else ''}libres"
+                    + (f" en zone {zone.upper()}" if zone else "")
+                )
+            )
             
-            reservation = Reservation(
-                id=reservation_id,
+        except Exception as e:
+            logger.error(f"Erreur reservation de groupe: {e}")
+            return ReservationLotResponse(
+                succes=False,
+                message="Erreur lors de la reservation"
+            )
+    
+    @staticmethod
+    def _choisir_lot(
+        index,
+        nombre: int,
+        zone: Optional[str],
+        contigues: bool,
+        a_l_avance: bool,
+        debut: datetime,
+        fin: datetime,
+        exclues: set[str]
+    ) -> Optional[list[str]]:
+        """
+        Selection de nombre places libres sur [debut, fin[, au hasard (ou
+        parmi les suites de rangs consecutifs d'une zone si contigues).
+        None si l'index n'en contient pas assez.
+        """
+        statut = None if a_l_avance else StatutPlace.DISPONIBLE
+        libres = [
+            place_id
+            for place_id in index.filtrer(statut, zone)
+            if place_id not in exclues and not index.calendrier(place_id).chevauche(debut, fin)
+        ]
+        
+        if not contigues:
+            return random.sample(libres, nombre) if len(libres) >= nombre else None
+        
+        rangs_par_zone: dict[str, list[tuple[int, str]]] = {}
+        for place_id in libres:
+            numero = index.places[place_id].numero
+            zone_libre = zone_place(numero)
+            if zone_libre is not None:
+                rangs_par_zone.setdefault(zone_libre, []).append((rang_place(numero), place_id))
+        
+        suites = []
+        for rangs in rangs_par_zone.values():
+            rangs.sort()
+            for i in range(len(rangs) - nombre + 1):
+                if rangs[i + nombre - 1][0] - rangs[i][0] == nombre - 1:
+                    suites.append([place_id for _, place_id in rangs[i:i + nombre]])
+        
+        return random.choice(suites) if suites else None
+    
+    @staticmethod
+    def _tenter_lot(
+        place_ids: list[str],
+        utilisateur_id: str,
+        duree_heures: int,
+        methode_paiement: MethodePaiement,
+        telephone: str,
+        a_l_avance: bool,
+        debut: datetime,
+        fin: datetime
+    ) -> tuple[str, object]:
+        """
+        Reserve toutes les places dans une transaction Firestore et
+        enregistre le paiement groupe.
+        
+        Returns:
+            (RESERVATION_OK, ReservationLotResponse) ou
+            (RESERVATION_INDISPONIBLE, ids des places refusees)
+        """
+        maintenant = datetime.now()
+        montant = ServiceReservation.calculer_montant(duree_heures)
+        lot_id = nouvel_identifiant()
+        paiement_id = nouvel_identifiant()
+        
+        reservations = [
+            Reservation(
+                id=nouvel_identifiant(),
                 place_id=place_id,
                 utilisateur_id=utilisateur_id,
-                statut=StatutReservation.ACTIVE,
-                debut=maintenant,
+                statut=StatutReservation.PLANIFIEE if a_l_avance else StatutReservation.ACTIVE,
+                debut=debut,
                 fin=fin,
                 duree_heures=duree_heures,
                 montant=montant,
-                methode_paiement=methode_paiement,
-                paiement_confirme=True  # On suppose le paiement valide pour simplifier
+                methode_paiement=methode_paiement.value,
+                paiement_confirme=True,
+                lot_id=lot_id
             )
+            for place_id in place_ids
+        ]
+        
+        # Un seul paiement pour le lot (confirmation simulee, comme initier_paiement)
+        paiement = Paiement(
+            id=paiement_id,
+            reservation_id=lot_id,
+            reservation_ids=[reservation.id for reservation in reservations],
+            utilisateur_id=utilisateur_id,
+            montant=montant * len(reservations),
+            methode=methode_paiement,
+            statut=StatutPaiement.CONFIRME,
+            telephone=telephone,
+            reference_externe=f"AP-{paiement_id.upper()}",
+            date_confirmation=maintenant
+        )
+        
+        def reserver(transaction):
+            snapshots = {
+                doc.id: doc
+                for doc in transaction.get_all(
+                    places_ref().document(place_id) for place_id in place_ids
+                )
+            }
             
-            # Sauvegarder en base
-            reservations_ref().document(reservation_id).set(reservation.model_dump())
+            places = {}
+            refusees = []
+            for place_id in place_ids:
+                doc = snapshots.get(place_id)
+                if doc is None or not doc.exists:
+                    refusees.append(place_id)
+                    continue
+                
+                place = depuis_document(PlaceParking, doc)
+                if ServiceReservation._etat_place(
+                    place, a_l_avance, debut, fin, utilisateur_id
+                ) != RESERVATION_OK:
+                    refusees.append(place_id)
+                    continue
+                places[place_id] = place
             
-            # Mettre a jour le statut de la place
-            places_ref().document(place_id).update({
-                "statut": StatutPlace.RESERVEE.value,
-                "reserve_par": utilisateur_id,
-                "debut_reservation": maintenant,
-                "fin_reservation": fin,
-                "duree_heures": duree_heures
+            if refusees:
+                return RESERVATION_INDISPONIBLE, refusees
+            
+            for reservation in reservations:
+                ServiceReservation._ecrire_reservation(transaction, reservation)
+            transaction.set(paiements_ref().document(paiement_id), paiement.model_dump())
+            
+            if not a_l_avance and any(p.retenue_pour == utilisateur_id for p in places.values()):
+                # Place obtenue par la file d'attente
+                transaction.update(file_attente_ref().document(utilisateur_id), {
+                    "statut": StatutAttente.SERVIE.value
+                })
+            
+            return RESERVATION_OK, places
+        
+        etat, resultat = executer_transaction(reserver)
+        if etat != RESERVATION_OK:
+            return etat, resultat
+        
+        places = resultat
+        for reservation in reservations:
+            ServiceReservation._planifier_echeance(reservation)
+            if not a_l_avance and places[reservation.place_id].retenue_pour == utilisateur_id:
+                get_planificateur().annuler(ECHEANCE_RETENUE, reservation.place_id)
+            
+        logger.info(
+            f"Lot {lot_id}: {len(reservations)} place(s) pour utilisateur {utilisateur_id}, "
+            f"{duree_heures}h, paiement {paiement_id} ({paiement.montant} FC)"
+        )
+        
+        temps_restant = int((fin - debut).total_seconds())
+        
+        return etat, ReservationLotResponse(
+            succes=True,
+            message="Reservations planifiees" if a_l_avance else "Reservations confirmees",
+            lot_id=lot_id,
+            paiement_id=paiement_id,
+            montant_total=paiement.montant,
+            debut=debut,
+            fin=fin,
+            reservations=[
+                ReservationResponse(
+                    succes=True,
+                    message="Reservation planifiee" if a_l_avance else "Reservation confirmee",
+                    reservation_id=reservation.id,
+                    statut=reservation.statut,
+                    place_id=reservation.place_id,
+                    place_numero=places[reservation.place_id].numero,
+                    montant=montant,
+                    debut=debut,
+                    fin=fin,
+                    temps_restant_secondes=temps_restant
+                )
+                for reservation in reservations
+            ]
+        )
+    
+    @staticmethod
+    async def premier_creneau_libre(
+        duree_heures: int,
+        apres: Optional[datetime] = None,
+        zone: Optional[str] = None,
+        place_id: Optional[str] = None
+    ) -> Optional[CreneauLibre]:
+        """
+        Premier creneau libre de duree_heures, sur une place ou parmi les
+        places d'une zone (toutes si aucune n'est precisee), dans l'horizon
+        de reservation. Repond depuis les calendriers de l'index, sans
+        lecture Firestore.
+        
+        Une place occupee sans reservation (fin inconnue) n'est pas
+        proposee pour un debut immediat.
+        """
+        settings = get_settings()
+        maintenant = datetime.now()
+        apres = max(heure_locale(apres), maintenant) if apres is not None else maintenant
+        debut_max = maintenant + timedelta(hours=settings.HORIZON_RESERVATION_HEURES)
+        duree = timedelta(hours=duree_heures)
+        
+        index = await get_cache_etat().obtenir_index()
+        ids = [place_id] if place_id is not None else index.filtrer(zone=zone)
+        
+        meilleur = None
+        for candidat in ids:
+            place = index.places.get(candidat)
+            if place is None:
+                continue
+            if apres == maintenant and place.statut != StatutPlace.DISPONIBLE and place.fin_reservation is None:
+                continue
+            
+            calendrier = index.calendrier(candidat)
+            debut = calendrier.premier_creneau(duree, apres, debut_max)
+            if debut is not None and (meilleur is None or debut < meilleur[0]):
+                meilleur = (debut, candidat)
+                if debut == apres:
+                    break
+        
+        if meilleur is None:
+            return None
+        
+        debut, candidat = meilleur
+        return CreneauLibre(place_id=candidat, debut=debut, fin=debut + duree)
+    
+    @staticmethod
+    async def prolonger_reservation(
+        reservation_id: str,
+        heures: int
+    ) -> Tuple[ReservationResponse, Optional[str]]:
+        """
+        Repousse la fin d'une reservation active ou planifiee, sur la
+        reservation et sur sa place, dans une transaction: le creneau
+        ajoute est verifie contre les autres reservations de la place.
+        Le supplement (calculer_montant) s'ajoute au montant.
+        
+        Returns:
+            (reponse, statut de la place apres prolongation ou None)
+        """
+        settings = get_settings()
+        supplement = ServiceReservation.calculer_montant(heures)
+        
+        def prolonger(transaction):
+            doc = transaction.get(reservations_ref().document(reservation_id))
+            if not doc.exists:
+                return "Reservation introuvable", None, None
+            
+            reservation = depuis_document(Reservation, doc)
+            if reservation.statut not in (StatutReservation.ACTIVE, StatutReservation.PLANIFIEE):
+                return "Seule une reservation active ou planifiee peut etre prolongee", None, None
+            
+            fin = sans_fuseau(reservation.fin)
+            if fin <= datetime.now():
+                return "Reservation deja expiree", None, None
+            
+            duree = reservation.duree_heures + heures
+            if duree > settings.DUREE_MAX_HEURES:
+                return f"Duree totale limitee a {settings.DUREE_MAX_HEURES}h", None, None
+            
+            place_doc = transaction.get(places_ref().document(reservation.place_id))
+            if not place_doc.exists:
+                return "Place introuvable", None, None
+            
+            place = depuis_document(PlaceParking, place_doc)
+            nouvelle_fin = fin + timedelta(hours=heures)
+            # La reservation elle-meme se termine a fin: seul le creneau ajoute est verifie
+            if CalendrierPlace.depuis_place(place).chevauche(fin, nouvelle_fin):
+                return "La place est reservee apres cette reservation", None, None
+            
+            transaction.update(reservations_ref().document(reservation_id), {
+                "fin": nouvelle_fin,
+                "duree_heures": duree,
+                "montant": reservation.montant + supplement
             })
             
-            temps_restant = int((fin - maintenant).total_seconds())
+            if reservation.statut == StatutReservation.PLANIFIEE:
+                transaction.update(places_ref().document(reservation.place_id), {
+                    f"planning.{reservation_id}.fin": nouvelle_fin
+                })
+            else:
+                transaction.update(places_ref().document(reservation.place_id), {
+                    "fin_reservation": nouvelle_fin,
+                    "duree_heures": duree
+                })
+            
+            reservation.fin = nouvelle_fin
+            reservation.duree_heures = duree
+            return None, reservation, place
+        
+        try:
+            erreur, reservation, place = executer_transaction(prolonger)
+            
+            if erreur:
+                return ReservationResponse(succes=False, message=erreur), None
+            
+            if reservation.statut == StatutReservation.ACTIVE:
+                # Les echeances existantes sont deplacees, pas dupliquees
+                get_planificateur().planifier(ECHEANCE_EXPIRATION, reservation_id, reservation.fin)
+                ServiceReservation.planifier_rappels(reservation)
+            
+            maintenant = datetime.now()
+            debut = sans_fuseau(reservation.debut)
             
             logger.info(
-                f"Reservation {reservation_id} creee: "
-                f"place {place_id}, utilisateur {utilisateur_id}, {duree_heures}h"
+                f"Reservation {reservation_id} prolongee de {heures}h "
+                f"(fin {reservation.fin:%Y-%m-%d %H:%M}, +{supplement} FC)"
             )
             
             return ReservationResponse(
                 succes=True,
-                message="Reservation confirmee",
+                message=f"Reservation prolongee de {heures}h",
                 reservation_id=reservation_id,
-                place_numero=place_data.get("numero"),
-                montant=montant,
-                debut=maintenant,
-                fin=fin,
-                temps_restant_secondes=temps_restant
-            )
+                statut=reservation.statut,
+                place_id=reservation.place_id,
+                place_numero=place.numero,
+                montant=supplement,
+                debut=debut,
+                fin=reservation.fin,
+                temps_restant_secondes=int((reservation.fin - max(debut, maintenant)).total_seconds())
+            ), place.statut.value
             
         except Exception as e:
-            logger.error(f"Erreur creation reservation: {e}")
+            logger.error(f"Erreur prolongation reservation {reservation_id}: {e}")
             return ReservationResponse(
                 succes=False,
-                message="Erreur lors de la reservation"
-            )
+                message="Erreur lors de la prolongation"
+            ), None
     
     @staticmethod
     async def obtenir_reservation(reservation_id: str) -> Optional[Reservation]:
@@ -126,9 +803,7 @@ class ServiceReservation:
             if not doc.exists:
                 return None
             
-            data = doc.to_dict()
-            data["id"] = doc.id
-            return Reservation(**data)
+            return depuis_document(Reservation, doc)
             
         except Exception as e:
             logger.error(f"Erreur recuperation reservation {reservation_id}: {e}")
@@ -141,30 +816,227 @@ class ServiceReservation:
             query = reservations_ref().where("statut", "==", StatutReservation.ACTIVE.value)
             docs = query.get()
             
-            reservations = []
-            for doc in docs:
-                data = doc.to_dict()
-                data["id"] = doc.id
-                reservations.append(Reservation(**data))
-            
-            return reservations
+            return depuis_documents(Reservation, docs)
             
         except Exception as e:
             logger.error(f"Erreur recuperation reservations actives: {e}")
             return []
     
+    @staticmethod
+    async def obtenir_reservations_planifiees() -> list[Reservation]:
+        """Recupere les reservations a l'avance pas encore commencees."""
+        try:
+            query = reservations_ref().where("statut", "==", StatutReservation.PLANIFIEE.value)
+            docs = query.get()
+            
+            return depuis_documents(Reservation, docs)
+            
+        except Exception as e:
+            logger.error(f"Erreur recuperation reservations planifiees: {e}")
+            return []
+    
+    @staticmethod
+    async def activer_reservation(reservation_id: str) -> Optional[Tuple[Reservation, bool]]:
+        """
+        Active une reservation a l'avance arrivee a son debut.
+        Le creneau quitte le planning de la place, qui passe en reservee
+        si elle est libre (un vehicule sans reservation peut encore
+        l'occuper: la place est alors laissee en l'etat).
+        
+        Returns:
+            (reservation activee, place passee en reservee), ou None si la
+            reservation n'est plus planifiee ou pas encore commencee
+        """
+        try:
+            def activer(transaction):
+                doc = transaction.get(reservations_ref().document(reservation_id))
+                if not doc.exists:
+                    return None
+                
+                reservation = depuis_document(Reservation, doc)
+                if reservation.statut != StatutReservation.PLANIFIEE:
+                    return None
+                
+                debut = sans_fuseau(reservation.debut)
+                if debut > datetime.now():
+                    return reservation, None
+                
+                place_doc = transaction.get(places_ref().document(reservation.place_id))
+                place_libre = (
+                    place_doc.exists
+                    and place_doc.to_dict().get("statut") == StatutPlace.DISPONIBLE.value
+                )
+                
+                transaction.update(reservations_ref().document(reservation_id), {
+                    "statut": StatutReservation.ACTIVE.value
+                })
+                
+                if place_doc.exists:
+                    modifications = {f"planning.{reservation_id}": DELETE_FIELD}
+                    if place_libre:
+                        modifications.update({
+                            "statut": StatutPlace.RESERVEE.value,
+                            "reserve_par": reservation.utilisateur_id,
+                            "debut_reservation": debut,
+                            "fin_reservation": sans_fuseau(reservation.fin),
+                            "duree_heures": reservation.duree_heures
+                        })
+                    transaction.update(places_ref().document(reservation.place_id), modifications)
+                
+                reservation.statut = StatutReservation.ACTIVE
+                return reservation, place_libre
+            
+            resultat = executer_transaction(activer)
+            if resultat is None:
+                return None
+            
+            reservation, place_reservee = resultat
+            if place_reservee is None:
+                # Debut deplace: activation replanifiee
+                get_planificateur().planifier(ECHEANCE_ACTIVATION, reservation.id, reservation.debut)
+                return None
+            
+            if place_reservee:
+                logger.info(f"Reservation {reservation_id} activee, place {reservation.place_id} reservee")
+            else:
+                logger.warning(
+                    f"Reservation {reservation_id} activee mais place {reservation.place_id} non libre"
+                )
+            
+            return reservation, place_reservee
+            
+        except Exception as e:
+            logger.error(f"Erreur activation reservation {reservation_id}: {e}")
+            return None
+    
+    @staticmethod
+    async def marquer_arrivee(place_id: str, utilisateur_id: str) -> Optional[str]:
+        """
+        Vehicule detecte sur une place reservee: la reservation active du
+        titulaire est marquee vehicule_arrive et son delai d'arrivee annule.
+        
+        Returns:
+            ID de la reservation, ou None si aucune ne correspond
+        """
+        try:
+            query = (
+                reservations_ref()
+                .where("place_id", "==", place_id)
+                .where("statut", "==", StatutReservation.ACTIVE.value)
+            )
+            
+            for doc in query.get():
+                data = doc.to_dict()
+                if data.get("utilisateur_id") != utilisateur_id:
+                    continue
+                
+                if not data.get("vehicule_arrive"):
+                    doc.reference.update({
+                        "vehicule_arrive": True,
+                        "non_presentation": False
+                    })
+                get_planificateur().annuler(ECHEANCE_ARRIVEE, doc.id)
+                return doc.id
+            
+            return None
+            
+        except Exception as e:
+            logger.error(f"Erreur arrivee vehicule place {place_id}: {e}")
+            return None
+    
+    @staticmethod
+    async def constater_non_presentation(reservation_id: str) -> Optional[Tuple[Reservation, bool]]:
+        """
+        Delai d'arrivee ecoule sans vehicule: la reservation est marquee
+        non_presentation et, si LIBERATION_NON_PRESENTATION, expiree avec
+        sa place liberee. Une place occupee par le titulaire (signal
+        capteur manque) compte comme une arrivee.
+        
+        Returns:
+            (reservation, place liberee), ou None si rien n'est a faire
+        """
+        settings = get_settings()
+        
+        try:
+            def constater(transaction):
+                doc = transaction.get(reservations_ref().document(reservation_id))
+                if not doc.exists:
+                    return None
+                
+                reservation = depuis_document(Reservation, doc)
+                limite = ServiceReservation.limite_arrivee(reservation)
+                if reservation.statut != StatutReservation.ACTIVE or limite is None:
+                    return None
+                
+                if limite > datetime.now():
+                    return reservation, None
+                
+                place_doc = transaction.get(places_ref().document(reservation.place_id))
+                place = place_doc.to_dict() if place_doc.exists else {}
+                titulaire = place.get("reserve_par") == reservation.utilisateur_id
+                
+                if titulaire and place.get("statut") == StatutPlace.OCCUPEE.value:
+                    transaction.update(reservations_ref().document(reservation_id), {
+                        "vehicule_arrive": True
+                    })
+                    return None
+                
+                modifications = {"non_presentation": True}
+                place_liberee = False
+                
+                if settings.LIBERATION_NON_PRESENTATION:
+                    modifications["statut"] = StatutReservation.EXPIREE.value
+                    reservation.statut = StatutReservation.EXPIREE
+                    
+                    if titulaire and place.get("statut") == StatutPlace.RESERVEE.value:
+                        transaction.update(places_ref().document(reservation.place_id), {
+                            "statut": StatutPlace.DISPONIBLE.value,
+                            "reserve_par": None,
+                            "debut_reservation": None,
+                            "fin_reservation": None,
+                            "duree_heures": None
+                        })
+                        place_liberee = True
+                
+                transaction.update(reservations_ref().document(reservation_id), modifications)
+                reservation.non_presentation = True
+                return reservation, place_liberee
+            
+            resultat = executer_transaction(constater)
+            if resultat is None:
+                return None
+            
+            reservation, place_liberee = resultat
+            if place_liberee is None:
+                # Debut deplace: delai replanifie
+                get_planificateur().planifier(
+                    ECHEANCE_ARRIVEE, reservation.id, ServiceReservation.limite_arrivee(reservation)
+                )
+                return None
+            
+            if reservation.statut == StatutReservation.EXPIREE:
+                get_planificateur().annuler(ECHEANCE_EXPIRATION, reservation_id)
+                ServiceReservation.annuler_rappels(reservation_id)
+                logger.info(
+                    f"Reservation {reservation_id}: vehicule non arrive, "
+                    f"place {reservation.place_id} {'liberee' if place_liberee else 'non liberee'}"
+                )
+            else:
+                logger.warning(f"Reservation {reservation_id}: vehicule non arrive (signalee)")
+            
+            return reservation, place_liberee
+            
+        except Exception as e:
+            logger.error(f"Erreur non-presentation reservation {reservation_id}: {e}")
+            return None
+    
     @staticmethod
     async def obtenir_reservations_utilisateur(utilisateur_id: str) -> list[Reservation]:
         """Recupere les reservations d'un utilisateur."""
         try:
             query = reservations_ref().where("utilisateur_id", "==", utilisateur_id)
             docs = query.get()
-            
-            reservations = []
-            for doc in docs:
-                data = doc.to_dict()
-                data["id"] = doc.id
-                reservations.append(Reservation(**data))
+            reservations = depuis_documents(Reservation, docs)
             
             # Trier par date de creation decroissante
             reservations.sort(key=lambda r: r.date_creation, reverse=True)
@@ -176,65 +1048,156 @@ class ServiceReservation:
             return []
     
     @staticmethod
-    async def expirer_reservation(reservation_id: str) -> bool:
-        """Marque une reservation comme expiree et libere la place."""
+    async def compter_reservations_actives_utilisateur(utilisateur_id: str) -> int:
+        """
+        Compte les reservations actives d'un utilisateur.
+        Agregation cote Firestore: aucun document n'est transfere.
+        """
         try:
-            doc = reservations_ref().document(reservation_id).get()
-            
-            if not doc.exists:
-                return False
-            
-            data = doc.to_dict()
-            place_id = data.get("place_id")
+            query = (
+                reservations_ref()
+                .where("utilisateur_id", "==", utilisateur_id)
+                .where("statut", "==", StatutReservation.ACTIVE.value)
+            )
+            resultats = query.count().get()
             
-            # Mettre a jour la reservation
-            reservations_ref().document(reservation_id).update({
-                "statut": StatutReservation.EXPIREE.value
-            })
+            return int(resultats[0][0].value)
             
-            # Liberer la place
-            if place_id:
-                places_ref().document(place_id).update({
-                    "statut": StatutPlace.DISPONIBLE.value,
-                    "reserve_par": None,
-                    "debut_reservation": None,
-                    "fin_reservation": None,
-                    "duree_heures": None
+        except Exception as e:
+            logger.error(f"Erreur comptage reservations utilisateur: {e}")
+            return 0
+    
+    @staticmethod
+    async def obtenir_page_reservations_utilisateur(
+        utilisateur_id: str,
+        limite: int = 20,
+        apres: str = None
+    ) -> tuple[list[Reservation], Optional[str], int]:
+        """
+        Recupere une page de l'historique d'un utilisateur, du plus recent
+        au plus ancien, et le nombre total de ses reservations. Le tri est
+        fait par Firestore (index composite). Leve ValueError si le curseur
+        est invalide.
+        """
+        requete = (
+            reservations_ref()
+            .where("utilisateur_id", "==", utilisateur_id)
+            .order_by("date_creation", direction=Query.DESCENDING)
+        )
+        docs, suivant = paginer(requete, reservations_ref(), limite, apres)
+        return depuis_documents(Reservation, docs), suivant, compter(requete)
+    
+    @staticmethod
+    async def obtenir_page_reservations_actives(
+        limite: int = 50,
+        apres: str = None
+    ) -> tuple[list[Reservation], Optional[str], int]:
+        """
+        Recupere une page des reservations actives, des plus recentes
+        aux plus anciennes, et leur nombre total. Leve ValueError si le
+        curseur est invalide.
+        """
+        requete = (
+            reservations_ref()
+            .where("statut", "==", StatutReservation.ACTIVE.value)
+            .order_by("date_creation", direction=Query.DESCENDING)
+        )
+        docs, suivant = paginer(requete, reservations_ref(), limite, apres)
+        return depuis_documents(Reservation, docs), suivant, compter(requete)
+    
+    @staticmethod
+    def _liberer_place_titulaire(transaction, reservation: Reservation) -> bool:
+        """
+        Libere la place de la reservation (dans la transaction) si elle la
+        tient encore: meme titulaire et meme fin. Une reservation suivante
+        deja activee sur la place n'est pas effacee par une echeance en retard.
+        
+        Returns:
+            True si la place a ete liberee
+        """
+        place_ref = places_ref().document(reservation.place_id)
+        doc = transaction.get(place_ref)
+        if not doc.exists:
+            return False
+        
+        place = doc.to_dict()
+        if (
+            place.get("reserve_par") != reservation.utilisateur_id
+            or sans_fuseau(place.get("fin_reservation")) != sans_fuseau(reservation.fin)
+        ):
+            return False
+        
+        transaction.update(place_ref, {
+            "statut": StatutPlace.DISPONIBLE.value,
+            "reserve_par": None,
+            "debut_reservation": None,
+            "fin_reservation": None,
+            "duree_heures": None
+        })
+        return True
+    
+    @staticmethod
+    async def expirer_reservation(reservation_id: str) -> Tuple[bool, bool]:
+        """
+        Marque une reservation active comme expiree et libere sa place
+        si elle la tient encore.
+        
+        Returns:
+            (reservation expiree, place liberee)
+        """
+        try:
+            def expirer(transaction):
+                doc = transaction.get(reservations_ref().document(reservation_id))
+                if not doc.exists:
+                    return False, False
+                
+                reservation = depuis_document(Reservation, doc)
+                if reservation.statut != StatutReservation.ACTIVE:
+                    return False, False
+                
+                # Lecture de la place avant toute ecriture (regle des transactions)
+                place_liberee = ServiceReservation._liberer_place_titulaire(transaction, reservation)
+                transaction.update(reservations_ref().document(reservation_id), {
+                    "statut": StatutReservation.EXPIREE.value
                 })
+                return True, place_liberee
             
-            logger.info(f"Reservation {reservation_id} expiree, place {place_id} liberee")
-            return True
+            expiree, place_liberee = executer_transaction(expirer)
+            
+            if expiree:
+                ServiceReservation.annuler_rappels(reservation_id)
+                logger.info(
+                    f"Reservation {reservation_id} expiree, "
+                    f"place {'liberee' if place_liberee else 'deja reprise'}"
+                )
+            return expiree, place_liberee
             
         except Exception as e:
             logger.error(f"Erreur expiration reservation {reservation_id}: {e}")
-            return False
+            return False, False
     
     @staticmethod
     async def terminer_reservation(reservation_id: str) -> bool:
         """Termine une reservation normalement (vehicule parti)."""
         try:
-            doc = reservations_ref().document(reservation_id).get()
+            def terminer(transaction):
+                doc = transaction.get(reservations_ref().document(reservation_id))
+                if not doc.exists:
+                    return False
+                
+                reservation = depuis_document(Reservation, doc)
+                ServiceReservation._liberer_place_titulaire(transaction, reservation)
+                transaction.update(reservations_ref().document(reservation_id), {
+                    "statut": StatutReservation.TERMINEE.value
+                })
+                return True
             
-            if not doc.exists:
+            if not executer_transaction(terminer):
                 return False
             
-            data = doc.to_dict()
-            place_id = data.get("place_id")
-            
-            # Mettre a jour la reservation
-            reservations_ref().document(reservation_id).update({
-                "statut": StatutReservation.TERMINEE.value
-            })
-            
-            # Liberer la place
-            if place_id:
-                places_ref().document(place_id).update({
-                    "statut": StatutPlace.DISPONIBLE.value,
-                    "reserve_par": None,
-                    "debut_reservation": None,
-                    "fin_reservation": None,
-                    "duree_heures": None
-                })
+            get_planificateur().annuler(ECHEANCE_EXPIRATION, reservation_id)
+            get_planificateur().annuler(ECHEANCE_ARRIVEE, reservation_id)
+            ServiceReservation.annuler_rappels(reservation_id)
             
             logger.info(f"Reservation {reservation_id} terminee")
             return True
@@ -257,6 +1220,7 @@ class ServiceReservation:
             # Verifier que la reservation peut etre annulee
             if data.get("statut") not in [
                 StatutReservation.EN_ATTENTE.value,
+                StatutReservation.PLANIFIEE.value,
                 StatutReservation.ACTIVE.value
             ]:
                 logger.warning(f"Reservation {reservation_id} ne peut pas etre annulee")
@@ -269,6 +1233,20 @@ class ServiceReservation:
                 "statut": StatutReservation.ANNULEE.value
             })
             
+            if data.get("statut") == StatutReservation.PLANIFIEE.value:
+                # Pas encore commencee: seul son creneau quitte le planning
+                get_planificateur().annuler(ECHEANCE_ACTIVATION, reservation_id)
+                if place_id:
+                    places_ref().document(place_id).update({
+                        f"planning.{reservation_id}": DELETE_FIELD
+                    })
+                logger.info(f"Reservation planifiee {reservation_id} annulee")
+                return True
+            
+            get_planificateur().annuler(ECHEANCE_EXPIRATION, reservation_id)
+            get_planificateur().annuler(ECHEANCE_ARRIVEE, reservation_id)
+            ServiceReservation.annuler_rappels(reservation_id)
+            
             # Liberer la place
             if place_id:
                 places_ref().document(place_id).update({
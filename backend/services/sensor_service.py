@@ -8,6 +8,7 @@ from loguru import logger
 from database.firebase import capteurs_ref, places_ref
 from models.sensor import MiseAJourCapteur, ReponseCapteur, EtatCapteur
 from models.parking import StatutPlace
+from services.reservation_service import ServiceReservation
 
 
 class ServiceCapteur:
@@ -45,6 +46,8 @@ class ServiceCapteur:
                     places_ref().document(place_id).update({
                         "statut": nouveau_statut
                     })
+                    # Annule le delai d'arrivee de la reservation
+                    await ServiceReservation.marquer_arrivee(place_id, place_data.get("reserve_par"))
                     logger.info(f"Vehicule arrive sur place {place_id}")
                     
                 elif statut_actuel == StatutPlace.DISPONIBLE.value:
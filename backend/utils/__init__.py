@@ -11,6 +11,10 @@ from utils.helpers import (
     valider_telephone,
     formater_telephone,
     valider_id_place,
+    zone_place,
+    rang_place,
+    sans_fuseau,
+    heure_locale,
     generer_id_place,
     nettoyer_texte,
     parser_datetime,
@@ -25,6 +29,64 @@ from utils.scheduler import (
     verifier_expiration_unique
 )
 
+from utils.bus_evenements import (
+    BusEvenements,
+    BusLocal,
+    BusSocketUnix,
+    CANAL_DIFFUSION,
+    CANAL_CIBLE,
+    creer_bus,
+    get_bus
+)
+
+from utils.encodage import (
+    PROTOCOLE_COMPACT,
+    CODES_STATUT,
+    signature_dictionnaire,
+    encoder_etat_compact
+)
+
+from utils.reponses import (
+    ReponseJSONRapide,
+    reponse_modele
+)
+
+from utils.compression import (
+    MiddlewareCompression,
+    choisir_encodage,
+    compresser
+)
+
+from utils.cache_etat import (
+    CacheEtatParking,
+    get_cache_etat
+)
+
+from utils.metriques import (
+    Compteur,
+    Jauge,
+    Histogramme,
+    Registre,
+    MiddlewareMetriques,
+    ComptesRequete,
+    comptes_requete,
+    get_registre
+)
+
+from utils.index_places import IndexPlaces
+
+from utils.idempotence import (
+    CacheIdempotence,
+    get_idempotence
+)
+
+from utils.identifiants import (
+    nouvel_identifiant,
+    est_identifiant_ordonne,
+    horodatage_identifiant,
+    borne_identifiant
+)
+
 __all__ = [
     # Helpers
     "formater_duree",
@@ -36,6 +98,10 @@ __all__ = [
     "valider_telephone",
     "formater_telephone",
     "valider_id_place",
+    "zone_place",
+    "rang_place",
+    "sans_fuseau",
+    "heure_locale",
     "generer_id_place",
     "nettoyer_texte",
     "parser_datetime",
@@ -45,5 +111,45 @@ __all__ = [
     "PlanificateurReservations",
     "planificateur",
     "get_planificateur",
-    "verifier_expiration_unique"
+    "verifier_expiration_unique",
+    # Bus d'evenements
+    "BusEvenements",
+    "BusLocal",
+    "BusSocketUnix",
+    "CANAL_DIFFUSION",
+    "CANAL_CIBLE",
+    "creer_bus",
+    "get_bus",
+    # Encodage
+    "PROTOCOLE_COMPACT",
+    "CODES_STATUT",
+    "signature_dictionnaire",
+    "encoder_etat_compact",
+    # Reponses
+    "ReponseJSONRapide",
+    "reponse_modele",
+    # Compression et cache du snapshot
+    "MiddlewareCompression",
+    "choisir_encodage",
+    "compresser",
+    "CacheEtatParking",
+    "get_cache_etat",
+    "IndexPlaces",
+    # Metriques
+    "Compteur",
+    "Jauge",
+    "Histogramme",
+    "Registre",
+    "MiddlewareMetriques",
+    "ComptesRequete",
+    "comptes_requete",
+    "get_registre",
+    # Idempotence
+    "CacheIdempotence",
+    "get_idempotence",
+    # Identifiants
+    "nouvel_identifiant",
+    "est_identifiant_ordonne",
+    "horodatage_identifiant",
+    "borne_identifiant"
 ]
@@ -0,0 +1,282 @@
+# Boite d'envoi des notifications (envoi par lots)
+# ================================================
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+from loguru import logger
+import asyncio
+
+from config import get_settings
+from database.firebase import (
+    notifications_ref, lire_documents, ecrire_par_lots, executer_transaction
+)
+from database.hydratation import depuis_document
+from models.notification import CanalNotification, Notification, StatutNotification
+from utils.expediteurs import Expediteur, creer_expediteurs
+from utils.helpers import sans_fuseau
+from utils.metriques import NOTIFICATIONS
+
+# Delai avant une nouvelle tentative: double a chaque echec, plafonne
+DELAI_REESSAI_BASE = 30  # secondes
+DELAI_REESSAI_MAX = 3600
+
+# Une notification prise par une passe interrompue (arret du worker)
+# redevient disponible apres ce delai
+DUREE_BAIL_ENVOI = 60  # secondes
+
+
+class BoiteEnvoi:
+    """
+    Notifications durables, envoyees par lots.
+    
+    Les notifications creees (avertissements d'expiration...) sont
+    accumulees en memoire puis ecrites ensemble dans Firestore. Leur
+    identifiant sert de cle de deduplication: une notification deja
+    presente n'est pas recreee, meme par un autre worker.
+    
+    Chaque passe prend au plus taille_lot notifications dues et appelle
+    une seule fois chaque expediteur: quand des centaines de reservations
+    finissent a l'heure ronde, l'envoi coute quelques ecritures Firestore
+    et quelques appels au fournisseur.
+    """
+    
+    def __init__(
+        self,
+        intervalle: float = 5.0,
+        taille_lot: int = 100,
+        max_tentatives: int = 5,
+        expediteurs: Optional[dict[CanalNotification, Expediteur]] = None
+    ):
+        """
+        Args:
+            intervalle: secondes entre deux passes d'envoi
+            taille_lot: notifications envoyees au plus par passe
+            max_tentatives: tentatives avant abandon (statut failed)
+            expediteurs: expediteur de chaque canal (configuration si absent)
+        """
+        self.intervalle = intervalle
+        self.taille_lot = taille_lot
+        self.max_tentatives = max_tentatives
+        self.expediteurs = expediteurs if expediteurs is not None else creer_expediteurs()
+        self.en_cours = False
+        self._tache: asyncio.Task = None
+        # id -> notification pas encore ecrite dans Firestore
+        self._nouvelles: dict[str, Notification] = {}
+        self._reveil = asyncio.Event()
+    
+    async def demarrer(self):
+        """Demarre la boucle d'envoi."""
+        if self.en_cours:
+            return
+        
+        self.en_cours = True
+        self._tache = asyncio.create_task(self._boucle())
+        logger.info(
+            f"Boite d'envoi demarree ({', '.join(canal.value for canal in self.expediteurs) or 'aucun canal'})"
+        )
+    
+    async def arreter(self):
+        """Arrete la boucle apres une derniere ecriture des notifications en memoire."""
+        self.en_cours = False
+        
+        if self._tache:
+            self._tache.cancel()
+            try:
+                await self._tache
+            except asyncio.CancelledError:
+                pass
+        
+        try:
+            self._ecrire_nouvelles()
+        except Exception as e:
+            logger.error(f"Erreur ecriture boite d'envoi a l'arret: {e}")
+        
+        for expediteur in self.expediteurs.values():
+            await expediteur.fermer()
+        
+        logger.info("Boite d'envoi arretee")
+    
+    def notifier(
+        self,
+        cle: str,
+        utilisateur_id: str,
+        type_notification: str,
+        message: str,
+        donnees: Optional[dict] = None,
+        valable_jusqu_a: Optional[datetime] = None
+    ):
+        """
+        Ajoute une notification pour chaque canal actif. La cle identifie
+        l'evenement: la meme cle ajoutee deux fois n'est envoyee qu'une fois.
+        """
+        for canal in self.expediteurs:
+            notification = Notification(
+                id=f"{cle}:{canal.value}",
+                canal=canal,
+                utilisateur_id=utilisateur_id,
+                type=type_notification,
+                message=message,
+                donnees=donnees or {},
+                valable_jusqu_a=valable_jusqu_a
+            )
+            self._nouvelles.setdefault(notification.id, notification)
+        
+        self._reveil.set()
+    
+    async def _boucle(self):
+        """Boucle principale: une passe par intervalle ou des qu'une notification arrive."""
+        while self.en_cours:
+            self._reveil.clear()
+            
+            try:
+                await self.traiter()
+            except Exception as e:
+                logger.error(f"Erreur dans la boite d'envoi: {e}")
+            
+            try:
+                await asyncio.wait_for(self._reveil.wait(), timeout=self.intervalle)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def traiter(self) -> int:
+        """
+        Une passe: ecrit les nouvelles notifications puis envoie un lot.
+        
+        Returns:
+            Nombre de notifications envoyees
+        """
+        self._ecrire_nouvelles()
+        
+        maintenant = datetime.now()
+        lot = executer_transaction(self._reserver_lot, maintenant)
+        if not lot:
+            return 0
+        
+        operations = []
+        par_canal: dict[CanalNotification, list[Notification]] = defaultdict(list)
+        
+        for notification in lot:
+            if (
+                notification.valable_jusqu_a is not None
+                and sans_fuseau(notification.valable_jusqu_a) <= maintenant
+            ):
+                operations.append(("update", notification.id, {
+                    "statut": StatutNotification.PERIMEE.value
+                }))
+                NOTIFICATIONS.inc(notification.canal.value, StatutNotification.PERIMEE.value)
+            elif notification.canal not in self.expediteurs:
+                operations.append(("update", notification.id, {
+                    "statut": StatutNotification.ECHEC.value,
+                    "derniere_erreur": "Canal desactive"
+                }))
+                NOTIFICATIONS.inc(notification.canal.value, StatutNotification.ECHEC.value)
+            else:
+                par_canal[notification.canal].append(notification)
+        
+        envoyees = 0
+        for canal, notifications in par_canal.items():
+            try:
+                erreurs = await self.expediteurs[canal].envoyer(notifications)
+            except Exception as e:
+                logger.error(f"Erreur expediteur {canal.value}: {e}")
+                erreurs = {notification.id: str(e) for notification in notifications}
+            
+            for notification in notifications:
+                erreur = erreurs.get(notification.id)
+                champs = self._resultat(notification, erreur, maintenant)
+                operations.append(("update", notification.id, champs))
+                # Sans statut: nouvelle tentative planifiee
+                NOTIFICATIONS.inc(canal.value, champs.get("statut", StatutNotification.EN_ATTENTE.value))
+                envoyees += erreur is None
+        
+        ecrire_par_lots(notifications_ref(), operations)
+        
+        if envoyees:
+            logger.info(f"{envoyees} notification(s) envoyee(s)")
+        
+        return envoyees
+    
+    def _ecrire_nouvelles(self):
+        """Ecrit en un batch les notifications absentes de Firestore (deduplication)."""
+        if not self._nouvelles:
+            return
+        
+        nouvelles, self._nouvelles = self._nouvelles, {}
+        existantes = lire_documents(notifications_ref(), nouvelles)
+        
+        operations = [
+            ("create", notification_id, notification.model_dump())
+            for notification_id, notification in nouvelles.items()
+            if not (notification_id in existantes and existantes[notification_id].exists)
+        ]
+        
+        erreurs = ecrire_par_lots(notifications_ref(), operations)
+        for (_, notification_id, _), erreur in zip(operations, erreurs):
+            if erreur is not None:
+                # Reessayee a la passe suivante (relue: une deja creee est ignoree)
+                self._nouvelles.setdefault(notification_id, nouvelles[notification_id])
+    
+    def _reserver_lot(self, transaction, maintenant: datetime) -> list[Notification]:
+        """
+        Prend les notifications dues dans une transaction: leur prochain
+        essai est repousse de DUREE_BAIL_ENVOI, un autre worker ne les
+        reprend donc pas pendant l'envoi.
+        """
+        query = (
+            notifications_ref()
+            .where("statut", "==", StatutNotification.EN_ATTENTE.value)
+            .where("prochain_essai", "<=", maintenant)
+            .order_by("prochain_essai")
+            .limit(self.taille_lot)
+        )
+        
+        lot = [depuis_document(Notification, doc) for doc in transaction.get(query)]
+        
+        for notification in lot:
+            notification.tentatives += 1
+            transaction.update(notifications_ref().document(notification.id), {
+                "tentatives": notification.tentatives,
+                "prochain_essai": maintenant + timedelta(seconds=DUREE_BAIL_ENVOI)
+            })
+        
+        return lot
+    
+    def _resultat(self, notification: Notification, erreur: Optional[str], maintenant: datetime) -> dict:
+        """Champs a ecrire apres une tentative d'envoi."""
+        if erreur is None:
+            return {
+                "statut": StatutNotification.ENVOYEE.value,
+                "date_envoi": maintenant,
+                "derniere_erreur": None
+            }
+        
+        if notification.tentatives >= self.max_tentatives:
+            logger.warning(f"Notification {notification.id} abandonnee: {erreur}")
+            return {
+                "statut": StatutNotification.ECHEC.value,
+                "derniere_erreur": erreur
+            }
+        
+        delai = min(DELAI_REESSAI_BASE * 2 ** (notification.tentatives - 1), DELAI_REESSAI_MAX)
+        return {
+            "prochain_essai": maintenant + timedelta(seconds=delai),
+            "derniere_erreur": erreur
+        }
+
+
+# Instance globale (creee a la premiere utilisation)
+_boite_envoi: Optional[BoiteEnvoi] = None
+
+
+def get_boite_envoi() -> BoiteEnvoi:
+    """Retourne la boite d'envoi du worker."""
+    global _boite_envoi
+    if _boite_envoi is None:
+        settings = get_settings()
+        _boite_envoi = BoiteEnvoi(
+            intervalle=settings.NOTIFICATIONS_INTERVALLE,
+            taille_lot=settings.NOTIFICATIONS_TAILLE_LOT,
+            max_tentatives=settings.NOTIFICATIONS_MAX_TENTATIVES
+        )
+    return _boite_envoi
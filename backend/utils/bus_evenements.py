@@ -0,0 +1,233 @@
+# Bus d'evenements pour la diffusion entre workers
+# =================================================
+
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional
+from loguru import logger
+import asyncio
+import json
+import os
+import socket
+import time
+
+from config import get_settings
+
+# Canal utilise par les fonctions diffuser_* du router WebSocket
+CANAL_DIFFUSION = "diffusion"
+
+# Canal des messages destines a certains utilisateurs (et aux admins)
+CANAL_CIBLE = "cible"
+
+# Canal des echeances planifiees par un follower, pour le leader
+CANAL_ECHEANCES = "echeances"
+
+# Taille maximale d'un datagramme recu (les snapshots ne passent pas par le bus)
+TAILLE_MAX_DATAGRAMME = 256 * 1024
+
+Rappel = Callable[[dict], Awaitable[None]]
+
+
+class BusEvenements:
+    """
+    Interface commune des bus de diffusion.
+    
+    Les producteurs publient un message sur un canal, et chaque worker
+    livre ce message a ses abonnes locaux (ex: les sockets qu'il detient).
+    Un nouveau backend (ex: Redis) n'a qu'a implementer demarrer,
+    arreter et publier.
+    """
+    
+    def __init__(self):
+        self._abonnes: Dict[str, List[Rappel]] = defaultdict(list)
+    
+    def abonner(self, canal: str, rappel: Rappel):
+        """Enregistre une coroutine appelee pour chaque message du canal."""
+        self._abonnes[canal].append(rappel)
+    
+    async def demarrer(self):
+        """Ouvre les ressources du bus."""
+    
+    async def arreter(self):
+        """Libere les ressources du bus."""
+    
+    async def publier(self, canal: str, message: dict):
+        """Publie un message vers tous les workers."""
+        raise NotImplementedError
+    
+    async def _livrer_localement(self, canal: str, message: dict):
+        """Transmet un message aux abonnes de ce worker."""
+        for rappel in list(self._abonnes.get(canal, ())):
+            try:
+                await rappel(message)
+            except Exception as e:
+                logger.error(f"Erreur abonne bus ({canal}): {e}")
+
+
+class BusLocal(BusEvenements):
+    """Bus limite au processus courant (un seul worker)."""
+    
+    async def publier(self, canal: str, message: dict):
+        await self._livrer_localement(canal, message)
+
+
+class BusSocketUnix(BusEvenements):
+    """
+    Bus multi-processus pour les workers d'un meme hote.
+    
+    Chaque worker ouvre un socket Unix datagramme dans un repertoire
+    partage. Publier revient a envoyer le message a tous les sockets
+    du repertoire, puis a le livrer localement. Aucun broker n'est
+    necessaire et un worker mort est detecte au premier envoi refuse.
+    
+    Les messages recus sont livres un par un par une seule tache, dans
+    l'ordre d'arrivee (le flux SSE les numerote dans cet ordre).
+    """
+    
+    def __init__(self, repertoire: str, rafraichissement_pairs: float = 1.0):
+        """
+        Args:
+            repertoire: dossier partage contenant les sockets des workers
+            rafraichissement_pairs: secondes entre deux listages du dossier
+        """
+        super().__init__()
+        self.repertoire = repertoire
+        self.rafraichissement_pairs = rafraichissement_pairs
+        self._socket: Optional[socket.socket] = None
+        self._chemin: Optional[str] = None
+        self._pairs: List[str] = []
+        self._pairs_lus_a = 0.0
+        self._recus: Optional[asyncio.Queue] = None
+        self._tache_livraison: Optional[asyncio.Task] = None
+    
+    async def demarrer(self):
+        """Cree le socket de ce worker et commence l'ecoute."""
+        os.makedirs(self.repertoire, exist_ok=True)
+        self._chemin = os.path.join(self.repertoire, f"worker-{os.getpid()}.sock")
+        
+        if os.path.exists(self._chemin):
+            os.unlink(self._chemin)
+        
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._socket.bind(self._chemin)
+        
+        self._recus = asyncio.Queue()
+        self._tache_livraison = asyncio.create_task(self._boucle_livraison())
+        asyncio.get_running_loop().add_reader(self._socket.fileno(), self._recevoir)
+        logger.info(f"Bus Unix demarre: {self._chemin}")
+    
+    async def arreter(self):
+        """Ferme le socket et retire son fichier."""
+        if not self._socket:
+            return
+        
+        asyncio.get_running_loop().remove_reader(self._socket.fileno())
+        self._socket.close()
+        self._socket = None
+        
+        if self._tache_livraison:
+            self._tache_livraison.cancel()
+            try:
+                await self._tache_livraison
+            except asyncio.CancelledError:
+                pass
+            self._tache_livraison = None
+        
+        try:
+            os.unlink(self._chemin)
+        except FileNotFoundError:
+            pass
+    
+    def _lister_pairs(self) -> List[str]:
+        """Retourne les sockets des autres workers (liste mise en cache)."""
+        maintenant = time.monotonic()
+        
+        if maintenant - self._pairs_lus_a > self.rafraichissement_pairs:
+            try:
+                self._pairs = [
+                    os.path.join(self.repertoire, nom)
+                    for nom in os.listdir(self.repertoire)
+                    if nom.endswith(".sock")
+                    and os.path.join(self.repertoire, nom) != self._chemin
+                ]
+            except FileNotFoundError:
+                self._pairs = []
+            self._pairs_lus_a = maintenant
+        
+        return self._pairs
+    
+    def _recevoir(self):
+        """Lit les datagrammes en attente et les livre localement."""
+        while self._socket:
+            try:
+                donnees = self._socket.recv(TAILLE_MAX_DATAGRAMME)
+            except (BlockingIOError, InterruptedError):
+                break
+            
+            try:
+                enveloppe = json.loads(donnees)
+            except ValueError:
+                logger.warning("Datagramme invalide ignore sur le bus")
+                continue
+            
+            self._recus.put_nowait(enveloppe)
+    
+    async def _boucle_livraison(self):
+        """Livre les messages recus des autres workers, dans leur ordre d'arrivee."""
+        while True:
+            enveloppe = await self._recus.get()
+            await self._livrer_localement(enveloppe["canal"], enveloppe["message"])
+    
+    async def publier(self, canal: str, message: dict):
+        if self._socket:
+            donnees = json.dumps(
+                {"canal": canal, "message": message},
+                ensure_ascii=False,
+                default=str
+            ).encode("utf-8")
+            
+            for chemin in self._lister_pairs():
+                try:
+                    self._socket.sendto(donnees, chemin)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Worker arrete sans nettoyer son socket
+                    try:
+                        os.unlink(chemin)
+                    except FileNotFoundError:
+                        pass
+                    self._pairs_lus_a = 0.0
+                except BlockingIOError:
+                    logger.warning(f"File du worker {chemin} pleine, message perdu")
+                except OSError as e:
+                    logger.warning(f"Envoi bus vers {chemin} impossible: {e}")
+        
+        await self._livrer_localement(canal, message)
+
+
+def creer_bus() -> BusEvenements:
+    """Construit le bus choisi dans la configuration."""
+    settings = get_settings()
+    type_bus = settings.BUS_EVENEMENTS.lower()
+    
+    if type_bus == "local":
+        return BusLocal()
+    
+    if type_bus == "unix":
+        if not hasattr(socket, "AF_UNIX"):
+            logger.warning("Sockets Unix indisponibles, utilisation du bus local")
+            return BusLocal()
+        return BusSocketUnix(settings.BUS_REPERTOIRE_SOCKETS)
+    
+    raise ValueError(f"Bus d'evenements inconnu: {settings.BUS_EVENEMENTS}")
+
+
+# Instance globale (creee a la premiere utilisation)
+_bus: Optional[BusEvenements] = None
+
+
+def get_bus() -> BusEvenements:
+    """Retourne le bus d'evenements du worker."""
+    global _bus
+    if _bus is None:
+        _bus = creer_bus()
+    return _bus
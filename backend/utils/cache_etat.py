@@ -0,0 +1,135 @@
+# Cache versionne du snapshot de l'etat du parking
+# =================================================
+
+from typing import Dict, Optional, Tuple
+from loguru import logger
+import asyncio
+import hashlib
+import time
+
+from config import get_settings
+from models.parking import EtatParking, PlaceResponse
+from utils.bus_evenements import get_bus, CANAL_DIFFUSION
+from utils.compression import compresser
+from utils.index_places import IndexPlaces
+
+# Evenements du bus qui modifient l'etat des places
+TYPES_INVALIDANTS = {"mise_a_jour_place", "capteur"}
+
+
+class CacheEtatParking:
+    """
+    Garde le dernier snapshot de l'etat du parking, ses variantes
+    serialisees (JSON brut, gzip, brotli) et les index secondaires
+    des places (statut, zone, capteur).
+    
+    La version change a chaque evenement de place recu sur le bus
+    (quel que soit le worker d'origine) ou apres duree_vie secondes,
+    pour que le temps restant reste a jour. Chaque variante n'est
+    compressee qu'une seule fois par version.
+    """
+    
+    def __init__(self, duree_vie: float = 5.0):
+        """
+        Args:
+            duree_vie: secondes avant de relire l'etat meme sans evenement
+        """
+        self.duree_vie = duree_vie
+        self.version = 0
+        self._etat: Optional[EtatParking] = None
+        self._index: Optional[IndexPlaces] = None
+        self._reponses: Dict[str, PlaceResponse] = {}
+        self._lu_a = 0.0
+        self._corps: Dict[str, bytes] = {}
+        self._etag: Optional[str] = None
+        self._verrou = asyncio.Lock()
+    
+    def invalider(self):
+        """Force la relecture au prochain acces."""
+        self.version += 1
+        self._etat = None
+        self._index = None
+        self._reponses = {}
+        self._corps = {}
+        self._etag = None
+    
+    async def recevoir(self, message: dict):
+        """Abonne au bus: invalide le snapshot sur changement de place."""
+        if message.get("type") in TYPES_INVALIDANTS:
+            self.invalider()
+    
+    async def obtenir_etat(self) -> EtatParking:
+        """Retourne le snapshot courant (relu depuis Firestore si perime)."""
+        if self._etat is not None and time.monotonic() - self._lu_a < self.duree_vie:
+            return self._etat
+        
+        async with self._verrou:
+            # Un autre appel a pu relire pendant l'attente du verrou
+            if self._etat is not None and time.monotonic() - self._lu_a < self.duree_vie:
+                return self._etat
+            
+            from services.parking_service import ServiceParking
+            
+            version = self.version
+            places = await ServiceParking.obtenir_toutes_places()
+            etat = ServiceParking.construire_etat(places)
+            
+            self._etat = etat
+            self._index = IndexPlaces(places)
+            self._reponses = {place.id: place for place in etat.places}
+            self._corps = {}
+            self._etag = None
+            # Invalide pendant la lecture: servir ce snapshot une fois, puis relire
+            self._lu_a = time.monotonic() if version == self.version else 0.0
+            return etat
+    
+    async def obtenir_index(self) -> IndexPlaces:
+        """Index secondaires du snapshot courant."""
+        await self.obtenir_etat()
+        return self._index
+    
+    async def obtenir_reponses(self, ids) -> list[PlaceResponse]:
+        """Places du snapshot courant (avec temps restant), triees par numero."""
+        await self.obtenir_etat()
+        places = [self._reponses[i] for i in ids if i in self._reponses]
+        places.sort(key=lambda p: p.numero)
+        return places
+    
+    async def obtenir_corps(
+        self,
+        encodage: Optional[str] = None,
+        taille_min: int = 0
+    ) -> Tuple[bytes, Optional[str], str]:
+        """
+        Retourne (corps serialise, encodage applique, etag).
+        encodage None ou corps plus petit que taille_min: JSON brut.
+        Chaque variante est compressee au plus une fois par version.
+        """
+        etat = await self.obtenir_etat()
+        
+        brut = self._corps.get("identity")
+        if brut is None:
+            brut = etat.model_dump_json().encode("utf-8")
+            self._corps["identity"] = brut
+            self._etag = '"' + hashlib.sha1(brut).hexdigest()[:16] + '"'
+        
+        if encodage is None or len(brut) < taille_min:
+            return brut, None, self._etag
+        
+        corps = self._corps.get(encodage)
+        if corps is None:
+            corps = compresser(brut, encodage)
+            self._corps[encodage] = corps
+            logger.debug(f"Snapshot v{self.version} compresse en {encodage}: {len(brut)} -> {len(corps)} octets")
+        
+        return corps, encodage, self._etag
+
+
+# Instance globale
+cache_etat = CacheEtatParking(duree_vie=get_settings().CACHE_ETAT_DUREE_VIE)
+get_bus().abonner(CANAL_DIFFUSION, cache_etat.recevoir)
+
+
+def get_cache_etat() -> CacheEtatParking:
+    """Retourne le cache du snapshot de l'etat du parking."""
+    return cache_etat
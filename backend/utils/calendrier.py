@@ -0,0 +1,101 @@
+# Calendrier des creneaux reserves d'une place
+# ============================================
+
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterable, Optional, Tuple
+
+from models.parking import PlaceParking, StatutPlace
+from utils.helpers import sans_fuseau
+
+# Identifiant du creneau en cours (reservation active portee par la place)
+CRENEAU_EN_COURS = ""
+
+# (debut, fin, reservation_id)
+Creneau = Tuple[datetime, datetime, str]
+
+
+class CalendrierPlace:
+    """
+    Creneaux reserves d'une place, tries par debut.
+    
+    Les creneaux d'une place ne se chevauchent jamais (verifie a chaque
+    reservation): leurs fins sont donc triees comme leurs debuts et une
+    recherche dichotomique suffit pour tester un chevauchement
+    (O(log n)) ou trouver le premier creneau libre.
+    """
+    
+    __slots__ = ("creneaux", "debuts")
+    
+    def __init__(self, creneaux: Iterable[Creneau] = ()):
+        self.creneaux: list[Creneau] = sorted(creneaux)
+        self.debuts: list[datetime] = [creneau[0] for creneau in self.creneaux]
+    
+    @classmethod
+    def depuis_place(cls, place: PlaceParking) -> "CalendrierPlace":
+        """
+        Calendrier d'une place: reservation en cours (champs *_reservation)
+        et reservations a venir (champ planning).
+        """
+        creneaux = [
+            (sans_fuseau(creneau.debut), sans_fuseau(creneau.fin), reservation_id)
+            for reservation_id, creneau in place.planning.items()
+        ]
+        
+        if place.statut != StatutPlace.DISPONIBLE and place.fin_reservation is not None:
+            creneaux.append((
+                sans_fuseau(place.debut_reservation) or datetime.min,
+                sans_fuseau(place.fin_reservation),
+                CRENEAU_EN_COURS
+            ))
+        
+        return cls(creneaux)
+    
+    def __len__(self) -> int:
+        return len(self.creneaux)
+    
+    def chevauche(self, debut: datetime, fin: datetime) -> bool:
+        """Vrai si [debut, fin[ chevauche un creneau reserve."""
+        # Seul le dernier creneau commencant avant fin peut finir apres debut
+        i = bisect_left(self.debuts, fin)
+        return i > 0 and self.creneaux[i - 1][1] > debut
+    
+    def premier_creneau(
+        self,
+        duree: timedelta,
+        apres: datetime,
+        debut_max: Optional[datetime] = None
+    ) -> Optional[datetime]:
+        """
+        Debut du premier creneau libre de la duree demandee a partir de
+        apres, ou None s'il commence apres debut_max.
+        """
+        debut = apres
+        i = bisect_right(self.debuts, apres)
+        if i > 0:
+            debut = max(debut, self.creneaux[i - 1][1])
+        
+        for debut_suivant, fin_suivante, _ in islice(self.creneaux, i, None):
+            if debut_suivant - debut >= duree:
+                break
+            if debut_max is not None and debut > debut_max:
+                return None
+            debut = max(debut, fin_suivante)
+        
+        if debut_max is not None and debut > debut_max:
+            return None
+        return debut
+    
+    def ajouter(self, debut: datetime, fin: datetime, reservation_id: str):
+        """Ajoute un creneau (le chevauchement doit avoir ete verifie)."""
+        insort(self.creneaux, (debut, fin, reservation_id))
+        insort(self.debuts, debut)
+    
+    def retirer(self, reservation_id: str):
+        """Retire le creneau d'une reservation."""
+        for i, creneau in enumerate(self.creneaux):
+            if creneau[2] == reservation_id:
+                del self.creneaux[i]
+                del self.debuts[i]
+                return
@@ -0,0 +1,137 @@
+# Compression des reponses HTTP
+# ==============================
+
+from typing import Iterable, Optional
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel, gzip reste disponible
+    brotli = None
+
+
+def encodages_disponibles() -> list[str]:
+    """Encodages supportes par le serveur, par ordre de preference."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def choisir_encodage(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Choisit le meilleur encodage accepte par le client.
+    Retourne None si aucun encodage commun (reponse non compressee).
+    """
+    if not accept_encoding:
+        return None
+    
+    acceptes = set()
+    for partie in accept_encoding.split(","):
+        morceaux = partie.strip().split(";")
+        nom = morceaux[0].strip().lower()
+        # Ignorer les encodages explicitement refuses (q=0)
+        if any(m.strip().replace(" ", "") in ("q=0", "q=0.0") for m in morceaux[1:]):
+            continue
+        acceptes.add(nom)
+    
+    for encodage in encodages_disponibles():
+        if encodage in acceptes or "*" in acceptes:
+            return encodage
+    
+    return None
+
+
+def compresser(donnees: bytes, encodage: str, niveau_gzip: int = 6) -> bytes:
+    """Compresse des octets avec l'encodage demande ("br" ou "gzip")."""
+    if encodage == "br":
+        return brotli.compress(donnees, quality=5)
+    return gzip.compress(donnees, compresslevel=niveau_gzip)
+
+
+class MiddlewareCompression:
+    """
+    Middleware ASGI de compression (brotli si disponible, sinon gzip).
+    
+    Ne compresse pas:
+    - les corps plus petits que taille_min
+    - les reponses 204/304 et celles deja encodees (snapshots precompresses)
+    - les reponses en flux (SSE, StreamingResponse)
+    - les chemins exclus (ex: capteurs ESP8266, reponses minuscules)
+    """
+    
+    def __init__(
+        self,
+        app,
+        taille_min: int = 1024,
+        niveau_gzip: int = 6,
+        exclusions: Iterable[str] = ()
+    ):
+        self.app = app
+        self.taille_min = taille_min
+        self.niveau_gzip = niveau_gzip
+        self.exclusions = tuple(exclusions)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclusions):
+            await self.app(scope, receive, send)
+            return
+        
+        accept_encoding = None
+        for nom, valeur in scope["headers"]:
+            if nom == b"accept-encoding":
+                accept_encoding = valeur.decode("latin-1")
+                break
+        
+        encodage = choisir_encodage(accept_encoding)
+        if encodage is None:
+            await self.app(scope, receive, send)
+            return
+        
+        debut_reponse = None
+        transmettre = False
+        
+        async def envoyer(message):
+            nonlocal debut_reponse, transmettre
+            
+            if transmettre:
+                await send(message)
+                return
+            
+            if message["type"] == "http.response.start":
+                entetes = {nom.lower() for nom, _ in message.get("headers", [])}
+                if message["status"] in (204, 304) or b"content-encoding" in entetes:
+                    transmettre = True
+                    await send(message)
+                else:
+                    debut_reponse = message
+                return
+            
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            
+            corps = message.get("body", b"")
+            
+            # Reponse en flux ou trop petite: transmise telle quelle
+            if message.get("more_body", False) or len(corps) < self.taille_min:
+                transmettre = True
+                await send(debut_reponse)
+                await send(message)
+                return
+            
+            compresse = compresser(corps, encodage, self.niveau_gzip)
+            vary = b"Accept-Encoding"
+            entetes = []
+            for nom, valeur in debut_reponse.get("headers", []):
+                if nom.lower() == b"vary":
+                    vary = valeur + b", Accept-Encoding"
+                elif nom.lower() != b"content-length":
+                    entetes.append((nom, valeur))
+            entetes += [
+                (b"content-encoding", encodage.encode("latin-1")),
+                (b"content-length", str(len(compresse)).encode("latin-1")),
+                (b"vary", vary)
+            ]
+            
+            await send({**debut_reponse, "headers": entetes})
+            await send({"type": "http.response.body", "body": compresse})
+        
+        await self.app(scope, receive, envoyer)
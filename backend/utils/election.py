@@ -0,0 +1,265 @@
+# Election du worker leader (planificateur et boite d'envoi)
+# ==========================================================
+
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+import asyncio
+import math
+import os
+import socket
+import time
+import uuid
+
+from config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Document du bail dans la collection des baux
+BAIL_PLANIFICATEUR = "planificateur"
+
+Rappel = Callable[[], Awaitable[None]]
+
+
+class Bail:
+    """
+    Interface commune des baux de leader.
+    
+    Un seul detenteur a la fois: acquerir prend ou renouvelle le bail
+    et retourne True si ce worker le detient. duree est le temps pendant
+    lequel un bail obtenu reste valable sans renouvellement.
+    """
+    
+    duree: float = math.inf
+    
+    def acquerir(self) -> bool:
+        """Prend ou renouvelle le bail."""
+        raise NotImplementedError
+    
+    def liberer(self):
+        """Rend le bail (arret du worker)."""
+
+
+class BailLocal(Bail):
+    """Toujours detenu: un seul worker, pas d'election."""
+    
+    def acquerir(self) -> bool:
+        return True
+
+
+class BailFichier(Bail):
+    """
+    Verrou de fichier (flock) pour les workers d'un meme hote.
+    
+    Le systeme rend le verrou a la mort du processus: un autre worker
+    l'obtient a sa tentative suivante.
+    """
+    
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+        self._fichier = None
+    
+    def acquerir(self) -> bool:
+        if self._fichier is not None:
+            return True
+        
+        fichier = open(self.chemin, "a+")
+        try:
+            fcntl.flock(fichier.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fichier.close()
+            return False
+        
+        fichier.seek(0)
+        fichier.truncate()
+        fichier.write(f"{os.getpid()}\n")
+        fichier.flush()
+        self._fichier = fichier
+        return True
+    
+    def liberer(self):
+        if self._fichier is not None:
+            fcntl.flock(self._fichier.fileno(), fcntl.LOCK_UN)
+            self._fichier.close()
+            self._fichier = None
+
+
+class BailFirestore(Bail):
+    """
+    Document Firestore avec une date d'expiration, pour plusieurs hotes.
+    
+    Le detenteur le renouvelle avant expiration; un bail expire est pris
+    par le premier worker qui le lit (transaction). Les horloges des
+    hotes doivent etre synchronisees (NTP) a quelques secondes pres.
+    """
+    
+    def __init__(self, nom: str, detenteur: str, duree: float):
+        self.nom = nom
+        self.detenteur = detenteur
+        self.duree = duree
+    
+    def acquerir(self) -> bool:
+        from database.firebase import baux_ref, executer_transaction
+        
+        def prendre(transaction):
+            ref = baux_ref().document(self.nom)
+            doc = transaction.get(ref)
+            maintenant = datetime.now()
+            
+            if doc.exists:
+                bail = doc.to_dict()
+                expire_a = bail.get("expire_a")
+                if (
+                    bail.get("detenteur") != self.detenteur
+                    and expire_a is not None
+                    and expire_a.replace(tzinfo=None) > maintenant
+                ):
+                    return False
+            
+            transaction.set(ref, {
+                "detenteur": self.detenteur,
+                "expire_a": maintenant + timedelta(seconds=self.duree)
+            })
+            return True
+        
+        return executer_transaction(prendre)
+    
+    def liberer(self):
+        from database.firebase import baux_ref, executer_transaction
+        
+        def rendre(transaction):
+            ref = baux_ref().document(self.nom)
+            doc = transaction.get(ref)
+            if doc.exists and doc.to_dict().get("detenteur") == self.detenteur:
+                transaction.delete(ref)
+        
+        executer_transaction(rendre)
+
+
+def identifiant_worker() -> str:
+    """Identifiant unique du worker (hote, processus, instance)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def creer_bail() -> Bail:
+    """Construit le bail choisi dans la configuration."""
+    settings = get_settings()
+    type_election = settings.ELECTION_LEADER.lower()
+    
+    if type_election == "local":
+        return BailLocal()
+    
+    if type_election == "fichier":
+        if fcntl is None:
+            logger.warning("Verrou de fichier indisponible, pas d'election (un seul worker)")
+            return BailLocal()
+        return BailFichier(settings.ELECTION_FICHIER_VERROU)
+    
+    if type_election == "firestore":
+        return BailFirestore(
+            BAIL_PLANIFICATEUR, identifiant_worker(), settings.ELECTION_DUREE_BAIL
+        )
+    
+    raise ValueError(f"Election de leader inconnue: {settings.ELECTION_LEADER}")
+
+
+class ElectionLeader:
+    """
+    Tente de prendre ou de renouveler le bail a intervalle regulier.
+    
+    Le worker qui le detient lance les taches uniques (au_gain); s'il
+    le perd (ou ne peut plus le renouveler avant son expiration), il les
+    arrete (a_la_perte). Un follower prend la releve au plus un
+    intervalle apres l'expiration du bail d'un leader disparu.
+    """
+    
+    def __init__(self, bail: Bail, intervalle: float = 5.0):
+        """
+        Args:
+            bail: bail dispute par les workers
+            intervalle: secondes entre deux tentatives (bien inferieur a la duree du bail)
+        """
+        self.bail = bail
+        self.intervalle = intervalle
+        self.est_leader = False
+        self._valide_jusqu_a = 0.0
+        self._au_gain: Optional[Rappel] = None
+        self._a_la_perte: Optional[Rappel] = None
+        self._tache: asyncio.Task = None
+    
+    async def demarrer(self, au_gain: Rappel, a_la_perte: Rappel):
+        """Premiere tentative immediate, puis tentatives periodiques."""
+        self._au_gain = au_gain
+        self._a_la_perte = a_la_perte
+        
+        await self._tour()
+        if not self.est_leader:
+            logger.info("Worker follower: planificateur gere par un autre worker")
+        
+        self._tache = asyncio.create_task(self._boucle())
+    
+    async def arreter(self):
+        """Arrete les taches uniques et rend le bail."""
+        if self._tache:
+            self._tache.cancel()
+            try:
+                await self._tache
+            except asyncio.CancelledError:
+                pass
+        
+        if self.est_leader:
+            await self._changer(False)
+            try:
+                self.bail.liberer()
+            except Exception as e:
+                logger.error(f"Erreur liberation du bail: {e}")
+    
+    async def _boucle(self):
+        while True:
+            await asyncio.sleep(self.intervalle)
+            await self._tour()
+    
+    async def _tour(self):
+        """Une tentative de prise ou de renouvellement du bail."""
+        debut = time.monotonic()
+        
+        try:
+            obtenu = self.bail.acquerir()
+        except Exception as e:
+            logger.error(f"Erreur renouvellement du bail: {e}")
+            # Le bail deja obtenu reste valable jusqu'a son expiration
+            obtenu = self.est_leader and time.monotonic() < self._valide_jusqu_a
+        else:
+            if obtenu:
+                self._valide_jusqu_a = debut + self.bail.duree
+        
+        if obtenu != self.est_leader:
+            await self._changer(obtenu)
+    
+    async def _changer(self, leader: bool):
+        self.est_leader = leader
+        
+        try:
+            if leader:
+                logger.info("Worker elu leader: demarrage du planificateur")
+                await self._au_gain()
+            else:
+                logger.warning("Bail de leader perdu: arret du planificateur")
+                await self._a_la_perte()
+        except Exception as e:
+            logger.error(f"Erreur changement de role: {e}")
+
+
+# Instance globale (creee a la premiere utilisation)
+_election: Optional[ElectionLeader] = None
+
+
+def get_election() -> ElectionLeader:
+    """Retourne l'election du worker."""
+    global _election
+    if _election is None:
+        _election = ElectionLeader(creer_bail(), get_settings().ELECTION_INTERVALLE)
+    return _election
@@ -0,0 +1,67 @@
+# Encodage compact des snapshots du parking
+# ==========================================
+
+from typing import Optional
+import hashlib
+
+from models.parking import EtatParking
+
+# Version du protocole WebSocket utilisant le snapshot compact
+PROTOCOLE_COMPACT = 2
+
+# Codes numeriques des statuts de place
+CODES_STATUT = {
+    "available": 0,
+    "reserved": 1,
+    "occupied": 2
+}
+
+
+def signature_dictionnaire(etat: EtatParking) -> str:
+    """
+    Empreinte de la liste ordonnee des places.
+    Change uniquement quand une place est ajoutee, supprimee ou renommee.
+    """
+    contenu = "|".join(f"{p.id}:{p.numero}" for p in etat.places)
+    return hashlib.sha1(contenu.encode("utf-8")).hexdigest()[:12]
+
+
+def encoder_etat_compact(
+    etat: EtatParking,
+    signature_connue: Optional[str] = None,
+    utilisateur_id: Optional[str] = None
+) -> dict:
+    """
+    Encode l'etat du parking en colonnes.
+    
+    Les identifiants et numeros des places (le dictionnaire) ne sont
+    inclus que si le client ne connait pas encore la signature courante.
+    Les colonnes suivent l'ordre du dictionnaire:
+    - s: code du statut (voir CODES_STATUT)
+    - t: temps restant en secondes (null si aucun)
+    - m: indices des places reservees par le client
+    """
+    signature = signature_dictionnaire(etat)
+    
+    compact = {
+        "v": PROTOCOLE_COMPACT,
+        "dict": signature,
+        "n": [
+            etat.total_places,
+            etat.places_disponibles,
+            etat.places_reservees,
+            etat.places_occupees
+        ],
+        "s": [CODES_STATUT.get(p.statut, -1) for p in etat.places],
+        "t": [p.temps_restant for p in etat.places],
+        "m": [
+            i for i, p in enumerate(etat.places)
+            if utilisateur_id and p.reserve_par == utilisateur_id
+        ]
+    }
+    
+    if signature != signature_connue:
+        compact["ids"] = [p.id for p in etat.places]
+        compact["num"] = [p.numero for p in etat.places]
+    
+    return compact
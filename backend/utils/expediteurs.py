@@ -0,0 +1,165 @@
+# Expediteurs des notifications (WebSocket, SMS, mock)
+# ====================================================
+
+from typing import Optional
+from loguru import logger
+import aiohttp
+
+from config import get_settings
+from models.notification import CanalNotification, Notification
+
+
+class Expediteur:
+    """
+    Interface commune des canaux d'envoi.
+    
+    Un expediteur recoit un lot de notifications de son canal et
+    retourne celles qui ont echoue (elles seront reessayees). Un nouveau
+    fournisseur n'a qu'a implementer envoyer.
+    """
+    
+    canal: CanalNotification
+    
+    async def envoyer(self, notifications: list[Notification]) -> dict[str, str]:
+        """
+        Envoie un lot de notifications.
+        
+        Returns:
+            {id: erreur} pour les notifications non envoyees
+        """
+        raise NotImplementedError
+    
+    async def fermer(self):
+        """Libere les ressources de l'expediteur."""
+
+
+class ExpediteurWebSocket(Expediteur):
+    """Message "notification" aux sessions WebSocket de l'utilisateur."""
+    
+    canal = CanalNotification.WEBSOCKET
+    
+    async def envoyer(self, notifications: list[Notification]) -> dict[str, str]:
+        from routers.websocket import diffuser_notification
+        
+        erreurs = {}
+        for notification in notifications:
+            try:
+                await diffuser_notification(notification)
+            except Exception as e:
+                erreurs[notification.id] = str(e)
+        return erreurs
+
+
+class ExpediteurSMS(Expediteur):
+    """
+    Adaptateur HTTP d'un fournisseur SMS: un seul appel par lot.
+    
+    Le lot est poste en JSON sur SMS_API_URL:
+    {"expediteur": ..., "messages": [{"id", "destinataire", "texte"}]}.
+    Le fournisseur peut renvoyer {"echecs": {id: erreur}}; toute autre
+    reponse 2xx vaut envoi du lot entier.
+    """
+    
+    canal = CanalNotification.SMS
+    
+    def __init__(self, url: str, cle: str, expediteur: str, delai: float = 10.0):
+        self.url = url
+        self.cle = cle
+        self.expediteur = expediteur
+        self.delai = delai
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    async def envoyer(self, notifications: list[Notification]) -> dict[str, str]:
+        from database.firebase import lire_documents, utilisateurs_ref
+        
+        # Numeros lus en un seul aller-retour pour tout le lot
+        utilisateurs = lire_documents(
+            utilisateurs_ref(), (notification.utilisateur_id for notification in notifications)
+        )
+        
+        messages = []
+        for notification in notifications:
+            doc = utilisateurs.get(notification.utilisateur_id)
+            telephone = doc.to_dict().get("telephone") if doc is not None and doc.exists else None
+            if not telephone:
+                # Pas de numero: rien a reessayer
+                logger.debug(f"Notification {notification.id}: pas de telephone")
+                continue
+            messages.append({
+                "id": notification.id,
+                "destinataire": telephone,
+                "texte": notification.message
+            })
+        
+        if not messages:
+            return {}
+        
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.delai),
+                headers={"Authorization": f"Bearer {self.cle}"}
+            )
+        
+        try:
+            async with self._session.post(
+                self.url, json={"expediteur": self.expediteur, "messages": messages}
+            ) as reponse:
+                if reponse.status >= 400:
+                    erreur = f"HTTP {reponse.status}"
+                    return {message["id"]: erreur for message in messages}
+                
+                try:
+                    corps = await reponse.json(content_type=None)
+                except ValueError:
+                    corps = None
+                
+                if isinstance(corps, dict) and isinstance(corps.get("echecs"), dict):
+                    return {str(i): str(erreur) for i, erreur in corps["echecs"].items()}
+                return {}
+            
+        except Exception as e:
+            logger.warning(f"Fournisseur SMS injoignable: {e}")
+            return {message["id"]: str(e) for message in messages}
+    
+    async def fermer(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class ExpediteurMock(Expediteur):
+    """Ecrit les notifications dans le journal (developpement, tests manuels)."""
+    
+    canal = CanalNotification.MOCK
+    
+    def __init__(self):
+        self.envoyees: list[Notification] = []
+    
+    async def envoyer(self, notifications: list[Notification]) -> dict[str, str]:
+        for notification in notifications:
+            logger.info(f"[notification] {notification.utilisateur_id}: {notification.message}")
+        self.envoyees.extend(notifications)
+        return {}
+
+
+def creer_expediteurs() -> dict[CanalNotification, Expediteur]:
+    """Construit les expediteurs des canaux choisis dans la configuration."""
+    settings = get_settings()
+    expediteurs: dict[CanalNotification, Expediteur] = {}
+    
+    for nom in settings.NOTIFICATIONS_CANAUX:
+        canal = CanalNotification(nom.lower())
+        
+        if canal == CanalNotification.WEBSOCKET:
+            expediteurs[canal] = ExpediteurWebSocket()
+        elif canal == CanalNotification.SMS:
+            if not settings.SMS_API_URL:
+                logger.warning("Canal SMS ignore: SMS_API_URL non configuree")
+                continue
+            expediteurs[canal] = ExpediteurSMS(
+                settings.SMS_API_URL, settings.SMS_API_CLE, settings.SMS_EXPEDITEUR
+            )
+        else:
+            expediteurs[canal] = ExpediteurMock()
+    
+    return expediteurs
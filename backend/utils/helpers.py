@@ -35,6 +35,23 @@ def calculer_fin_reservation(debut: datetime, duree_heures: int) -> datetime:
     return debut + timedelta(hours=duree_heures)
 
 
+def sans_fuseau(dt: Optional[datetime]) -> Optional[datetime]:
+    """
+    Retire le fuseau d'une date lue dans Firestore (UTC) pour la
+    comparer aux dates locales naives de l'application.
+    """
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.replace(tzinfo=None)
+
+
+def heure_locale(dt: datetime) -> datetime:
+    """Convertit une date envoyee par un client (avec ou sans fuseau) en heure locale naive."""
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone().replace(tzinfo=None)
+
+
 def calculer_temps_restant(fin: datetime) -> dict:
     """
     Calcule le temps restant jusqu'a une date.
@@ -118,6 +135,26 @@ def valider_id_place(place_id: str) -> bool:
     return bool(re.match(pattern, place_id))
 
 
+def zone_place(numero: str) -> Optional[str]:
+    """
+    Zone d'une place d'apres son numero (lettre initiale: A1 -> "A").
+    Retourne None si le numero ne suit pas la convention.
+    """
+    if not numero or not valider_id_place(numero):
+        return None
+    return numero[0].upper()
+
+
+def rang_place(numero: str) -> Optional[int]:
+    """
+    Rang d'une place dans sa zone d'apres son numero (A12 -> 12).
+    Deux places de la meme zone aux rangs consecutifs sont voisines.
+    """
+    if not numero or not valider_id_place(numero):
+        return None
+    return int(numero[1:])
+
+
 def generer_id_place(prefixe: str, numero: int) -> str:
     """Genere un identifiant de place."""
     return f"{prefixe.upper()}{numero}"
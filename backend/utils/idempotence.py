@@ -0,0 +1,267 @@
+# Cles d'idempotence (header Idempotency-Key)
+# ===========================================
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel
+from loguru import logger
+import asyncio
+import hashlib
+import json
+import time
+
+from google.api_core.exceptions import AlreadyExists
+
+from config import get_settings
+
+# Longueur maximale acceptee pour une cle envoyee par un client
+LONGUEUR_MAX_CLE = 255
+
+ETAT_EN_COURS = "en_cours"
+ETAT_TERMINEE = "terminee"
+
+# (statut HTTP, corps JSON)
+Resultat = Tuple[int, bytes]
+
+
+class CacheIdempotence:
+    """
+    Memorise la reponse des requetes portant un header Idempotency-Key.
+    
+    Une nouvelle tentative avec la meme cle (et le meme corps) recoit la
+    reponse d'origine sans recalcul ni ecriture. Les tentatives simultanees
+    d'une meme cle attendent la premiere (verrou par cle).
+    
+    Les reponses 2xx et 4xx sont memorisees; une erreur serveur (5xx)
+    ne l'est pas et la requete peut etre rejouee. Avec persister=True (reservations), la
+    reponse est aussi gardee dans Firestore pour survivre a un
+    redemarrage et etre partagee entre workers.
+    """
+    
+    def __init__(self, taille_max: int = 10_000, duree_vie: float = 86_400, duree_bail: float = 60):
+        """
+        Args:
+            taille_max: nombre maximum de reponses gardees en memoire
+            duree_vie: secondes pendant lesquelles une cle reste valable
+            duree_bail: secondes pendant lesquelles une cle en cours bloque
+                les autres tentatives (worker arrete en pleine requete)
+        """
+        self.taille_max = taille_max
+        self.duree_vie = duree_vie
+        self.duree_bail = duree_bail
+        # cle -> (expiration monotonic, empreinte du corps, resultat)
+        self._reponses: "OrderedDict[str, Tuple[float, str, Resultat]]" = OrderedDict()
+        # cle -> [verrou, nombre de requetes qui l'utilisent]
+        self._verrous: Dict[str, list] = {}
+    
+    def _lire(self, cle: str, empreinte: str) -> Optional[Resultat]:
+        entree = self._reponses.get(cle)
+        if entree is None:
+            return None
+        
+        expire_a, empreinte_origine, resultat = entree
+        if time.monotonic() >= expire_a:
+            del self._reponses[cle]
+            return None
+        
+        _verifier_empreinte(empreinte, empreinte_origine)
+        return resultat
+    
+    def _memoriser(self, cle: str, empreinte: str, resultat: Resultat):
+        self._reponses[cle] = (time.monotonic() + self.duree_vie, empreinte, resultat)
+        self._reponses.move_to_end(cle)
+        while len(self._reponses) > self.taille_max:
+            self._reponses.popitem(last=False)
+    
+    async def executer(
+        self,
+        portee: str,
+        cle: str,
+        corps_requete: str,
+        calcul: Callable[[], Awaitable],
+        persister: bool = False
+    ) -> Response:
+        """
+        Execute calcul une seule fois par (portee, cle).
+        
+        Args:
+            portee: espace de la cle (ex: "reservation:<uid>"), evite
+                qu'un client rejoue la reponse d'un autre
+            cle: valeur du header Idempotency-Key
+            corps_requete: corps serialise, une cle reutilisee avec un
+                autre corps est refusee (422)
+            calcul: coroutine produisant la reponse (modele Pydantic ou
+                Response), peut lever HTTPException
+            persister: garder aussi la reponse dans Firestore
+        """
+        if not cle or len(cle) > LONGUEUR_MAX_CLE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Idempotency-Key invalide (1 a {LONGUEUR_MAX_CLE} caracteres)"
+            )
+        
+        cle_complete = f"{portee}:{cle}"
+        empreinte = hashlib.sha256(corps_requete.encode("utf-8")).hexdigest()
+        
+        resultat = self._lire(cle_complete, empreinte)
+        if resultat is not None:
+            return _rejouer(resultat)
+        
+        entree = self._verrous.setdefault(cle_complete, [asyncio.Lock(), 0])
+        entree[1] += 1
+        try:
+            async with entree[0]:
+                # La tentative precedente a pu se terminer pendant l'attente
+                resultat = self._lire(cle_complete, empreinte)
+                if resultat is not None:
+                    return _rejouer(resultat)
+                
+                document = None
+                if persister:
+                    document = _document(cle_complete)
+                    resultat = _reserver_document(document, empreinte, self.duree_bail)
+                    if resultat is not None:
+                        self._memoriser(cle_complete, empreinte, resultat)
+                        return _rejouer(resultat)
+                
+                try:
+                    resultat, reponse = await _calculer(calcul)
+                except Exception:
+                    # Echec serveur: la cle est liberee pour une nouvelle tentative
+                    if document is not None:
+                        _liberer_document(document)
+                    raise
+                
+                self._memoriser(cle_complete, empreinte, resultat)
+                if document is not None:
+                    _terminer_document(document, resultat, self.duree_vie)
+                
+                return reponse
+        finally:
+            entree[1] -= 1
+            if entree[1] == 0:
+                del self._verrous[cle_complete]
+
+
+def _verifier_empreinte(empreinte: str, empreinte_origine: str):
+    if empreinte != empreinte_origine:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key deja utilisee avec une autre requete"
+        )
+
+
+def _rejouer(resultat: Resultat) -> Response:
+    """Reponse identique a l'originale, marquee comme rejouee."""
+    statut, corps = resultat
+    return Response(
+        content=corps,
+        status_code=statut,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+async def _calculer(calcul: Callable[[], Awaitable]) -> Tuple[Resultat, Response]:
+    """Execute le calcul et capture sa reponse (HTTPException comprise)."""
+    try:
+        valeur = await calcul()
+    except HTTPException as e:
+        if e.status_code >= 500:
+            raise
+        corps = json.dumps({"detail": e.detail}, ensure_ascii=False).encode("utf-8")
+        return (e.status_code, corps), Response(
+            content=corps,
+            status_code=e.status_code,
+            media_type="application/json",
+            headers=e.headers
+        )
+    
+    if isinstance(valeur, BaseModel):
+        corps = valeur.model_dump_json().encode("utf-8")
+        return (200, corps), Response(content=corps, media_type="application/json")
+    
+    return (valeur.status_code, bytes(valeur.body)), valeur
+
+
+def _document(cle_complete: str):
+    """Document Firestore d'une cle (id derive de la cle, taille bornee)."""
+    from database.firebase import idempotence_ref
+    
+    return idempotence_ref().document(hashlib.sha256(cle_complete.encode("utf-8")).hexdigest())
+
+
+def _reserver_document(document, empreinte: str, duree_bail: float) -> Optional[Resultat]:
+    """
+    Marque la cle comme en cours dans Firestore, pour duree_bail secondes:
+    si le worker s'arrete avant la reponse, la cle redevient utilisable.
+    Retourne le resultat deja enregistre si la cle a ete traitee (autre
+    worker, avant un redemarrage); leve 409 si elle est encore en cours.
+    """
+    maintenant = datetime.now()
+    snapshot = document.get()
+    
+    if snapshot.exists:
+        data = snapshot.to_dict()
+        expire_a = data.get("expire_a")
+        if expire_a is not None and expire_a.replace(tzinfo=None) > maintenant:
+            _verifier_empreinte(empreinte, data.get("empreinte"))
+            if data.get("etat") == ETAT_TERMINEE:
+                return data["statut"], data["corps"].encode("utf-8")
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Requete deja en cours de traitement",
+                headers={"Retry-After": "1"}
+            )
+        document.delete()
+    
+    try:
+        document.create({
+            "etat": ETAT_EN_COURS,
+            "empreinte": empreinte,
+            "expire_a": maintenant + timedelta(seconds=duree_bail)
+        })
+    except AlreadyExists:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Requete deja en cours de traitement",
+            headers={"Retry-After": "1"}
+        )
+    
+    return None
+
+
+def _terminer_document(document, resultat: Resultat, duree_vie: float):
+    """Enregistre la reponse, gardee duree_vie secondes."""
+    try:
+        document.update({
+            "etat": ETAT_TERMINEE,
+            "statut": resultat[0],
+            "corps": resultat[1].decode("utf-8"),
+            "expire_a": datetime.now() + timedelta(seconds=duree_vie)
+        })
+    except Exception as e:
+        logger.error(f"Erreur enregistrement cle d'idempotence: {e}")
+
+
+def _liberer_document(document):
+    try:
+        document.delete()
+    except Exception as e:
+        logger.error(f"Erreur liberation cle d'idempotence: {e}")
+
+
+# Instance globale
+_settings = get_settings()
+cache_idempotence = CacheIdempotence(
+    taille_max=_settings.IDEMPOTENCE_TAILLE_MAX,
+    duree_vie=_settings.IDEMPOTENCE_DUREE_VIE_HEURES * 3600,
+    duree_bail=_settings.IDEMPOTENCE_BAIL_SECONDES
+)
+
+
+def get_idempotence() -> CacheIdempotence:
+    """Retourne le cache des cles d'idempotence du worker."""
+    return cache_idempotence
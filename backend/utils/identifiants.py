@@ -0,0 +1,92 @@
+# Identifiants ordonnes dans le temps (format ULID)
+# =================================================
+
+from datetime import datetime
+from typing import Optional
+import os
+import threading
+import time
+
+# Alphabet base32 de Crockford (sans i, l, o, u), en minuscules comme
+# les anciens identifiants hexadecimaux
+ALPHABET = "0123456789abcdefghjkmnpqrstvwxyz"
+
+LONGUEUR_IDENTIFIANT = 26
+LONGUEUR_HORODATAGE = 10  # 48 bits: millisecondes depuis l'epoch
+LONGUEUR_ANCIEN_IDENTIFIANT = 8  # str(uuid.uuid4())[:8]
+
+_BITS_ALEATOIRES = 80
+_MAX_ALEATOIRE = (1 << _BITS_ALEATOIRES) - 1
+
+_verrou = threading.Lock()
+_dernier_ms = 0
+_dernier_aleatoire = 0
+
+
+def _encoder(valeur: int, longueur: int) -> str:
+    caracteres = []
+    for _ in range(longueur):
+        valeur, reste = divmod(valeur, 32)
+        caracteres.append(ALPHABET[reste])
+    return "".join(reversed(caracteres))
+
+
+def nouvel_identifiant() -> str:
+    """
+    Genere un identifiant de 26 caracteres: 10 pour l'instant de creation
+    (millisecondes), 16 pour 80 bits aleatoires.
+    
+    L'ordre alphabetique des identifiants suit l'ordre de creation; dans
+    la meme milliseconde, la partie aleatoire est incrementee pour garder
+    cet ordre dans le worker.
+    """
+    global _dernier_ms, _dernier_aleatoire
+    
+    with _verrou:
+        ms = time.time_ns() // 1_000_000
+        if ms <= _dernier_ms and _dernier_aleatoire < _MAX_ALEATOIRE:
+            # Meme milliseconde (ou horloge reculee): suite de la precedente
+            ms = _dernier_ms
+            aleatoire = _dernier_aleatoire + 1
+        else:
+            ms = max(ms, _dernier_ms + 1)
+            aleatoire = int.from_bytes(os.urandom(10), "big")
+        _dernier_ms, _dernier_aleatoire = ms, aleatoire
+    
+    return _encoder(ms, LONGUEUR_HORODATAGE) + _encoder(aleatoire, LONGUEUR_IDENTIFIANT - LONGUEUR_HORODATAGE)
+
+
+def est_identifiant_ordonne(identifiant: str) -> bool:
+    """Vrai pour un identifiant genere par nouvel_identifiant."""
+    return (
+        len(identifiant) == LONGUEUR_IDENTIFIANT
+        and all(c in ALPHABET for c in identifiant.lower())
+    )
+
+
+def horodatage_identifiant(identifiant: str) -> Optional[datetime]:
+    """
+    Instant de creation (heure locale) lu dans l'identifiant.
+    None pour un ancien identifiant de 8 caracteres: utiliser date_creation.
+    """
+    if not est_identifiant_ordonne(identifiant):
+        return None
+    
+    ms = 0
+    for c in identifiant[:LONGUEUR_HORODATAGE].lower():
+        ms = ms * 32 + ALPHABET.index(c)
+    return datetime.fromtimestamp(ms / 1000)
+
+
+def borne_identifiant(instant: datetime, fin: bool = False) -> str:
+    """
+    Plus petit (ou plus grand si fin) identifiant possible pour un instant
+    (heure locale). Permet de filtrer une periode par identifiant:
+    where(FieldPath.document_id(), ">=", borne_identifiant(debut)).
+    
+    Les anciens identifiants de 8 caracteres ne portent pas d'instant
+    et ne sont pas couverts: filtrer ces documents sur date_creation.
+    """
+    ms = int(instant.timestamp() * 1000)
+    suffixe = ALPHABET[-1 if fin else 0] * (LONGUEUR_IDENTIFIANT - LONGUEUR_HORODATAGE)
+    return _encoder(ms, LONGUEUR_HORODATAGE) + suffixe
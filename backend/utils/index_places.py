@@ -0,0 +1,96 @@
+# Index secondaires des places de parking
+# =======================================
+
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from models.parking import PlaceParking, StatutPlace
+from utils.calendrier import CalendrierPlace
+from utils.helpers import zone_place
+
+
+class IndexPlaces:
+    """
+    Index en memoire d'un snapshot de places: par statut, par zone
+    (lettre du numero), par couple (zone, statut), par capteur, et
+    calendrier des creneaux reserves de chaque place.
+    
+    Construit une fois par version du cache (O(n)), il repond ensuite
+    aux filtres sans parcourir la collection: "une place libre en
+    zone B" est une lecture d'ensemble en O(1).
+    """
+    
+    def __init__(self, places: Iterable[PlaceParking]):
+        self.places: Dict[str, PlaceParking] = {}
+        self.par_statut: Dict[StatutPlace, Set[str]] = {statut: set() for statut in StatutPlace}
+        self.par_zone: Dict[str, Set[str]] = {}
+        self.par_zone_statut: Dict[Tuple[str, StatutPlace], Set[str]] = {}
+        self.par_capteur: Dict[str, str] = {}
+        # Construits a la premiere consultation de chaque place
+        self._calendriers: Dict[str, CalendrierPlace] = {}
+        
+        for place in places:
+            self.places[place.id] = place
+            self.par_statut[place.statut].add(place.id)
+            
+            zone = zone_place(place.numero)
+            if zone is not None:
+                self.par_zone.setdefault(zone, set()).add(place.id)
+                self.par_zone_statut.setdefault((zone, place.statut), set()).add(place.id)
+            
+            if place.capteur_id:
+                self.par_capteur[place.capteur_id] = place.id
+    
+    def zones(self) -> list[str]:
+        """Zones connues, triees."""
+        return sorted(self.par_zone)
+    
+    def filtrer(
+        self,
+        statut: Optional[StatutPlace] = None,
+        zone: Optional[str] = None
+    ) -> Set[str]:
+        """Ids des places correspondant aux filtres (tous optionnels)."""
+        if zone is not None:
+            zone = zone.upper()
+            if statut is not None:
+                return self.par_zone_statut.get((zone, statut), set())
+            return self.par_zone.get(zone, set())
+        
+        if statut is not None:
+            return self.par_statut[statut]
+        
+        return set(self.places)
+    
+    def une_disponible(self, zone: Optional[str] = None) -> Optional[PlaceParking]:
+        """Une place disponible (dans la zone si precisee), sans ordre garanti."""
+        ids = self.filtrer(StatutPlace.DISPONIBLE, zone)
+        return self.places[next(iter(ids))] if ids else None
+    
+    def place_du_capteur(self, capteur_id: str) -> Optional[PlaceParking]:
+        """Place surveillee par un capteur."""
+        place_id = self.par_capteur.get(capteur_id)
+        return self.places.get(place_id) if place_id else None
+    
+    def retirer_disponible(self, place_id: str):
+        """
+        Retire une place des listes libres (reservee par ce worker ou
+        trouvee prise), en attendant la prochaine version du snapshot.
+        """
+        place = self.places.get(place_id)
+        if place is None:
+            return
+        self.par_statut[StatutPlace.DISPONIBLE].discard(place_id)
+        zone = zone_place(place.numero)
+        if zone is not None:
+            self.par_zone_statut.get((zone, StatutPlace.DISPONIBLE), set()).discard(place_id)
+    
+    def calendrier(self, place_id: str) -> Optional[CalendrierPlace]:
+        """Creneaux reserves d'une place (en cours et a venir)."""
+        calendrier = self._calendriers.get(place_id)
+        if calendrier is None:
+            place = self.places.get(place_id)
+            if place is None:
+                return None
+            calendrier = CalendrierPlace.depuis_place(place)
+            self._calendriers[place_id] = calendrier
+        return calendrier
@@ -0,0 +1,370 @@
+# Metriques au format texte Prometheus
+# ====================================
+
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+import time
+
+# Seuils par defaut des histogrammes de duree (secondes)
+SEUILS_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _echapper(valeur: str) -> str:
+    """Echappe une valeur d'etiquette pour le format texte."""
+    return valeur.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquettes(noms: Tuple[str, ...], valeurs: Tuple[str, ...], extra: str = "") -> str:
+    """Construit le bloc {nom="valeur",...} d'une serie."""
+    paires = [f'{nom}="{_echapper(str(valeur))}"' for nom, valeur in zip(noms, valeurs)]
+    if extra:
+        paires.append(extra)
+    return "{" + ",".join(paires) + "}" if paires else ""
+
+
+def _nombre(valeur: float) -> str:
+    """Formate une valeur numerique (entiers sans decimale)."""
+    if valeur == int(valeur):
+        return str(int(valeur))
+    return repr(valeur)
+
+
+class Metrique:
+    """
+    Base des metriques: une serie par combinaison de valeurs d'etiquettes.
+    Les mises a jour sont de simples operations de dictionnaire, sans
+    verrou: tout se passe dans la boucle asyncio du worker.
+    """
+    
+    type_prometheus = "untyped"
+    
+    def __init__(self, nom: str, aide: str, etiquettes: Iterable[str] = ()):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+    
+    def exposer(self) -> List[str]:
+        """Lignes de la metrique au format texte."""
+        return [
+            f"# HELP {self.nom} {self.aide}",
+            f"# TYPE {self.nom} {self.type_prometheus}",
+            *self._series()
+        ]
+    
+    def _series(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Compteur(Metrique):
+    """
+    Valeur qui ne fait qu'augmenter (requetes, lectures...).
+    Peut aussi etre lue a l'exposition via une fonction, pour un total
+    deja tenu ailleurs.
+    """
+    
+    type_prometheus = "counter"
+    
+    def __init__(
+        self,
+        nom: str,
+        aide: str,
+        etiquettes: Iterable[str] = (),
+        fonction: Optional[Callable[[], Dict[tuple, float]]] = None
+    ):
+        """
+        Args:
+            fonction: retourne {valeurs d'etiquettes: valeur} a l'exposition
+        """
+        super().__init__(nom, aide, etiquettes)
+        self._valeurs: Dict[tuple, float] = {}
+        self.fonction = fonction
+    
+    def inc(self, *valeurs: str, n: float = 1):
+        """Incremente la serie designee par les valeurs d'etiquettes."""
+        self._valeurs[valeurs] = self._valeurs.get(valeurs, 0) + n
+    
+    def valeur(self, *valeurs: str) -> float:
+        return self._valeurs.get(valeurs, 0)
+    
+    def _series(self) -> List[str]:
+        valeurs = dict(self._valeurs)
+        if self.fonction is not None:
+            valeurs.update(self.fonction())
+        return [
+            f"{self.nom}{_etiquettes(self.etiquettes, cle)} {_nombre(valeur)}"
+            for cle, valeur in valeurs.items()
+        ]
+
+
+class Jauge(Metrique):
+    """
+    Valeur instantanee. Peut etre fixee explicitement ou lue au moment
+    de l'exposition via une fonction (ex: nombre de connexions).
+    """
+    
+    type_prometheus = "gauge"
+    
+    def __init__(
+        self,
+        nom: str,
+        aide: str,
+        etiquettes: Iterable[str] = (),
+        fonction: Optional[Callable[[], Dict[tuple, float]]] = None
+    ):
+        """
+        Args:
+            fonction: retourne {valeurs d'etiquettes: valeur} a l'exposition
+        """
+        super().__init__(nom, aide, etiquettes)
+        self._valeurs: Dict[tuple, float] = {}
+        self.fonction = fonction
+    
+    def fixer(self, valeur: float, *valeurs: str):
+        self._valeurs[valeurs] = valeur
+    
+    def _series(self) -> List[str]:
+        valeurs = dict(self._valeurs)
+        if self.fonction is not None:
+            valeurs.update(self.fonction())
+        return [
+            f"{self.nom}{_etiquettes(self.etiquettes, cle)} {_nombre(valeur)}"
+            for cle, valeur in valeurs.items()
+        ]
+
+
+class Histogramme(Metrique):
+    """Distribution de valeurs par seuils cumulatifs (durees, retards)."""
+    
+    type_prometheus = "histogram"
+    
+    def __init__(
+        self,
+        nom: str,
+        aide: str,
+        etiquettes: Iterable[str] = (),
+        seuils: Iterable[float] = SEUILS_DUREE
+    ):
+        super().__init__(nom, aide, etiquettes)
+        self.seuils = tuple(sorted(seuils))
+        # valeurs d'etiquettes -> [comptes par seuil (+Inf en dernier), somme, total]
+        self._series_brutes: Dict[tuple, list] = {}
+    
+    def observer(self, valeur: float, *valeurs: str):
+        """Enregistre une observation dans la serie designee."""
+        serie = self._series_brutes.get(valeurs)
+        if serie is None:
+            serie = [[0] * (len(self.seuils) + 1), 0.0, 0]
+            self._series_brutes[valeurs] = serie
+        
+        # Seul le premier seuil atteint est incremente, le cumul est fait a l'exposition
+        serie[0][bisect_left(self.seuils, valeur)] += 1
+        serie[1] += valeur
+        serie[2] += 1
+    
+    def _series(self) -> List[str]:
+        lignes = []
+        for cle, (comptes, somme, total) in self._series_brutes.items():
+            cumul = 0
+            for seuil, compte in zip(self.seuils, comptes):
+                cumul += compte
+                le = _etiquettes(self.etiquettes, cle, f'le="{_nombre(seuil)}"')
+                lignes.append(f"{self.nom}_bucket{le} {cumul}")
+            le = _etiquettes(self.etiquettes, cle, 'le="+Inf"')
+            lignes.append(f"{self.nom}_bucket{le} {total}")
+            lignes.append(f"{self.nom}_sum{_etiquettes(self.etiquettes, cle)} {repr(somme)}")
+            lignes.append(f"{self.nom}_count{_etiquettes(self.etiquettes, cle)} {total}")
+        return lignes
+
+
+class Registre:
+    """Ensemble des metriques exposees par /metrics."""
+    
+    def __init__(self):
+        self._metriques: Dict[str, Metrique] = {}
+    
+    def enregistrer(self, metrique: Metrique) -> Metrique:
+        self._metriques[metrique.nom] = metrique
+        return metrique
+    
+    def exposer(self) -> str:
+        """Toutes les metriques au format texte Prometheus (version 0.0.4)."""
+        lignes = []
+        for metrique in self._metriques.values():
+            lignes.extend(metrique.exposer())
+        return "\n".join(lignes) + "\n"
+
+
+# Registre global et metriques de l'application
+registre = Registre()
+
+REQUETES_HTTP = registre.enregistrer(Compteur(
+    "aeropark_http_requetes_total",
+    "Requetes HTTP traitees",
+    ("methode", "route", "statut")
+))
+DUREE_HTTP = registre.enregistrer(Histogramme(
+    "aeropark_http_duree_secondes",
+    "Duree de traitement des requetes HTTP",
+    ("methode", "route", "statut")
+))
+RETARD_DIFFUSION = registre.enregistrer(Histogramme(
+    "aeropark_diffusion_retard_secondes",
+    "Delai entre la publication d'un evenement et son envoi aux WebSockets",
+    ("canal",),
+    seuils=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+))
+DUREE_PLANIFICATEUR = registre.enregistrer(Histogramme(
+    "aeropark_planificateur_duree_secondes",
+    "Duree d'une passe du planificateur (balayage et echeances)"
+))
+EXPIRATIONS = registre.enregistrer(Compteur(
+    "aeropark_expirations_total",
+    "Reservations expirees par le planificateur"
+))
+NON_PRESENTATIONS = registre.enregistrer(Compteur(
+    "aeropark_non_presentations_total",
+    "Reservations dont le vehicule n'est pas arrive dans le delai"
+))
+NOTIFICATIONS = registre.enregistrer(Compteur(
+    "aeropark_notifications_total",
+    "Tentatives d'envoi de la boite d'envoi par canal et resultat",
+    ("canal", "statut")
+))
+MESSAGES_CAPTEURS = registre.enregistrer(Compteur(
+    "aeropark_capteur_messages_total",
+    "Signaux recus des capteurs ESP8266",
+    ("etat",)
+))
+LECTURES_FIRESTORE = registre.enregistrer(Compteur(
+    "aeropark_firestore_lectures_total",
+    "Documents lus dans Firestore",
+    ("collection",)
+))
+ECRITURES_FIRESTORE = registre.enregistrer(Compteur(
+    "aeropark_firestore_ecritures_total",
+    "Ecritures de documents dans Firestore",
+    ("collection",)
+))
+
+
+def get_registre() -> Registre:
+    """Retourne le registre global des metriques."""
+    return registre
+
+
+class ComptesRequete:
+    """Appels Firestore faits pendant une requete HTTP."""
+    
+    __slots__ = ("lectures", "ecritures", "duree", "par_collection")
+    
+    def __init__(self):
+        self.lectures = 0
+        self.ecritures = 0
+        self.duree = 0.0
+        # collection -> [lectures, ecritures]
+        self.par_collection: Dict[str, List[int]] = {}
+    
+    def ajouter(self, collection: str, lectures: int, ecritures: int, duree: float):
+        self.lectures += lectures
+        self.ecritures += ecritures
+        self.duree += duree
+        totaux = self.par_collection.setdefault(collection, [0, 0])
+        totaux[0] += lectures
+        totaux[1] += ecritures
+
+
+# Comptes de la requete en cours (None hors requete HTTP: planificateur, bus...)
+_comptes_requete: ContextVar[Optional[ComptesRequete]] = ContextVar(
+    "comptes_requete", default=None
+)
+
+
+def comptes_requete() -> Optional[ComptesRequete]:
+    """Retourne les comptes Firestore de la requete en cours."""
+    return _comptes_requete.get()
+
+
+class MiddlewareMetriques:
+    """
+    Middleware ASGI mesurant nombre et duree des requetes HTTP.
+    
+    L'etiquette route est le modele de chemin (/api/v1/parking/release/{place_id})
+    et non le chemin reel, pour garder un nombre de series borne.
+    Les chemins sans route (404) sont regroupes sous "non_route".
+    
+    Compte aussi les appels Firestore de chaque requete: ils sont renvoyes
+    dans le header Server-Timing (visible dans les outils du navigateur)
+    et journalises en fin de requete.
+    """
+    
+    def __init__(
+        self,
+        app,
+        exclusions: Iterable[str] = ("/metrics",),
+        server_timing: bool = True
+    ):
+        self.app = app
+        self.exclusions = tuple(exclusions)
+        self.server_timing = server_timing
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclusions:
+            await self.app(scope, receive, send)
+            return
+        
+        debut = time.perf_counter()
+        statut = 500
+        comptes = ComptesRequete()
+        jeton = _comptes_requete.set(comptes)
+        
+        async def envoyer(message):
+            nonlocal statut
+            if message["type"] == "http.response.start":
+                statut = message["status"]
+                if self.server_timing:
+                    message = {
+                        **message,
+                        "headers": [
+                            *message.get("headers", []),
+                            (b"server-timing", _server_timing(comptes, debut))
+                        ]
+                    }
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, envoyer)
+        finally:
+            _comptes_requete.reset(jeton)
+            duree = time.perf_counter() - debut
+            route = scope.get("route")
+            chemin = getattr(route, "path", None) or "non_route"
+            etiquettes = (scope["method"], chemin, str(statut))
+            REQUETES_HTTP.inc(*etiquettes)
+            DUREE_HTTP.observer(duree, *etiquettes)
+            
+            logger.bind(
+                methode=scope["method"],
+                route=chemin,
+                statut=statut,
+                duree_ms=round(duree * 1000, 1),
+                lectures=comptes.lectures,
+                ecritures=comptes.ecritures,
+                firestore_ms=round(comptes.duree * 1000, 1),
+                collections=comptes.par_collection
+            ).debug(
+                f"{scope['method']} {chemin} {statut} {duree * 1000:.1f}ms "
+                f"firestore lectures={comptes.lectures} ecritures={comptes.ecritures} "
+                f"duree={comptes.duree * 1000:.1f}ms"
+            )
+
+
+def _server_timing(comptes: ComptesRequete, debut: float) -> bytes:
+    """Valeur du header Server-Timing (Firestore et temps avant la reponse)."""
+    valeur = (
+        f'firestore;dur={comptes.duree * 1000:.1f};'
+        f'desc="lectures={comptes.lectures} ecritures={comptes.ecritures}", '
+        f'app;dur={(time.perf_counter() - debut) * 1000:.1f}'
+    )
+    return valeur.encode("latin-1")
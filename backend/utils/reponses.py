@@ -0,0 +1,43 @@
+# Reponses JSON rapides
+# =====================
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson est optionnel
+    orjson = None
+
+
+class ReponseJSONRapide(JSONResponse):
+    """
+    Reponse JSON par defaut de l'application.
+    Utilise orjson quand il est installe, sinon le module json standard.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        
+        return orjson.dumps(
+            content,
+            default=str,
+            option=orjson.OPT_NON_STR_KEYS
+        )
+
+
+def reponse_modele(modele: BaseModel, status_code: int = 200) -> Response:
+    """
+    Serialise un modele Pydantic directement en octets JSON.
+    
+    Evite model_dump, la revalidation du response_model et le passage
+    par jsonable_encoder: la serialisation est faite en une passe par
+    pydantic-core. A utiliser pour les listes volumineuses.
+    """
+    return Response(
+        content=modele.model_dump_json(),
+        status_code=status_code,
+        media_type="application/json"
+    )
@@ -1,15 +1,53 @@
-# Planificateur de taches pour expiration des reservations
-# =========================================================
+# Planificateur des echeances de reservation et des retenues de places
+# ====================================================================
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
 from loguru import logger
 import asyncio
+import heapq
+import time
+
+from config import get_settings
+from utils.bus_evenements import CANAL_ECHEANCES, BusEvenements
+from utils.helpers import sans_fuseau
+from utils.metriques import DUREE_PLANIFICATEUR, EXPIRATIONS, NON_PRESENTATIONS
+
+# Types d'echeance
+ECHEANCE_EXPIRATION = "expiration"
+ECHEANCE_ACTIVATION = "activation"
+ECHEANCE_ARRIVEE = "arrivee"
+ECHEANCE_RETENUE = "retenue"  # identifiee par la place, pas la reservation
+ECHEANCE_RAPPEL = "rappel"    # identifiee par "<reservation_id>:<minutes avant fin>"
+
+# Ordre de traitement a instant egal: une place est liberee avant que
+# la reservation suivante ne commence
+_PRIORITES = {
+    ECHEANCE_EXPIRATION: 0,
+    ECHEANCE_ARRIVEE: 1,
+    ECHEANCE_RETENUE: 2,
+    ECHEANCE_ACTIVATION: 3,
+    ECHEANCE_RAPPEL: 4
+}
 
 
 class PlanificateurReservations:
     """
-    Verifie periodiquement les reservations expirees
-    et les traite automatiquement.
+    Traite les echeances des reservations a l'heure prevue: activation
+    des reservations a l'avance a leur debut, delai d'arrivee du
+    vehicule (non-presentation), avertissements avant la fin, expiration
+    a leur fin, et fin de la retenue d'une place proposee a la file
+    d'attente.
+    
+    Les echeances sont gardees dans un tas: la boucle dort jusqu'a la
+    plus proche au lieu de relire toutes les reservations a chaque tour.
+    Un balayage periodique de Firestore recharge les echeances creees
+    par un autre worker ou avant un redemarrage.
+    
+    Avec plusieurs workers, seul le leader fait tourner la boucle. Les
+    autres relaient leurs echeances au leader par le bus d'evenements
+    (activer_relais): une reservation creee sur un follower expire a
+    l'heure sans attendre le balayage.
     """
     
     def __init__(self, intervalle: int = 30):
@@ -17,11 +55,20 @@ class PlanificateurReservations:
         Initialise le planificateur.
         
         Args:
-            intervalle: secondes entre chaque verification
+            intervalle: secondes entre deux balayages de Firestore
         """
         self.intervalle = intervalle
         self.en_cours = False
         self._tache: asyncio.Task = None
+        # (instant, priorite, reservation_id, type); les entrees annulees
+        # ou deplacees restent dans le tas et sont ignorees au depilage
+        self._tas: list[Tuple[datetime, int, str, str]] = []
+        # (type, reservation_id) -> instant en vigueur
+        self._echeances: Dict[Tuple[str, str], datetime] = {}
+        self._reveil = asyncio.Event()
+        self._prochain_balayage = 0.0
+        self._bus: Optional[BusEvenements] = None
+        self._relais: set[asyncio.Task] = set()
     
     async def demarrer(self):
         """Demarre le planificateur."""
@@ -30,6 +77,7 @@ class PlanificateurReservations:
             return
         
         self.en_cours = True
+        self._prochain_balayage = 0.0
         self._tache = asyncio.create_task(self._boucle_verification())
         logger.info("Planificateur de reservations demarre")
     
@@ -44,61 +92,202 @@ class PlanificateurReservations:
             except asyncio.CancelledError:
                 pass
         
+        # Echeances oubliees: un nouveau demarrage (leader elu) les recharge
+        # par le balayage de Firestore
+        self._tas.clear()
+        self._echeances.clear()
+        
         logger.info("Planificateur de reservations arrete")
     
+    def planifier(self, type_echeance: str, reservation_id: str, instant: datetime):
+        """
+        Planifie une echeance. Remplace l'echeance du meme type deja
+        planifiee pour la reservation (fin prolongee, debut deplace).
+        """
+        instant = sans_fuseau(instant)
+        if self._relayer("planifier", type_echeance, reservation_id, instant):
+            return
+        
+        cle = (type_echeance, reservation_id)
+        if self._echeances.get(cle) == instant:
+            return
+        
+        self._echeances[cle] = instant
+        heapq.heappush(self._tas, (instant, _PRIORITES[type_echeance], reservation_id, type_echeance))
+        
+        if len(self._tas) > 2 * len(self._echeances) + 64:
+            self._compacter()
+        
+        # Nouvelle echeance la plus proche: la boucle recalcule son attente
+        if self._tas[0][0] == instant:
+            self._reveil.set()
+    
+    def annuler(self, type_echeance: str, reservation_id: str):
+        """Annule une echeance (son entree est ignoree au depilage)."""
+        if self._relayer("annuler", type_echeance, reservation_id):
+            return
+        
+        self._echeances.pop((type_echeance, reservation_id), None)
+    
+    def activer_relais(self, bus: BusEvenements):
+        """Relaie les echeances au leader (et les recoit si ce worker l'est)."""
+        self._bus = bus
+        bus.abonner(CANAL_ECHEANCES, self._recevoir_relais)
+    
+    def _relayer(
+        self,
+        action: str,
+        type_echeance: str,
+        reservation_id: str,
+        instant: Optional[datetime] = None
+    ) -> bool:
+        """
+        Follower: transmet une echeance au leader au lieu de la garder.
+        Retourne False si ce worker doit la traiter lui-meme.
+        """
+        if self._bus is None or self.en_cours:
+            return False
+        
+        try:
+            boucle = asyncio.get_running_loop()
+        except RuntimeError:
+            # Hors boucle: rattrapee par le balayage du leader
+            return True
+        
+        tache = boucle.create_task(self._bus.publier(CANAL_ECHEANCES, {
+            "action": action,
+            "type": type_echeance,
+            "reservation_id": reservation_id,
+            "instant": instant.isoformat() if instant else None
+        }))
+        self._relais.add(tache)
+        tache.add_done_callback(self._relais.discard)
+        return True
+    
+    async def _recevoir_relais(self, message: dict):
+        """Leader: applique une echeance relayee par un follower."""
+        if not self.en_cours:
+            return
+        
+        if message["action"] == "planifier":
+            self.planifier(
+                message["type"], message["reservation_id"], datetime.fromisoformat(message["instant"])
+            )
+        else:
+            self.annuler(message["type"], message["reservation_id"])
+    
+    def nombre_echeances(self) -> int:
+        """Nombre d'echeances en attente."""
+        return len(self._echeances)
+    
+    def _compacter(self):
+        """Reconstruit le tas sans les entrees annulees ou deplacees."""
+        self._tas = [
+            (instant, _PRIORITES[type_echeance], reservation_id, type_echeance)
+            for (type_echeance, reservation_id), instant in self._echeances.items()
+        ]
+        heapq.heapify(self._tas)
+    
+    def _prochaine(self) -> Optional[datetime]:
+        """Instant de la prochaine echeance en vigueur."""
+        while self._tas:
+            instant, _, reservation_id, type_echeance = self._tas[0]
+            if self._echeances.get((type_echeance, reservation_id)) == instant:
+                return instant
+            heapq.heappop(self._tas)
+        return None
+    
+    def _depiler_echues(self, maintenant: datetime) -> list[Tuple[str, str]]:
+        """Retire du tas les echeances arrivees, dans l'ordre de traitement."""
+        echues = []
+        while (prochaine := self._prochaine()) is not None and prochaine <= maintenant:
+            _, _, reservation_id, type_echeance = heapq.heappop(self._tas)
+            del self._echeances[(type_echeance, reservation_id)]
+            echues.append((type_echeance, reservation_id))
+        return echues
+    
+    def _attente(self) -> float:
+        """Secondes a dormir: jusqu'a la prochaine echeance ou au prochain balayage."""
+        attente = max(0.0, self._prochain_balayage - time.monotonic())
+        
+        prochaine = self._prochaine()
+        if prochaine is not None:
+            attente = min(attente, max(0.0, (prochaine - datetime.now()).total_seconds()))
+        
+        return attente
+    
     async def _boucle_verification(self):
-        """Boucle principale de verification."""
+        """Boucle principale: balayage periodique et echeances arrivees."""
         while self.en_cours:
+            # Une echeance planifiee pendant le traitement reveillera la boucle
+            self._reveil.clear()
+            debut = time.perf_counter()
+            travail = False
+            
+            if time.monotonic() >= self._prochain_balayage:
+                try:
+                    await self._balayer()
+                except Exception as e:
+                    logger.error(f"Erreur dans le balayage des reservations: {e}")
+                self._prochain_balayage = time.monotonic() + self.intervalle
+                travail = True
+            
             try:
-                await self._verifier_expirations()
+                travail = await self._traiter_echues() or travail
             except Exception as e:
-                logger.error(f"Erreur dans la boucle de verification: {e}")
+                logger.error(f"Erreur dans le traitement des echeances: {e}")
             
-            await asyncio.sleep(self.intervalle)
+            if travail:
+                DUREE_PLANIFICATEUR.observer(time.perf_counter() - debut)
+            
+            try:
+                await asyncio.wait_for(self._reveil.wait(), timeout=self._attente())
+            except asyncio.TimeoutError:
+                pass
     
-    async def _verifier_expirations(self):
-        """Verifie et traite les reservations expirees."""
+    async def _balayer(self):
+        """Recharge les echeances des reservations et des places retenues."""
         from services.reservation_service import ServiceReservation
-        from routers.websocket import diffuser_expiration, diffuser_mise_a_jour_place
+        from services.file_attente_service import ServiceFileAttente
         
-        try:
-            reservations = await ServiceReservation.obtenir_reservations_actives()
-            maintenant = datetime.now()
-            nb_expirees = 0
+        for reservation in await ServiceReservation.obtenir_reservations_actives():
+            self.planifier(ECHEANCE_EXPIRATION, reservation.id, reservation.fin)
+            limite = ServiceReservation.limite_arrivee(reservation)
+            if limite is not None:
+                self.planifier(ECHEANCE_ARRIVEE, reservation.id, limite)
+            ServiceReservation.planifier_rappels(reservation)
+        
+        for reservation in await ServiceReservation.obtenir_reservations_planifiees():
+            self.planifier(ECHEANCE_ACTIVATION, reservation.id, reservation.debut)
+        
+        for place in await ServiceFileAttente.obtenir_places_retenues():
+            self.planifier(ECHEANCE_RETENUE, place.id, place.retenue_jusqu_a)
+    
+    async def _traiter_echues(self) -> bool:
+        """Traite les echeances arrivees. Retourne True si au moins une l'etait."""
+        echues = self._depiler_echues(datetime.now())
+        if not echues:
+            return False
+        
+        nb_expirees = 0
+        for type_echeance, reservation_id in echues:
+            try:
+                traitee = await GESTIONNAIRES[type_echeance](reservation_id)
+            except Exception as e:
+                logger.error(f"Erreur echeance {type_echeance} de {reservation_id}: {e}")
+                continue
             
-            for reservation in reservations:
-                if reservation.fin and maintenant >= reservation.fin:
-                    logger.info(
-                        f"Reservation {reservation.id} pour place {reservation.place_id} expiree"
-                    )
-                    
-                    # Expirer la reservation
-                    await ServiceReservation.expirer_reservation(reservation.id)
-                    
-                    # Notifier les clients WebSocket
-                    await diffuser_expiration(
-                        reservation_id=reservation.id,
-                        place_id=reservation.place_id,
-                        utilisateur_id=reservation.utilisateur_id
-                    )
-                    
-                    await diffuser_mise_a_jour_place(
-                        place_id=reservation.place_id,
-                        statut="available",
-                        donnees={"raison": "expiration"}
-                    )
-                    
-                    nb_expirees += 1
+            if traitee and type_echeance == ECHEANCE_EXPIRATION:
+                nb_expirees += 1
             
-            if nb_expirees > 0:
-                logger.info(f"{nb_expirees} reservation(s) expiree(s) traitee(s)")
+        if nb_expirees > 0:
+            logger.info(f"{nb_expirees} reservation(s) expiree(s) traitee(s)")
         
-        except Exception as e:
-            logger.error(f"Erreur verification expirations: {e}")
+        return True
 
 
 # Instance globale
-planificateur = PlanificateurReservations()
+planificateur = PlanificateurReservations(intervalle=get_settings().INTERVALLE_VERIFICATION)
 
 
 def get_planificateur() -> PlanificateurReservations:
@@ -108,8 +297,8 @@ def get_planificateur() -> PlanificateurReservations:
 
 async def verifier_expiration_unique(reservation_id: str) -> bool:
     """
-    Verifie si une reservation specifique a expire.
-    Utile pour verification immediate.
+    Verifie si une reservation specifique a expire et la traite.
+    Si sa fin a ete repoussee, l'echeance est replanifiee.
     """
     from services.reservation_service import ServiceReservation
     from routers.websocket import diffuser_expiration, diffuser_mise_a_jour_place
@@ -124,25 +313,265 @@ async def verifier_expiration_unique(reservation_id: str) -> bool:
             return False
         
         maintenant = datetime.now()
+        fin = sans_fuseau(reservation.fin)
         
-        if reservation.fin and maintenant >= reservation.fin:
-            await ServiceReservation.expirer_reservation(reservation_id)
-            
-            await diffuser_expiration(
-                reservation_id=reservation.id,
-                place_id=reservation.place_id,
-                utilisateur_id=reservation.utilisateur_id
-            )
+        if fin and maintenant < fin:
+            planificateur.planifier(ECHEANCE_EXPIRATION, reservation.id, fin)
+            return False
+        
+        logger.info(
+            f"Reservation {reservation.id} pour place {reservation.place_id} expiree"
+        )
+        
+        expiree, place_liberee = await ServiceReservation.expirer_reservation(reservation_id)
+        if not expiree:
+            return False
+        EXPIRATIONS.inc()
             
+        await diffuser_expiration(
+            reservation_id=reservation.id,
+            place_id=reservation.place_id,
+            utilisateur_id=reservation.utilisateur_id
+        )
+        
+        # Place deja reprise par la reservation suivante: rien a diffuser
+        if place_liberee:
             await diffuser_mise_a_jour_place(
                 place_id=reservation.place_id,
                 statut="available",
                 donnees={"raison": "expiration"}
             )
+            await proposer_place_liberee(reservation.place_id)
             
-            return True
+        return True
     
     except Exception as e:
         logger.error(f"Erreur verification expiration: {e}")
     
     return False
+
+
+async def activer_reservation_planifiee(reservation_id: str) -> bool:
+    """
+    Active une reservation a l'avance arrivee a son debut: la place
+    passe en reservee et l'expiration est planifiee.
+    """
+    from services.reservation_service import ServiceReservation
+    from routers.websocket import diffuser_reservation, diffuser_mise_a_jour_place
+    
+    try:
+        resultat = await ServiceReservation.activer_reservation(reservation_id)
+        
+        if resultat is None:
+            return False
+        
+        reservation, place_reservee = resultat
+        ServiceReservation._planifier_echeance(reservation)
+        
+        await diffuser_reservation(
+            reservation_id=reservation.id,
+            action="activee",
+            donnees={"place_id": reservation.place_id, "fin": reservation.fin},
+            utilisateur_id=reservation.utilisateur_id
+        )
+        
+        if place_reservee:
+            await diffuser_mise_a_jour_place(
+                place_id=reservation.place_id,
+                statut="reserved",
+                donnees={"raison": "activation"}
+            )
+        
+        return True
+        
+    except Exception as e:
+        logger.error(f"Erreur activation reservation {reservation_id}: {e}")
+    
+    return False
+
+
+async def verifier_arrivee(reservation_id: str) -> bool:
+    """
+    Delai d'arrivee depasse sans signal du capteur: la reservation est
+    marquee non presentee et la place liberee (selon la configuration).
+    """
+    from services.reservation_service import ServiceReservation
+    from routers.websocket import diffuser_reservation, diffuser_mise_a_jour_place
+    
+    try:
+        resultat = await ServiceReservation.constater_non_presentation(reservation_id)
+        
+        if resultat is None:
+            return False
+        
+        reservation, place_liberee = resultat
+        NON_PRESENTATIONS.inc()
+        
+        await diffuser_reservation(
+            reservation_id=reservation.id,
+            action="non_presentation",
+            donnees={"place_id": reservation.place_id, "statut": reservation.statut.value},
+            utilisateur_id=reservation.utilisateur_id
+        )
+        
+        if place_liberee:
+            await diffuser_mise_a_jour_place(
+                place_id=reservation.place_id,
+                statut="available",
+                donnees={"raison": "non_presentation"}
+            )
+            await proposer_place_liberee(reservation.place_id)
+        
+        return True
+        
+    except Exception as e:
+        logger.error(f"Erreur verification arrivee {reservation_id}: {e}")
+    
+    return False
+
+
+async def proposer_place_liberee(place_id: str) -> bool:
+    """
+    Place liberee (liberation, expiration, depart): elle est retenue pour
+    la tete de la file d'attente de sa zone, prevenue par WebSocket.
+    """
+    from services.file_attente_service import ServiceFileAttente
+    from routers.websocket import diffuser_proposition_place, diffuser_mise_a_jour_place
+    
+    try:
+        inscription = await ServiceFileAttente.proposer_place(place_id)
+        
+        if inscription is None:
+            return False
+        
+        planificateur.planifier(ECHEANCE_RETENUE, place_id, inscription.retenue_jusqu_a)
+        
+        await diffuser_proposition_place(
+            utilisateur_id=inscription.utilisateur_id,
+            place_id=place_id,
+            retenue_jusqu_a=inscription.retenue_jusqu_a
+        )
+        
+        await diffuser_mise_a_jour_place(
+            place_id=place_id,
+            statut="available",
+            donnees={"raison": "retenue", "retenue": True}
+        )
+        
+        return True
+        
+    except Exception as e:
+        logger.error(f"Erreur proposition place {place_id}: {e}")
+    
+    return False
+
+
+async def expirer_retenue(place_id: str) -> bool:
+    """
+    Retenue ecoulee sans reservation: la personne perd son tour et la
+    place est proposee a la suivante.
+    """
+    from services.file_attente_service import ServiceFileAttente
+    from routers.websocket import diffuser_proposition_place
+    
+    try:
+        utilisateur_id, echeance = await ServiceFileAttente.expirer_retenue(place_id)
+        
+        if echeance is not None:
+            planificateur.planifier(ECHEANCE_RETENUE, place_id, echeance)
+            return False
+        
+        if utilisateur_id is None:
+            return False
+        
+        await diffuser_proposition_place(
+            utilisateur_id=utilisateur_id,
+            place_id=place_id,
+            retenue_jusqu_a=None,
+            action="expiree"
+        )
+        
+        await proposer_place_liberee(place_id)
+        return True
+        
+    except Exception as e:
+        logger.error(f"Erreur expiration retenue place {place_id}: {e}")
+    
+    return False
+
+
+async def rappeler_expiration(cle: str) -> bool:
+    """
+    Avertissement avant la fin d'une reservation active, ajoute a la
+    boite d'envoi (envoi par lots, dedupliques par reservation, delai
+    et fin). Si la fin a ete repoussee, l'avertissement est replanifie.
+    """
+    from services.parking_service import ServiceParking
+    from services.reservation_service import ServiceReservation
+    from utils.boite_envoi import get_boite_envoi
+    
+    try:
+        reservation_id, minutes = cle.rsplit(":", 1)
+        minutes = int(minutes)
+        reservation = await ServiceReservation.obtenir_reservation(reservation_id)
+        
+        if not reservation or reservation.statut.value != "active":
+            return False
+        
+        maintenant = datetime.now()
+        fin = sans_fuseau(reservation.fin)
+        instant = fin - timedelta(minutes=minutes)
+        
+        if instant > maintenant:
+            planificateur.planifier(ECHEANCE_RAPPEL, cle, instant)
+            return False
+        
+        # En retard (redemarrage): un avertissement plus proche de la fin le remplace
+        restant = fin - maintenant
+        if fin <= maintenant or any(
+            autre < minutes and restant <= timedelta(minutes=autre)
+            for autre in get_settings().RAPPELS_EXPIRATION_MINUTES
+        ):
+            return False
+        
+        # Place deja liberee (depart detecte, liberation manuelle): plus rien a rappeler
+        place = await ServiceParking.obtenir_place(reservation.place_id)
+        if (
+            place is None
+            or place.reserve_par != reservation.utilisateur_id
+            or sans_fuseau(place.fin_reservation) != fin
+        ):
+            return False
+        
+        get_boite_envoi().notifier(
+            cle=f"expiration:{reservation_id}:{minutes}:{int(fin.timestamp())}",
+            utilisateur_id=reservation.utilisateur_id,
+            type_notification="expiration_proche",
+            message=(
+                f"AeroPark: votre reservation de la place {reservation.place_id.upper()} "
+                f"se termine dans {minutes} min ({fin:%H:%M})."
+            ),
+            donnees={
+                "reservation_id": reservation_id,
+                "place_id": reservation.place_id,
+                "fin": fin.isoformat(),
+                "minutes": minutes
+            },
+            valable_jusqu_a=fin
+        )
+        return True
+        
+    except Exception as e:
+        logger.error(f"Erreur avertissement expiration {cle}: {e}")
+    
+    return False
+
+
+# Traitement de chaque type d'echeance
+GESTIONNAIRES = {
+    ECHEANCE_EXPIRATION: verifier_expiration_unique,
+    ECHEANCE_ARRIVEE: verifier_arrivee,
+    ECHEANCE_RETENUE: expirer_retenue,
+    ECHEANCE_ACTIVATION: activer_reservation_planifiee,
+    ECHEANCE_RAPPEL: rappeler_expiration
+}